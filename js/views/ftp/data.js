@@ -19,15 +19,36 @@ export const FTPData = {
             const data = await DataManager.fetchJSON('power_curve_graph.json');
             if (!data) {
                 const res = await fetch('strava_data/cycling/power_curve_graph.json');
-                if (res.ok) return await res.json();
+                if (res.ok) return this.expandColumnar(await res.json());
             }
-            return data || [];
+            return this.expandColumnar(data);
         } catch (e) {
             console.warn("Cycling data fetch failed", e);
             return [];
         }
     },
 
+    // power_curve_graph.json is columnar (parallel arrays + a table of source rides
+    // referenced by index). Expand it back to one row per point for the charts.
+    expandColumnar(data) {
+        if (!data) return [];
+        if (Array.isArray(data)) return data; // legacy one-dict-per-second file
+        const rides = data.rides || [];
+        return data.seconds.map((seconds, i) => {
+            const at = rides[data.at_ride[i]] || {};
+            const sw = rides[data.sw_ride[i]] || {};
+            return {
+                seconds,
+                all_time_watts: data.all_time_watts[i],
+                at_date: at.date,
+                at_id: at.id,
+                six_week_watts: data.six_week_watts[i],
+                sw_date: sw.date,
+                sw_id: sw.id
+            };
+        });
+    },
+
     async fetchRunning() {
         try {
             const res = await fetch('strava_data/running/my_running_prs.md');
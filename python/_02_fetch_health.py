@@ -3,7 +3,9 @@ import sys
 import json
 import time
 from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from garminconnect import Garmin
+from health_modules import baselines, checkpoint, health_store, planner, throttle
 
 # --- CONFIGURATION ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -11,6 +13,9 @@ ROOT_DIR = os.path.dirname(SCRIPT_DIR)
 OUTPUT_FILE = os.path.join(ROOT_DIR, 'garmin_data', 'garmin_health.json')
 PROFILE_FILE = os.path.join(ROOT_DIR, 'data', 'zones', 'profile.json')
 
+# BULK: fetch the families that have date-range endpoints once per chunk (see BULK_FAMILIES)
+BULK_MODE = os.environ.get('GARMIN_HEALTH_BULK', 'true').lower() == 'true'
+
 # DEBUG: Keeps raw logs enabled for the first day to verify data structures
 DEBUG = True 
 
@@ -125,19 +130,23 @@ def extract_health_summary(client, date_str):
     except Exception: pass
     return row
 
-# --- 2. ADVANCED METRICS FETCHER (No FTP/LTHR) ---
-def fetch_advanced_metrics(client, date_str):
+# --- 2. ADVANCED METRICS (No FTP/LTHR) ---
+# One function per endpoint so a day's calls can run in parallel.
+
+# A. Readiness
+def fetch_readiness(client, date_str):
     metrics = {}
-    
-    # A. Readiness
     try:
         readiness = client.get_morning_training_readiness(date_str)
         if readiness and isinstance(readiness, dict):
             if 'trainingReadinessScore' in readiness:
                 metrics['Readiness Score'] = readiness['trainingReadinessScore']
     except Exception: pass
+    return metrics
 
-    # B. Training Status (Heat/Load/VO2)
+# B. Training Status (Heat/Load/VO2)
+def fetch_training_status(client, date_str):
+    metrics = {}
     try:
         status = client.get_training_status(date_str)
         latest = None
@@ -150,31 +159,47 @@ def fetch_advanced_metrics(client, date_str):
             if 'load' in latest: metrics['Acute Load'] = latest['load']
             if 'vo2Max' in latest: metrics['VO2 Max'] = latest['vo2Max']
     except Exception: pass
+    return metrics
 
-    # C. Respiration
+# C. Respiration
+def fetch_respiration(client, date_str):
+    metrics = {}
     try:
         resp = client.get_respiration_data(date_str)
         if resp and isinstance(resp, dict) and 'avgWakingRespirationValue' in resp:
             metrics['Respiration Avg'] = resp['avgWakingRespirationValue']
     except Exception: pass
+    return metrics
 
-    # D. SpO2
+# D. SpO2
+def fetch_spo2(client, date_str):
+    metrics = {}
     try:
         spo2 = client.get_spo2_data(date_str)
         if spo2 and isinstance(spo2, dict) and 'averageSpO2' in spo2:
             metrics['SpO2 Avg'] = spo2['averageSpO2']
     except Exception: pass
+    return metrics
+
+# E. HRV
+def hrv_metrics(summary):
+    metrics = {}
+    if 'weeklyAverage' in summary: metrics['HRV Night Avg'] = summary['weeklyAverage']
+    if 'lastNightAverage' in summary: metrics['HRV Last Night'] = summary['lastNightAverage']
+    return metrics
 
-    # E. HRV
+def fetch_hrv(client, date_str):
+    metrics = {}
     try:
         hrv = client.get_hrv_data(date_str)
         if hrv and isinstance(hrv, dict) and 'hrvSummary' in hrv:
-            summary = hrv['hrvSummary']
-            if 'weeklyAverage' in summary: metrics['HRV Night Avg'] = summary['weeklyAverage']
-            if 'lastNightAverage' in summary: metrics['HRV Last Night'] = summary['lastNightAverage']
+            metrics = hrv_metrics(hrv['hrvSummary'])
     except Exception: pass
+    return metrics
 
-    # F. Floors
+# F. Floors
+def fetch_floors(client, date_str):
+    metrics = {}
     try:
         floors = client.get_floors(date_str)
         if floors and isinstance(floors, dict):
@@ -182,8 +207,11 @@ def fetch_advanced_metrics(client, date_str):
             if 'floorsDescended' in floors: metrics['Floors Descended'] = floors['floorsDescended']
             if 'floorsClimbed' in floors: metrics['Floors Climbed'] = floors['floorsClimbed']
     except Exception: pass
+    return metrics
 
-    # G. Fitness Age & VO2 (Max Metrics)
+# G. Fitness Age & VO2 (Max Metrics)
+def fetch_fitness_age(client, date_str):
+    metrics = {}
     try:
         max_m = client.get_max_metrics(date_str)
         if max_m and isinstance(max_m, list):
@@ -207,8 +235,11 @@ def fetch_advanced_metrics(client, date_str):
             if fa_data and 'fitnessAge' in fa_data:
                 metrics['Fitness Age'] = fa_data['fitnessAge']
         except Exception: pass
+    return metrics
 
-    # H. Intensity Minutes
+# H. Intensity Minutes
+def fetch_intensity_minutes(client, date_str):
+    metrics = {}
     try:
         minutes = client.get_intensity_minutes_data(date_str)
         if minutes and isinstance(minutes, dict):
@@ -218,63 +249,79 @@ def fetch_advanced_metrics(client, date_str):
             metrics['Intensity Min Vig'] = vig
             metrics['Intensity Min Total'] = mod + (vig * 2)
     except Exception: pass
+    return metrics
 
-    # I. Blood Pressure
+# I. Blood Pressure
+def blood_pressure_metrics(readings):
+    metrics = {}
+    if readings:
+        sys_sum = sum(r['systolic'] for r in readings if 'systolic' in r)
+        dia_sum = sum(r['diastolic'] for r in readings if 'diastolic' in r)
+        count = len(readings)
+        if count > 0:
+            metrics['BP Systolic'] = round(sys_sum / count)
+            metrics['BP Diastolic'] = round(dia_sum / count)
+    return metrics
+
+def fetch_blood_pressure(client, date_str):
+    metrics = {}
     try:
         bp_data = client.get_blood_pressure(date_str, date_str)
         if bp_data and 'measurementSummaries' in bp_data:
             readings = []
             for summary in bp_data['measurementSummaries']:
                 if 'measurements' in summary: readings.extend(summary['measurements'])
-            if readings:
-                sys_sum = sum(r['systolic'] for r in readings if 'systolic' in r)
-                dia_sum = sum(r['diastolic'] for r in readings if 'diastolic' in r)
-                count = len(readings)
-                if count > 0:
-                    metrics['BP Systolic'] = round(sys_sum / count)
-                    metrics['BP Diastolic'] = round(dia_sum / count)
+            metrics = blood_pressure_metrics(readings)
     except Exception: pass
-
     return metrics
 
 # --- 3. ACTIVITY & PERFORMANCE ---
+def run_metrics(activities):
+    metrics = {}
+    run_dist = 0
+    run_time = 0
+    
+    for act in activities:
+        sport = act.get('activityType', {}).get('typeKey')
+        if sport == 'running':
+            run_dist += act.get('distance', 0)
+            run_time += act.get('duration', 0)
+            cad = act.get('averageRunningCadenceInStepsPerMinute')
+            if cad: metrics['Run Avg Cadence'] = cad
+
+    if run_dist > 0 and run_time > 0:
+        metrics['Run Avg Speed (m/s)'] = round(run_dist / run_time, 2)
+    return metrics
+
 def fetch_activity_metrics(client, date_str):
     metrics = {}
     try:
         activities = client.get_activities_by_date(date_str, date_str, "")
         if not activities: return metrics
-
-        run_dist = 0
-        run_time = 0
-        
-        for act in activities:
-            sport = act.get('activityType', {}).get('typeKey')
-            if sport == 'running':
-                run_dist += act.get('distance', 0)
-                run_time += act.get('duration', 0)
-                cad = act.get('averageRunningCadenceInStepsPerMinute')
-                if cad: metrics['Run Avg Cadence'] = cad
-
-        if run_dist > 0 and run_time > 0:
-            metrics['Run Avg Speed (m/s)'] = round(run_dist / run_time, 2)
-
+        metrics = run_metrics(activities)
     except Exception: pass
     return metrics
 
 # --- 4. BODY COMPOSITION ---
+def weigh_in_metrics(weigh_ins):
+    """Last valid weigh-in of a dateWeightList, in the order Garmin lists them."""
+    metrics = {}
+    valid = [w for w in weigh_ins if w['weight'] > 0]
+    if valid:
+        latest = valid[-1]
+        metrics['Weight (lbs)'] = round(latest['weight'] * 0.00220462, 1)
+        if 'muscleMass' in latest: metrics['Muscle Mass'] = round(latest['muscleMass'] * 0.00220462, 1)
+        if 'bodyFat' in latest: metrics['Body Fat %'] = latest['bodyFat']
+    return metrics
+
 def fetch_body_comp(client, date_str):
     metrics = {}
     try:
         # Priority: Daily Weigh-Ins
         weigh_ins = client.get_daily_weigh_ins(date_str)
         if weigh_ins and 'dateWeightList' in weigh_ins:
-            valid = [w for w in weigh_ins['dateWeightList'] if w['weight'] > 0]
-            if valid:
-                latest = valid[-1]
-                metrics['Weight (lbs)'] = round(latest['weight'] * 0.00220462, 1)
-                if 'muscleMass' in latest: metrics['Muscle Mass'] = round(latest['muscleMass'] * 0.00220462, 1)
-                if 'bodyFat' in latest: metrics['Body Fat %'] = latest['bodyFat']
-                return metrics
+            metrics = weigh_in_metrics(weigh_ins['dateWeightList'])
+            if metrics: return metrics
 
         # Fallback: Index Scale
         comp = client.get_body_composition(date_str)
@@ -286,52 +333,222 @@ def fetch_body_comp(client, date_str):
     except Exception: pass
     return metrics
 
+# --- 5. BULK (DATE-RANGE) FETCHERS ---
+# Families Garmin also serves for a whole date range: one call per chunk instead of
+# one per day, split back into {date: metrics} with the per-day parsers above.
+# Resting HR, stress and steps have range endpoints too, but they arrive in the
+# per-day user summary together with fields that have none, so they stay there.
+# A failing range call falls back to the per-day fetcher for that chunk.
+BULK_CHUNK_DAYS = 28
+
+def bulk_activity_metrics(client, start_str, end_str):
+    by_day = {}
+    for act in client.get_activities_by_date(start_str, end_str, "") or []:
+        by_day.setdefault(act.get('startTimeLocal', '')[:10], []).append(act)
+    return {day: run_metrics(acts) for day, acts in by_day.items()}
+
+def bulk_hrv(client, start_str, end_str):
+    data = client.connectapi(f"/hrv-service/hrv/daily/{start_str}/{end_str}")
+    return {s['calendarDate']: hrv_metrics(s) for s in (data or {}).get('hrvSummaries', []) if s.get('calendarDate')}
+
+def bulk_blood_pressure(client, start_str, end_str):
+    by_day = {}
+    bp_data = client.get_blood_pressure(start_str, end_str)
+    for summary in (bp_data or {}).get('measurementSummaries', []):
+        for reading in summary.get('measurements', []):
+            day = (reading.get('measurementTimestampLocal') or summary.get('startDate') or '')[:10]
+            by_day.setdefault(day, []).append(reading)
+    return {day: blood_pressure_metrics(readings) for day, readings in by_day.items()}
+
+def bulk_body_comp(client, start_str, end_str):
+    by_day = {}
+    comp = client.get_body_composition(start_str, end_str)
+    for w in (comp or {}).get('dateWeightList') or []:
+        by_day.setdefault(w.get('calendarDate'), []).append(w)
+    return {day: weigh_in_metrics(entries) for day, entries in by_day.items()}
+
+BULK_FAMILIES = {
+    'hrv': bulk_hrv,
+    'blood_pressure': bulk_blood_pressure,
+    'activities': bulk_activity_metrics,
+    'body_comp': bulk_body_comp,
+}
+
+def date_chunks(dates, size=BULK_CHUNK_DAYS):
+    """Sorted ISO dates split into runs of consecutive days, each at most size days long."""
+    chunks = []
+    for d in dates:
+        if chunks and len(chunks[-1]) < size and \
+                date.fromisoformat(d) - date.fromisoformat(chunks[-1][-1]) == timedelta(days=1):
+            chunks[-1].append(d)
+        else:
+            chunks.append([d])
+    return chunks
+
+# --- METRIC FAMILIES ---
+# Every per-day fetcher, in merge order: where two report the same key
+# (VO2 Max, Floors Climbed, Weight) the later one wins.
+METRIC_FAMILIES = [
+    ('summary', extract_health_summary),
+    ('readiness', fetch_readiness),
+    ('training_status', fetch_training_status),
+    ('respiration', fetch_respiration),
+    ('spo2', fetch_spo2),
+    ('hrv', fetch_hrv),
+    ('floors', fetch_floors),
+    ('fitness_age', fetch_fitness_age),
+    ('intensity', fetch_intensity_minutes),
+    ('blood_pressure', fetch_blood_pressure),
+    ('activities', fetch_activity_metrics),
+    ('body_comp', fetch_body_comp),
+]
+
+FAMILY_NAMES = [name for name, _ in METRIC_FAMILIES]
+
 # --- MAIN LOOP ---
-def fetch_daily_stats(client, start_date, end_date):
-    days = (end_date - start_date).days + 1
-    print(f"📡 Fetching {days} days of data ({start_date} to {end_date})...")
+def fetch_days(client, plan, bulk=BULK_MODE):
+    """
+    Fetches plan ({date_str: [family, ...]}) and yields, in plan order,
+    (date_str, row or None, families whose calls failed, families that returned data).
+
+    Every (day, family) call is fanned out over a bounded thread pool. All calls
+    share one rate limiter, so throughput is set by the request budget rather than
+    by per-call latency. With bulk, BULK_FAMILIES come from one range call per run
+    of consecutive days instead.
+    """
+    dates = list(plan)
+    if not dates: return
+    print(f"📡 Fetching {len(dates)} days of data ({min(dates)} to {max(dates)})...")
     
     # 1. Load Profile (Manual settings) - THE SOURCE OF TRUTH
     profile_data = load_profile_data()
     print(f"   ℹ️ Injected Profile Data: {profile_data}")
 
-    all_data = []
+    limiter = throttle.RateLimiter()
+    api = throttle.ThrottledClient(client, limiter)
+    print(f"   ℹ️ {throttle.MAX_WORKERS} workers, {limiter.rate:g} requests/s")
+    started = time.time()
+
     global DEBUG
     
-    for i in range(days):
-        current_date = start_date + timedelta(days=i)
-        date_str = current_date.isoformat()
-        
-        row = {}
-        
-        try:
-            # Gather metrics from API
-            row.update(extract_health_summary(client, date_str))
-            row.update(fetch_advanced_metrics(client, date_str))
-            row.update(fetch_activity_metrics(client, date_str))
-            row.update(fetch_body_comp(client, date_str))
-
-            # --- FORCE OVERWRITE FROM PROFILE.JSON ---
-            row.update(profile_data)
-
-            if len(row) > 1:
-                if DEBUG:
-                    print(f"   ✅ {date_str} Keys: {list(row.keys())}")
-                    if 'Weight (lbs)' in row: DEBUG = False 
+    pool = ThreadPoolExecutor(max_workers=throttle.MAX_WORKERS)
+    try:
+        # Range calls first: (family, date) -> metrics for every day they cover
+        covered = {}
+        if bulk:
+            jobs = {}
+            for name, fetcher in BULK_FAMILIES.items():
+                for chunk in date_chunks([d for d in dates if name in plan[d]]):
+                    jobs[(name, tuple(chunk))] = pool.submit(fetcher, api, chunk[0], chunk[-1])
+            for (name, chunk), job in jobs.items():
+                try:
+                    by_day = job.result()
+                except Exception as e:
+                    print(f"   ⚠️ Range fetch of {name} ({chunk[0]} to {chunk[-1]}) failed ({e}). Using per-day calls.")
+                    continue
+                for d in chunk:
+                    covered[(name, d)] = (by_day.get(d, {}), 0)
+
+        # Per-day calls for the rest, in plan order so days complete roughly in merge order
+        fetchers = dict(METRIC_FAMILIES)
+        pending = {(name, d): pool.submit(api.run, fetchers[name], d)
+                   for d in dates for name in FAMILY_NAMES if name in plan[d] and (name, d) not in covered}
+
+        for date_str in dates:
+            # A re-fetch of some families only: the row still needs its date to merge
+            row = {} if 'summary' in plan[date_str] else {'Date': date_str}
+            failed, returned = [], []
+            
+            try:
+                # Gather metrics from API
+                for name in FAMILY_NAMES:
+                    key = (name, date_str)
+                    if key not in covered and key not in pending: continue
+                    metrics, failures = covered.pop(key) if key in covered else pending.pop(key).result()
+                    row.update(metrics)
+                    if failures: failed.append(name)
+                    if metrics: returned.append(name)
+
+                # --- FORCE OVERWRITE FROM PROFILE.JSON ---
+                row.update(profile_data)
+
+                if len(row) > 1:
+                    if DEBUG:
+                        print(f"   ✅ {date_str} Keys: {list(row.keys())}")
+                        if 'Weight (lbs)' in row: DEBUG = False 
+                    else:
+                        print(f"   ✅ {date_str}: {len(row)} metrics.")
                 else:
-                    print(f"   ✅ {date_str}: {len(row)} metrics.")
-                all_data.append(row)
-            else:
-                print(f"   ⚠️ {date_str}: No data.")
-                
-        except Exception as e:
-            print(f"   ❌ {date_str}: Error ({str(e)})")
-        
-        time.sleep(1.0) 
+                    print(f"   ⚠️ {date_str}: No data.")
+                    row = None
+                    
+            except Exception as e:
+                print(f"   ❌ {date_str}: Error ({str(e)})")
+                row, failed, returned = None, list(plan[date_str]), []
+
+            yield date_str, row, failed, returned
+    finally:
+        # Stopping early (or a crash) must not wait for the rest of the backlog
+        pool.shutdown(wait=True, cancel_futures=True)
+        print(f"   ⏱️ {limiter.calls} API calls in {time.time() - started:.0f}s.")
+
+def fetch_daily_stats(client, start_date, end_date, bulk=BULK_MODE):
+    """Every metric for every day in [start_date, end_date], as a list of rows."""
+    days = (end_date - start_date).days + 1
+    plan = {(start_date + timedelta(days=i)).isoformat(): FAMILY_NAMES for i in range(days)}
+    return [row for _, row, _, _ in fetch_days(client, plan, bulk) if row]
 
-    return all_data
+def fetch_with_checkpoints(client, store, progress, plan, endpoints, bulk=BULK_MODE):
+    """
+    Runs plan like fetch_daily_stats, but saves the health store, the progress file
+    and the endpoint stats after every checkpoint.BATCH_DAYS days. Stops early when a whole
+    batch fails (expired login, Garmin down) so those days stay queued instead of
+    burning their attempts.
+    """
+    days = list(plan)
+    first_new, last_day = days[0], days[-1]  # new days come first, retries of older days after
+    batch, outcomes = [], []
+    for date_str, row, failed, returned in fetch_days(client, plan, bulk):
+        if row: batch.append(row)
+        outcomes.append((date_str, failed, returned))
+        if len(outcomes) < checkpoint.BATCH_DAYS and date_str != last_day: continue
+
+        # Retry-only days may fail again legitimately; new days failing outright means the session is gone
+        new_days = [d for d, _, _ in outcomes if d >= first_new]
+        if new_days and all(len(failed) == len(plan[d]) for d, failed, _ in outcomes):
+            print(f"❌ Every call failed for a batch of {len(outcomes)} days. Stopping; a rerun resumes here.")
+            break
+        if batch:
+            health_store.merge_rows(store, batch)
+            health_store.save(store)
+        for d, failed, _ in outcomes:
+            checkpoint.record(progress, d, failed)
+        # After recording: a family coming back re-queues skipped days, possibly ones in this batch
+        for d, failed, returned in outcomes:
+            for family in plan[d]:
+                if family in failed or family in probation_exempt(bulk): continue
+                for skipped in planner.observe(endpoints, family, d, family in returned):
+                    progress['pending'].setdefault(skipped, {}).setdefault(family, 0)
+        checkpoint.save(progress)
+        planner.save(endpoints)
+        batch, outcomes = [], []
+    return store
+
+def probation_exempt(bulk=BULK_MODE):
+    """Families the planner never skips: with bulk, one range call covers all their days anyway."""
+    return set(BULK_FAMILIES) if bulk else set()
+
+# --- STORAGE ---
+def load_store():
+    """The columnar health store; built from garmin_health.json the first time."""
+    store = health_store.load()
+    if store is None:
+        rows = load_existing_data()
+        if rows:
+            print(f"📦 Building {health_store.STORE_FILE} from {len(rows)} saved records.")
+        store = health_store.merge_rows(health_store.empty(), rows)
+    return store
 
-# --- JSON MANAGEMENT ---
 def load_existing_data():
     if os.path.exists(OUTPUT_FILE):
         try:
@@ -340,48 +557,52 @@ def load_existing_data():
         except: return []
     return []
 
-def get_start_date(existing_data):
-    if not existing_data:
+def get_start_date(store):
+    last = health_store.last_date(store)
+    if not last:
         print("🆕 No existing history found. Fetching last 365 days.")
         return date.today() - timedelta(days=365)
-    
-    try:
-        dates = [d.get('Date') for d in existing_data if d.get('Date')]
-        if not dates: return date.today() - timedelta(days=365)
-        last_date = date.fromisoformat(max(dates))
-        print(f"🔄 Resuming from last recorded date: {last_date}")
-        return last_date
-    except Exception:
-        return date.today() - timedelta(days=365)
+    print(f"🔄 Resuming from last recorded date: {last}")
+    return date.fromisoformat(last)
 
-def save_json_data(new_data, existing_data):
-    if not new_data: return
-
-    data_map = {item['Date']: item for item in existing_data if 'Date' in item}
-    for item in new_data:
-        if 'Date' in item:
-            if item['Date'] in data_map: data_map[item['Date']].update(item)
-            else: data_map[item['Date']] = item
-
-    final_list = sorted(data_map.values(), key=lambda x: x['Date'], reverse=True)
-
-    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-        json.dump(final_list, f, indent=4)
-    print(f"💾 Saved {len(final_list)} records to {OUTPUT_FILE}")
+def publish(store):
+    """Writes the dashboard files from the store: garmin_health.json and the readiness baselines."""
+    rows = health_store.export_json(store, OUTPUT_FILE)
+    print(f"💾 Saved {len(rows)} records to {OUTPUT_FILE}")
+    feed = baselines.write_feed(store)
+    print(f"📈 Readiness baselines for {len(feed['dates'])} days written to {baselines.FEED_FILE}")
 
 def main():
     client = init_garmin()
-    existing_data = load_existing_data()
+    store = load_store()
+    progress = checkpoint.load()
     today = date.today()
-    start_date = get_start_date(existing_data)
-    
-    if start_date > today:
+
+    # Resume after the last completed day; without a progress file, from the saved data
+    if progress['completed_through']:
+        start_date = date.fromisoformat(progress['completed_through']) + timedelta(days=1)
+        print(f"🔄 Resuming after last completed day: {progress['completed_through']}")
+    else:
+        start_date = get_start_date(store)
+
+    plan = checkpoint.plan(progress, FAMILY_NAMES, start_date, today)
+    retries = sum(1 for d in plan if d < start_date.isoformat())
+    if retries:
+        print(f"🔁 Retrying failed metrics for {retries} earlier days.")
+    if not plan:
         print("✅ Data is already up to date.")
+        publish(store)
         return
 
-    new_data = fetch_daily_stats(client, start_date, today)
-    save_json_data(new_data, existing_data)
+    # Skip families that have been coming back empty, except on their probe days
+    endpoints = planner.load()
+    skipped = planner.filter_plan(endpoints, plan, start_date, exempt=probation_exempt())
+    if skipped:
+        quiet = sorted(f for f, e in endpoints.items() if e['interval'] and f not in probation_exempt())
+        print(f"💤 Skipping {skipped} calls to families with no recent data: {', '.join(quiet)}")
+
+    fetch_with_checkpoints(client, store, progress, plan, endpoints)
+    publish(store)
 
 if __name__ == "__main__":
     main()
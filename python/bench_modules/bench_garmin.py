@@ -0,0 +1,161 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import contextlib
+from datetime import date, timedelta
+
+# --- GARMIN FETCH BENCHMARKS ---
+# Runs the real fetchers against the offline client (garmin_replay) and reports
+# wall time and API calls per scenario:
+#   activities: incremental fetch_garmin sync of N new activities into a store
+#               that already holds the older history, then a re-sync with nothing new
+#   health:     _02_fetch_health.fetch_daily_stats over the last N days, bulk and per-day
+# Run from python/:  python -m bench_modules.bench_garmin [activities|health] [options]
+# --record PATH runs the scenarios against the live service (GARMIN_EMAIL/PASSWORD)
+# and saves the responses; --cassette PATH replays them instead of the synthetic account.
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPT_DIR not in sys.path: sys.path.insert(0, SCRIPT_DIR)
+
+from bench_modules import garmin_replay
+garmin_replay.stub_client_import()  # the offline scenarios run without garminconnect installed
+
+PRODUCTION_RATE = float(os.getenv('GARMIN_HEALTH_RATE', 5))  # before --rate overrides it
+SCENARIOS = ['activities', 'health']
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the Garmin fetchers offline.")
+    parser.add_argument('scenarios', nargs='*', metavar='scenario', help=f"{' | '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--activities', type=int, default=40, help="new activities to sync")
+    parser.add_argument('--days', type=int, default=365, help="days of health data to backfill")
+    parser.add_argument('--end', type=date.fromisoformat, default=date.today(), help="last health day (pin it to replay a recording)")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds per call")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of calls that fail")
+    parser.add_argument('--server-rate', type=float, help="server-side limit in requests/s (429 above it)")
+    parser.add_argument('--rate', type=float, help="client-side Garmin throttle, requests/s (default: 1000 offline, "
+                                                  "the production GARMIN_HEALTH_RATE with --record)")
+    parser.add_argument('--workers', type=int, help="health worker threads (default: GARMIN_HEALTH_WORKERS)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cassette', help="replay this recording instead of the synthetic account")
+    parser.add_argument('--record', help="run against the live service and save the responses here")
+    parser.add_argument('--verbose', action='store_true', help="show the fetchers' own output")
+    args = parser.parse_args(argv)
+    args.scenarios = args.scenarios or SCENARIOS
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown: parser.error(f"unknown scenario: {', '.join(sorted(unknown))}")
+    return args
+
+def report(label, seconds, stats, extra=""):
+    methods = ', '.join(f"{m} {n}" for m, n in sorted(stats['by_method'].items(), key=lambda x: -x[1]))
+    print(f"   {label:<28} {seconds:7.2f}s {stats['calls']:6d} calls  "
+          f"{stats['errors']} failed, {stats['throttled']} throttled, peak {stats['peak_in_flight']} in flight{extra}")
+    print(f"   {'':<28} {methods}")
+
+@contextlib.contextmanager
+def quiet(verbose):
+    """Hides the fetchers' progress output unless verbose."""
+    if verbose:
+        yield
+        return
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        yield
+
+# --- SCENARIOS ---
+def bench_activities(client, args, stats):
+    from sync_modules import activity_store, config, fetch_garmin
+    account = getattr(client, 'source', None)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.GARMIN_DB = os.path.join(tmp, 'garmin_activities.db')
+        config.GARMIN_JSON = os.path.join(tmp, 'missing.json')
+        config.GARMIN_PROBE_LEDGER = os.path.join(tmp, 'garmin_probe_ledger.json')
+        fetch_garmin.login = lambda: client
+
+        # Everything older than the N newest is already stored (rated, so nothing is re-probed)
+        if isinstance(account, garmin_replay.SyntheticAccount):
+            older = [dict(a, RPE=5, Feeling=3) for a in account.history[args.activities:]]
+            store = activity_store.connect()
+            activity_store.upsert(store, [a for a in older if a['sportTypeId'] in config.ALLOWED_SPORT_TYPES])
+            store.close()
+
+        for label in (f"sync {args.activities} new activities", "re-sync, nothing new"):
+            client_reset(client)
+            started = time.perf_counter()
+            with quiet(args.verbose):
+                fetch_garmin.main([])
+            report(label, time.perf_counter() - started, stats())
+
+def bench_health(client, args, stats):
+    import _02_fetch_health as health
+
+    start = args.end - timedelta(days=args.days - 1)
+    for bulk in (True, False):
+        client_reset(client)
+        started = time.perf_counter()
+        with quiet(args.verbose):
+            rows = health.fetch_daily_stats(client, start, args.end, bulk=bulk)
+        s = stats()
+        floor = f", >= {s['calls'] / PRODUCTION_RATE:.0f}s at {PRODUCTION_RATE:g} req/s"
+        report(f"{args.days}-day health, {'bulk' if bulk else 'per-day'}", time.perf_counter() - started, s,
+               f"  ({len(rows)} rows{floor})")
+
+def client_reset(client):
+    if hasattr(client, 'reset'): client.reset()
+
+# --- LIVE RECORDING ---
+class _CountingRecorder(garmin_replay.Recorder):
+    """Recorder that also counts calls, so --record prints the same report."""
+    def __init__(self, client):
+        super().__init__(client)
+        self.counts = {}
+
+    def __getattr__(self, name):
+        call = super().__getattr__(name)
+        if not callable(call) or not (name.startswith('get_') or name == 'connectapi'): return call
+
+        def counted(*args, **kwargs):
+            self.counts[name] = self.counts.get(name, 0) + 1
+            return call(*args, **kwargs)
+        return counted
+
+    def reset(self):
+        self.counts = {}
+
+    def stats(self):
+        counts = dict(self.counts)
+        return {'calls': sum(counts.values()), 'by_method': counts, 'errors': 0, 'throttled': 0, 'peak_in_flight': '?'}
+
+def main(argv=()):
+    args = parse_args(list(argv))
+    # Read by health_modules.throttle on first import, which both fetchers share
+    if args.workers: os.environ['GARMIN_HEALTH_WORKERS'] = str(args.workers)
+    if args.rate is None and not args.record: args.rate = 1000
+    if args.rate is not None:
+        os.environ['GARMIN_HEALTH_RATE'] = str(args.rate)
+        os.environ['GARMIN_HEALTH_BURST'] = str(max(1, int(args.rate)))
+    logging.disable(logging.WARNING if not args.verbose else logging.NOTSET)
+
+    if args.record:
+        from sync_modules import fetch_garmin
+        client = _CountingRecorder(fetch_garmin.login())
+    else:
+        source = garmin_replay.Cassette.load(args.cassette) if args.cassette else \
+            garmin_replay.SyntheticAccount(activities=max(400, args.activities + 100), seed=args.seed)
+        client = garmin_replay.install(garmin_replay.ReplayGarmin(
+            source=source, latency=args.latency, error_rate=args.error_rate,
+            rate=args.server_rate, burst=max(1, int(args.server_rate or 10)), seed=args.seed))
+
+    print(f"⏱️ Garmin fetch benchmarks ({'live, recording' if args.record else 'offline'}; "
+          f"latency {args.latency}s, error rate {args.error_rate:g}, server limit {args.server_rate or 'none'})")
+    for scenario in args.scenarios:
+        {'activities': bench_activities, 'health': bench_health}[scenario](client, args, client.stats)
+
+    if args.record:
+        client.cassette.save(args.record)
+        print(f"💾 Recorded {len(client.cassette.responses)} responses to {args.record}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
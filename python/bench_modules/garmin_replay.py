@@ -0,0 +1,348 @@
+import os
+import sys
+import json
+import gzip
+import copy
+import time
+import types
+import hashlib
+import importlib.util
+import threading
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+# --- OFFLINE GARMIN CLIENT ---
+# Stand-in for garminconnect.Garmin so the fetchers can be run, timed and counted
+# without Garmin Connect. Every get_* / connectapi call is answered by a source:
+#   Cassette:         responses recorded from a live session (see Recorder)
+#   SyntheticAccount: a generated athlete, any number of activities and days
+# and ReplayGarmin adds what the real service does to a client: latency, failing
+# calls and a server-side request limit that answers 429 when exceeded.
+# Failures are decided by a hash of the call and its attempt number, so a run is
+# reproducible however the worker threads interleave.
+
+class TooManyRequests(Exception):
+    """The stand-in's 429 (garminconnect raises GarminConnectTooManyRequestsError)."""
+
+class InjectedError(ConnectionError):
+    """A call failed on purpose (error_rate)."""
+
+def _key(name, args, kwargs):
+    return json.dumps([name, list(args), kwargs], sort_keys=True, default=str)
+
+def _unit(*parts):
+    """Deterministic float in [0, 1) for parts."""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big') / 2 ** 64
+
+def _days(start_str, end_str):
+    start, end = date.fromisoformat(start_str[:10]), date.fromisoformat(end_str[:10])
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+# --- SOURCES ---
+class Cassette:
+    """Recorded responses by (method, args, kwargs). A recorded exception is raised again on replay."""
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rt', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path + '.tmp', 'wt', encoding='utf-8') as f:
+            json.dump(self.responses, f, sort_keys=True)
+        os.replace(path + '.tmp', path)
+
+    def add(self, name, args, kwargs, result=None, error=None):
+        entry = {'error': error} if error else {'result': result}
+        with self.lock:
+            self.responses[_key(name, args, kwargs)] = entry
+
+    def respond(self, name, args, kwargs):
+        entry = self.responses.get(_key(name, args, kwargs))
+        if entry is None:
+            raise LookupError(f"No recording for {name}{tuple(args)}")
+        if 'error' in entry:
+            raise RuntimeError(entry['error'])
+        return copy.deepcopy(entry['result'])
+
+class Recorder:
+    """Wraps a logged-in garminconnect.Garmin and copies every API response into cassette."""
+    def __init__(self, client, cassette=None):
+        self._client = client
+        self.cassette = cassette or Cassette()
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not (name.startswith('get_') or name == 'connectapi') or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                self.cassette.add(name, args, kwargs, error=f"{type(e).__name__}: {e}")
+                raise
+            self.cassette.add(name, args, kwargs, result=result)
+            return result
+        return call
+
+class SyntheticAccount:
+    """
+    A generated athlete: `activities` activities newest first (one every ~20 hours
+    back from now) and daily health data for any date asked. Range endpoints and
+    per-day endpoints agree, so bulk and per-day fetching produce the same rows.
+    """
+    SPORTS = [(1, 'running'), (2, 'cycling'), (5, 'lap_swimming'), (2, 'cycling'), (1, 'running')]
+
+    def __init__(self, activities=400, now=None, seed=0):
+        self.seed = seed
+        now = now or datetime.now().replace(microsecond=0)
+        self.history = [self._activity(i, now - timedelta(hours=20 * i + 2)) for i in range(activities)]
+        self.by_id = {a['activityId']: a for a in self.history}
+
+    def _u(self, *parts):
+        return _unit(self.seed, *parts)
+
+    def _activity(self, i, start):
+        sport_id, type_key = self.SPORTS[i % len(self.SPORTS)]
+        duration = round(1800 + 5400 * self._u('dur', i), 1)
+        speed = {'running': 3.2, 'cycling': 8.5, 'lap_swimming': 1.1}[type_key] * (0.8 + 0.4 * self._u('spd', i))
+        activity = {
+            'activityId': 20000000000 - i * 1000,
+            'activityName': f"Synthetic {type_key.replace('_', ' ')} {i}",
+            'startTimeLocal': start.strftime("%Y-%m-%d %H:%M:%S"),
+            'startTimeGMT': (start + timedelta(hours=6)).strftime("%Y-%m-%d %H:%M:%S"),
+            'activityType': {'typeId': sport_id, 'typeKey': type_key},
+            'sportTypeId': sport_id,
+            'distance': round(duration * speed, 1),
+            'duration': duration,
+            'movingDuration': round(duration * 0.97, 1),
+            'elevationGain': round(400 * self._u('elev', i), 1),
+            'averageSpeed': round(speed, 3),
+            'averageHR': 120 + int(40 * self._u('hr', i)),
+            'maxHR': 165 + int(20 * self._u('mhr', i)),
+            'calories': round(duration / 6, 1),
+            'aerobicTrainingEffect': round(2 + 2 * self._u('te', i), 1),
+        }
+        if type_key == 'running':
+            activity['averageRunningCadenceInStepsPerMinute'] = round(160 + 20 * self._u('cad', i), 1)
+        if type_key == 'cycling':
+            activity['averagePower'] = 150 + int(100 * self._u('pwr', i))
+        return activity
+
+    def respond(self, name, args, kwargs):
+        handler = getattr(self, '_' + name, None)
+        return handler(*args, **kwargs) if handler else None
+
+    # Activities
+    def _get_activities(self, start=0, limit=20, *args):
+        return copy.deepcopy(self.history[start:start + limit])
+
+    def _get_activity(self, activity_id):
+        u = self._u('rpe', activity_id)
+        rated = {'directWorkoutRpe': 10 * (1 + int(u * 10)), 'directWorkoutFeel': 25 * int(u * 5)} if u < 0.7 else {}
+        return {'activityId': activity_id, 'summaryDTO': rated,
+                'activityName': self.by_id.get(activity_id, {}).get('activityName')}
+
+    def _get_activities_by_date(self, start, end=None, activitytype=None, *args):
+        first, last = start[:10], (end or start)[:10]
+        return [copy.deepcopy(a) for a in self.history if first <= a['startTimeLocal'][:10] <= last]
+
+    # Daily health
+    def _has(self, what, day, share):
+        return self._u(what, day) < share
+
+    def _get_user_summary(self, day):
+        u = self._u('summary', day)
+        return {
+            'calendarDate': day,
+            'restingHeartRate': 44 + int(8 * u),
+            'minHeartRate': 40 + int(6 * u),
+            'maxHeartRate': 150 + int(30 * self._u('max', day)),
+            'averageStressLevel': 20 + int(20 * self._u('stress', day)),
+            'maxStressLevel': 80 + int(19 * self._u('stress', day)),
+            'totalSteps': 6000 + int(9000 * self._u('steps', day)),
+            'dailyStepGoal': 10000,
+            'totalDistanceMeters': 5000 + int(8000 * self._u('steps', day)),
+            'activeCalories': 400 + int(900 * self._u('cal', day)),
+            'bodyBatteryHighestValue': 55 + int(45 * self._u('bb', day)),
+            'bodyBatteryLowestValue': 5 + int(25 * self._u('bb', day)),
+            'sleepingSeconds': 21600 + int(10800 * self._u('sleep', day)),
+            'vo2MaxValue': None,
+        }
+
+    def _get_morning_training_readiness(self, day):
+        return {'calendarDate': day, 'trainingReadinessScore': int(100 * self._u('ready', day))}
+
+    def _get_training_status(self, day):
+        return [{'calendarDate': day, 'load': 300 + int(400 * self._u('load', day)), 'vo2Max': 52,
+                 'heatAdaptation': int(10 * self._u('heat', day))}]
+
+    def _get_respiration_data(self, day):
+        return {'calendarDate': day, 'avgWakingRespirationValue': round(13 + 3 * self._u('resp', day), 1)}
+
+    def _get_spo2_data(self, day):
+        return {'calendarDate': day, 'averageSpO2': 94 + int(4 * self._u('spo2', day))} if self._has('spo2?', day, 0.8) else {}
+
+    def _hrv_summary(self, day):
+        return {'calendarDate': day, 'weeklyAverage': 62, 'lastNightAverage': 48 + int(24 * self._u('hrv', day))}
+
+    def _get_hrv_data(self, day):
+        return {'hrvSummary': self._hrv_summary(day)} if self._has('hrv?', day, 0.95) else None
+
+    def _get_floors(self, day):
+        return {'floorsClimbed': int(20 * self._u('floors', day)), 'floorsDescended': int(20 * self._u('down', day)),
+                'floorGoal': 10}
+
+    def _get_max_metrics(self, day):
+        return [{'generic': {'calendarDate': day, 'vo2MaxValue': 52, 'fitnessAge': None}}] if self._has('max?', day, 0.3) else []
+
+    def _get_fitnessage_data(self, day):
+        return {'fitnessAge': 31.5}
+
+    def _get_intensity_minutes_data(self, day):
+        return {'moderateMinutes': int(40 * self._u('mod', day)), 'vigorousMinutes': int(60 * self._u('vig', day))}
+
+    def _bp_readings(self, day):
+        if not self._has('bp?', day, 0.15): return []
+        return [{'systolic': 110 + int(20 * self._u('sys', day)), 'diastolic': 70 + int(12 * self._u('dia', day)),
+                 'measurementTimestampLocal': day + 'T07:30:00'}]
+
+    def _get_blood_pressure(self, start, end=None, *args):
+        summaries = [{'startDate': d, 'measurements': self._bp_readings(d)} for d in _days(start, end or start)]
+        return {'measurementSummaries': [s for s in summaries if s['measurements']]}
+
+    def _weigh_ins(self, day):
+        if not self._has('weigh?', day, 0.4): return []
+        stamp = int(datetime.fromisoformat(day).timestamp() * 1000) + 25200000
+        return [{'calendarDate': day, 'date': stamp, 'weight': 70000.0 + int(3000 * self._u('kg', day)),
+                 'bodyFat': round(12 + 4 * self._u('fat', day), 1), 'muscleMass': 33000.0}]
+
+    def _get_daily_weigh_ins(self, day):
+        return {'startDate': day, 'endDate': day, 'dateWeightList': self._weigh_ins(day), 'totalAverage': None}
+
+    def _get_body_composition(self, start, end=None):
+        weights = [w for d in reversed(_days(start, end or start)) for w in self._weigh_ins(d)]
+        average = None
+        if weights:
+            average = {'weight': sum(w['weight'] for w in weights) / len(weights), 'muscleMass': 33000.0}
+        return {'startDate': start, 'endDate': end or start, 'dateWeightList': weights, 'totalAverage': average}
+
+    def _connectapi(self, path, **kwargs):
+        parts = path.strip('/').split('/')
+        if parts[:3] == ['hrv-service', 'hrv', 'daily']:
+            return {'hrvSummaries': [self._hrv_summary(d) for d in _days(parts[3], parts[4])
+                                     if self._has('hrv?', d, 0.95)]}
+        return None
+
+# --- CLIENT ---
+class _Garth:
+    timeout = None
+    def dump(self, path): pass
+
+class ReplayGarmin:
+    """
+    Drop-in garminconnect.Garmin answering from source.
+      latency:    seconds every call takes
+      error_rate: share of calls that raise InjectedError
+      rate/burst: server-side limit (requests per second); calls over it raise TooManyRequests
+    stats() reports the calls per method, failures, 429s and the peak number of calls in flight.
+    """
+    def __init__(self, email=None, password=None, source=None, latency=0.0, error_rate=0.0,
+                 rate=None, burst=10, seed=0):
+        self.source = source or SyntheticAccount(seed=seed)
+        self.latency, self.error_rate, self.seed = latency, error_rate, seed
+        self.rate, self.burst = rate, burst
+        self.garth = _Garth()
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.calls = Counter()
+            self.attempts = Counter()
+            self.errors = 0
+            self.throttled = 0
+            self.in_flight = 0
+            self.peak_in_flight = 0
+            self.tokens = float(self.burst)
+            self.stamp = time.monotonic()
+
+    def login(self, tokenstore=None):
+        return True
+
+    def stats(self):
+        with self.lock:
+            return {'calls': sum(self.calls.values()), 'by_method': dict(self.calls), 'errors': self.errors,
+                    'throttled': self.throttled, 'peak_in_flight': self.peak_in_flight}
+
+    def _admit(self, name, key):
+        """Counts the call and decides its fate: None (served), or the exception to raise."""
+        with self.lock:
+            self.calls[name] += 1
+            self.attempts[key] += 1
+            attempt = self.attempts[key]
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if self.rate:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens < 1:
+                    self.throttled += 1
+                    return TooManyRequests("429 Too Many Requests")
+                self.tokens -= 1
+            if self.error_rate and _unit(self.seed, key, attempt) < self.error_rate:
+                self.errors += 1
+                return InjectedError(f"Injected failure ({attempt}) of {key}")
+        return None
+
+    def _call(self, name, args, kwargs):
+        key = _key(name, args, kwargs)
+        failure = self._admit(name, key)
+        try:
+            if self.latency: time.sleep(self.latency)
+            if failure: raise failure
+            return self.source.respond(name, args, kwargs)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def __getattr__(self, name):
+        if not (name.startswith('get_') or name == 'connectapi'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: self._call(name, args, kwargs)
+
+def stub_client_import():
+    """
+    Registers a placeholder garminconnect when the package is not installed, so the
+    fetchers import in a bare environment. Its Garmin() refuses to log in; install()
+    a ReplayGarmin to actually run them.
+    """
+    if 'garminconnect' in sys.modules or importlib.util.find_spec('garminconnect'): return
+
+    def missing(*args, **kwargs):
+        raise ImportError("garminconnect is not installed (pip install garminconnect), "
+                          "only offline replay is available")
+    module = types.ModuleType('garminconnect')
+    module.Garmin = missing
+    module.GarminConnectTooManyRequestsError = TooManyRequests
+    sys.modules['garminconnect'] = module
+
+def install(client):
+    """
+    Registers a garminconnect module whose Garmin() returns client, so scripts that
+    import it run offline (and cannot reach the real service by accident).
+    """
+    module = types.ModuleType('garminconnect')
+    module.Garmin = lambda *args, **kwargs: client
+    module.GarminConnectTooManyRequestsError = TooManyRequests
+    sys.modules['garminconnect'] = module
+    return client
@@ -0,0 +1,98 @@
+import os
+import json
+from datetime import datetime
+import numpy as np
+from . import health_store
+
+# --- ROLLING HEALTH BASELINES ---
+# Trailing 7/28/60-day mean and standard deviation of the recovery metrics, for
+# every day and every metric at once: the metrics are stacked into one
+# (metric x day) array and each window is a difference of cumulative sums, so the
+# whole history costs a few array operations per window. Missing days are
+# skipped; a window needs MIN_COVERAGE of its days to count. The readiness feed
+# keeps the last FEED_DAYS days as columns. It is written locally but not
+# committed (gitignored) until a dashboard view reads it.
+
+FEED_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                         'garmin_data', 'readiness_baselines.json')
+METRICS = {
+    'hrv': 'HRV Last Night',
+    'rhr': 'Resting HR',
+    'sleep': 'Sleep Hours',
+    'body_battery': 'Body Batt Max',
+}
+WINDOWS = (7, 28, 60)
+MIN_COVERAGE = 0.5
+FEED_DAYS = 120
+
+def rolling(values, windows=WINDOWS, min_coverage=MIN_COVERAGE):
+    """
+    values: (metrics x days) float array, NaN = missing.
+    Returns {window: (mean, std)}, each (metrics x days); a day's window ends on that day.
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=np.float64))
+    valid = ~np.isnan(values)
+    # Centred on each metric's overall mean so the sum-of-squares variance keeps its precision
+    filled = np.where(valid, values, 0.0)
+    offset = filled.sum(axis=1, keepdims=True) / np.maximum(valid.sum(axis=1, keepdims=True), 1)
+    filled = np.where(valid, values - offset, 0.0)
+
+    # Prefix sums with a leading zero column: window (lo, hi] = prefix[hi] - prefix[lo]
+    pad = ((0, 0), (1, 0))
+    count = np.pad(np.cumsum(valid, axis=1), pad)
+    total = np.pad(np.cumsum(filled, axis=1), pad)
+    squares = np.pad(np.cumsum(filled * filled, axis=1), pad)
+
+    hi = np.arange(1, values.shape[1] + 1)
+    result = {}
+    for window in windows:
+        lo = np.maximum(hi - window, 0)
+        n = count[:, hi] - count[:, lo]
+        s = total[:, hi] - total[:, lo]
+        ss = squares[:, hi] - squares[:, lo]
+        enough = n >= max(2, int(np.ceil(window * min_coverage)))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(enough, s / n, np.nan)
+            var = np.where(enough, (ss - s * mean) / (n - 1), np.nan)  # sample variance
+        result[window] = (mean + offset, np.sqrt(np.maximum(var, 0.0)))
+    return result
+
+def _column(arr, digits=2):
+    return [None if np.isnan(v) else round(float(v), digits) for v in arr]
+
+def build_feed(store, feed_days=FEED_DAYS):
+    """The readiness feed: per metric the daily value and every window's mean/sd, for the last feed_days."""
+    days = health_store.dates(store)
+    keys = list(METRICS)
+    values = np.vstack([health_store.numeric(store, METRICS[k]) for k in keys]) if days else np.empty((len(keys), 0))
+    stats = rolling(values)
+
+    keep = slice(max(0, len(days) - feed_days), len(days))
+    feed = {
+        'generated': datetime.now().strftime('%Y-%m-%d %H:%M'),
+        'windows': list(WINDOWS),
+        'dates': days[keep],
+        'metrics': {}
+    }
+    for m, key in enumerate(keys):
+        entry = {'source': METRICS[key], 'value': _column(values[m, keep])}
+        for window, (mean, sd) in stats.items():
+            entry[f'mean{window}'] = _column(mean[m, keep])
+            entry[f'sd{window}'] = _column(sd[m, keep])
+
+        # Latest reading against the long baseline, for the summary card
+        seen = np.flatnonzero(~np.isnan(values[m]))
+        if len(seen):
+            i = seen[-1]
+            mean, sd = stats[max(WINDOWS)][0][m, i], stats[max(WINDOWS)][1][m, i]
+            z = (values[m, i] - mean) / sd if sd > 0 else np.nan
+            entry['latest'] = {'date': days[i], 'value': _column([values[m, i]])[0], 'z': _column([z])[0]}
+        feed['metrics'][key] = entry
+    return feed
+
+def write_feed(store, path=FEED_FILE):
+    feed = build_feed(store)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(feed, f, separators=(',', ':'))
+    return feed
@@ -0,0 +1,70 @@
+import os
+import json
+from datetime import date, timedelta
+
+# --- RESUMABLE HEALTH FETCH ---
+# Progress of _02_fetch_health, committed together with each batch of saved days:
+#   completed_through: every day up to here has been fetched...
+#   pending:           ...except these (day, metric family) pairs whose calls failed,
+#                      with the number of failed attempts so far.
+# A rerun fetches the days after completed_through plus the pending pairs, so a
+# crash, timeout or expired login only costs the batch that was in flight. Today
+# is never completed: its numbers are still moving, so the next run fetches it again.
+
+PROGRESS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             'garmin_data', 'health_progress.json')
+MAX_ATTEMPTS = 3  # a family failing this often for one day is given up on
+BATCH_DAYS = int(os.getenv('GARMIN_HEALTH_BATCH_DAYS', 14))  # days merged and saved per checkpoint
+
+def load(path=PROGRESS_FILE):
+    """{'completed_through': 'YYYY-MM-DD' or None, 'pending': {date: {family: attempts}}}."""
+    progress = {'completed_through': None, 'pending': {}}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+            progress['completed_through'] = raw['completed_through']
+            progress['pending'] = raw['pending']
+        except Exception as e:
+            print(f"⚠️ Health progress unreadable ({e}). Resuming from saved data.")
+    return progress
+
+def save(progress, path=PROGRESS_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(progress, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def plan(progress, families, start_date, end_date):
+    """
+    {date_str: [family, ...]} still to fetch: every family from start_date on, then
+    the pending pairs of earlier days. New days go first so an expired login is
+    noticed (and the run stopped) before it costs the retries an attempt.
+    """
+    start_str = start_date.isoformat()
+    work = {}
+    day = start_date
+    while day <= end_date:
+        work[day.isoformat()] = list(families)
+        day += timedelta(days=1)
+    for day, failed in sorted(progress['pending'].items()):
+        if day < start_str:
+            work[day] = [f for f in families if f in failed]
+    return work
+
+def record(progress, date_str, failed, today=None):
+    """Marks a fetched day: failed families stay pending (until MAX_ATTEMPTS), the rest are done."""
+    today = (today or date.today()).isoformat()
+    attempts = progress['pending'].pop(date_str, {})
+    still = {}
+    for family in failed:
+        count = attempts.get(family, 0) + 1
+        if count < MAX_ATTEMPTS:
+            still[family] = count
+        else:
+            print(f"   ⚠️ {date_str}: giving up on {family} after {count} failed attempts.")
+    if still:
+        progress['pending'][date_str] = still
+
+    if date_str < today and (progress['completed_through'] or '') < date_str:
+        progress['completed_through'] = date_str
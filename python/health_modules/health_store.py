@@ -0,0 +1,195 @@
+import os
+import json
+from datetime import date, timedelta
+import numpy as np
+
+# --- COLUMNAR DAILY HEALTH STORE ---
+# garmin_health.npz holds one array per metric over a dense day index (day i is
+# start + i), so a consumer loads typed columns instead of re-parsing a list of
+# per-day dicts, and rolling statistics are plain array slices. Numbers are
+# float64 with NaN for missing; text columns use '' for missing. 'kinds' remembers
+# how each column looked in the rows (int / float / str / json), 'ints' marks the
+# days of a mixed int/float column whose value was an int, and 'nulls' marks the
+# days a metric was written as an explicit null, so to_rows() gives back exactly
+# the garmin_health.json rows, which is still exported for the dashboard and
+# NotebookLM.
+
+STORE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                          'garmin_data', 'garmin_health.npz')
+
+def empty():
+    return {'start': None, 'present': np.zeros(0, dtype=bool), 'columns': {}, 'kinds': {}, 'ints': {}, 'nulls': {}}
+
+def dates(store):
+    """ISO date of every slot in the day index."""
+    if store['start'] is None: return []
+    first = date.fromisoformat(store['start'])
+    return [(first + timedelta(days=i)).isoformat() for i in range(len(store['present']))]
+
+def last_date(store):
+    """Newest day that has a row, or None."""
+    filled = np.flatnonzero(store['present'])
+    if not len(filled): return None
+    return (date.fromisoformat(store['start']) + timedelta(days=int(filled[-1]))).isoformat()
+
+def _kind(value):
+    if isinstance(value, bool): return 'json'
+    if isinstance(value, int): return 'int'
+    if isinstance(value, float): return 'float'
+    if isinstance(value, str): return 'str'
+    return 'json'
+
+def _blank(kind, length):
+    if kind in ('int', 'float', 'null'): return np.full(length, np.nan)
+    return np.full(length, '', dtype=object)
+
+def _resize(store, first, last):
+    """Grows the day index to cover [first, last] (ISO dates)."""
+    if store['start'] is None:
+        store['start'] = first
+        store['present'] = np.zeros(0, dtype=bool)
+    start = date.fromisoformat(store['start'])
+    before = max(0, (start - date.fromisoformat(first)).days)
+    length = max(len(store['present']) + before, (date.fromisoformat(last) - start).days + before + 1)
+    after = length - len(store['present']) - before
+    if not before and not after: return
+
+    store['present'] = np.concatenate([np.zeros(before, dtype=bool), store['present'], np.zeros(after, dtype=bool)])
+    for name, col in store['columns'].items():
+        kind = store['kinds'][name]
+        store['columns'][name] = np.concatenate([_blank(kind, before), col, _blank(kind, after)])
+    for masks in (store['ints'], store['nulls']):
+        for name, mask in masks.items():
+            masks[name] = np.concatenate([np.zeros(before, dtype=bool), mask, np.zeros(after, dtype=bool)])
+    store['start'] = (start - timedelta(days=before)).isoformat()
+
+def merge_rows(store, rows):
+    """Merges per-day rows ({'Date': ..., metric: value}) like the JSON did: new keys overwrite, others stay."""
+    rows = [r for r in rows if r.get('Date')]
+    if not rows: return store
+    days = [r['Date'] for r in rows]
+    _resize(store, min(days), max(days))
+    start = date.fromisoformat(store['start'])
+
+    for row in rows:
+        i = (date.fromisoformat(row['Date']) - start).days
+        store['present'][i] = True
+        for name, value in row.items():
+            if name == 'Date': continue
+            if value is None:
+                _set_null(store, name, i)
+                continue
+            kind = _kind(value)
+            if store['kinds'].get(name, 'null') == 'null':
+                # New column, or one that has only ever been null
+                store['columns'][name] = _blank(kind, len(store['present']))
+                store['kinds'][name] = kind
+            elif store['kinds'][name] != kind:
+                store['kinds'][name] = _widen(store, name, kind)
+            col = store['columns'][name]
+            col[i] = json.dumps(value) if store['kinds'][name] == 'json' else value
+            if name in store['ints']: store['ints'][name][i] = kind == 'int'
+            if name in store['nulls']: store['nulls'][name][i] = False
+    return store
+
+def _set_null(store, name, i):
+    if name not in store['columns']:
+        store['columns'][name] = _blank('null', len(store['present']))
+        store['kinds'][name] = 'null'
+    if name not in store['nulls']:
+        store['nulls'][name] = np.zeros(len(store['present']), dtype=bool)
+    store['nulls'][name][i] = True
+    kind = store['kinds'][name]
+    store['columns'][name][i] = np.nan if kind in ('int', 'float', 'null') else ''
+
+def _widen(store, name, kind):
+    """A column seen with a second kind: int+float become float (ints remembered per day), anything else json."""
+    old = store['kinds'][name]
+    col = store['columns'][name]
+    if {old, kind} == {'int', 'float'}:
+        if name not in store['ints']:
+            store['ints'][name] = ~np.isnan(col) if old == 'int' else np.zeros(len(col), dtype=bool)
+        return 'float'
+    if old in ('int', 'float'):
+        ints = store['ints'].pop(name, None)
+        cast = [int if old == 'int' or (ints is not None and ints[i]) else float for i in range(len(col))]
+        store['columns'][name] = np.array(['' if np.isnan(v) else json.dumps(cast[i](v)) for i, v in enumerate(col)],
+                                          dtype=object)
+    elif old == 'str':
+        store['columns'][name] = np.array(['' if v == '' else json.dumps(v) for v in col], dtype=object)
+    return 'json'
+
+def _value(kind, raw):
+    if kind == 'int': return int(raw)
+    if kind == 'float': return float(raw)
+    if kind == 'str': return raw
+    return json.loads(raw)
+
+def to_rows(store):
+    """Per-day dicts, newest first: the garmin_health.json layout."""
+    rows = []
+    names = list(store['columns'])
+    for i, day in enumerate(dates(store)):
+        if not store['present'][i]: continue
+        row = {'Date': day}
+        for name in names:
+            if name in store['nulls'] and store['nulls'][name][i]:
+                row[name] = None
+                continue
+            raw = store['columns'][name][i]
+            if store['kinds'][name] in ('int', 'float', 'null'):
+                if np.isnan(raw): continue
+            elif raw == '':
+                continue
+            kind = 'int' if name in store['ints'] and store['ints'][name][i] else store['kinds'][name]
+            row[name] = _value(kind, raw)
+        rows.append(row)
+    rows.reverse()
+    return rows
+
+def numeric(store, name):
+    """A metric as a float64 array over the day index (all-NaN if the column is missing or not numeric)."""
+    if store['kinds'].get(name) not in ('int', 'float'):
+        return np.full(len(store['present']), np.nan)
+    return store['columns'][name]
+
+def load(path=STORE_FILE):
+    """The saved store, or None if there is none yet."""
+    if not os.path.exists(path): return None
+    with np.load(path, allow_pickle=False) as npz:
+        meta = json.loads(str(npz['meta']))
+        store = {'start': meta['start'], 'present': npz['present'], 'columns': {}, 'kinds': {}, 'ints': {}, 'nulls': {}}
+        for i, (name, kind) in enumerate(meta['columns']):
+            col = npz[f'c{i}']
+            store['columns'][name] = col.astype(np.float64) if kind in ('int', 'float', 'null') else col.astype(object)
+            store['kinds'][name] = kind
+            if f'i{i}' in npz.files:
+                store['ints'][name] = npz[f'i{i}']
+            if f'n{i}' in npz.files:
+                store['nulls'][name] = npz[f'n{i}']
+    return store
+
+def save(store, path=STORE_FILE):
+    # Column names ('Weight (lbs)', 'Body Fat %') live in the metadata; arrays are stored as c0, c1, ...
+    # with the int mask of column i, if it has one, as i{i} and its null mask as n{i}
+    meta = {'start': store['start'], 'columns': [[n, store['kinds'][n]] for n in store['columns']]}
+    arrays = {'meta': np.array(json.dumps(meta)), 'present': store['present']}
+    for i, (name, col) in enumerate(store['columns'].items()):
+        arrays[f'c{i}'] = col if store['kinds'][name] in ('int', 'float', 'null') else col.astype(str)
+        if name in store['ints']:
+            arrays[f'i{i}'] = store['ints'][name]
+        if name in store['nulls']:
+            arrays[f'n{i}'] = store['nulls'][name]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp.npz'
+    np.savez_compressed(tmp, **arrays)
+    os.replace(tmp, path)
+
+def export_json(store, path):
+    """Writes the row-oriented garmin_health.json from the store."""
+    rows = to_rows(store)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(rows, f, indent=4)
+    os.replace(path + '.tmp', path)
+    return rows
@@ -0,0 +1,100 @@
+import os
+import json
+from datetime import date, timedelta
+
+# --- ADAPTIVE ENDPOINT PLANNER ---
+# Many metric families never return anything for a given athlete (no BP cuff, no
+# scale, no SpO2 sensor), yet each costs a call per day. Per family we track how
+# recent days came back:
+#   - EMPTY_DAYS_BEFORE_BACKOFF empty days in a row put it on probation: it is only
+#     fetched on probe days, with the interval doubling after every empty probe
+#     (up to MAX_PROBE_INTERVAL_DAYS, kept off a multiple of 7 so the probes walk
+#     through the weekdays and a family that only reports on one of them is seen).
+#   - Any data ends probation at once, and the days skipped meanwhile are queued
+#     as checkpoint retries, so nothing is lost when a family comes back.
+# Only completed days (before today) count, and failed calls are not "empty".
+
+STATE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                          'garmin_data', 'health_endpoints.json')
+EMPTY_DAYS_BEFORE_BACKOFF = 14
+MAX_PROBE_INTERVAL_DAYS = 27
+MAX_REFILL_DAYS = 60            # most skipped days re-queued when a family comes back
+ALWAYS_FETCH = {'summary'}      # the row's anchor (Date, core metrics)
+
+def _new_entry():
+    return {'last_seen': None, 'last_hit': None, 'empty_streak': 0, 'hits': 0, 'fetches': 0,
+            'interval': 0, 'next_probe': None, 'skipped_from': None}
+
+def load(path=STATE_FILE):
+    """{family: entry}; empty (everything fetched) if missing or unreadable."""
+    if not os.path.exists(path): return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ Endpoint stats unreadable ({e}). Fetching every family.")
+        return {}
+
+def save(state, path=STATE_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def wanted(state, family, date_str, exempt=()):
+    """Whether family should be fetched for date_str (always, unless on probation and not yet due)."""
+    entry = state.get(family)
+    if family in ALWAYS_FETCH or family in exempt or not entry or not entry['interval']: return True
+    return date_str >= entry['next_probe']
+
+def filter_plan(state, plan, from_date, exempt=()):
+    """
+    Drops families on probation from the days on/after from_date (retries are left
+    alone). exempt: families that are never skipped (e.g. one range call covers
+    every day anyway). Returns skipped pairs.
+    """
+    start = from_date.isoformat()
+    skipped = 0
+    for day, families in plan.items():
+        if day < start: continue
+        keep = [f for f in families if wanted(state, f, day, exempt)]
+        skipped += len(families) - len(keep)
+        plan[day] = keep
+    return skipped
+
+def observe(state, family, date_str, had_data, today=None):
+    """
+    Records one fetched (family, day). Returns the skipped days to re-fetch when a
+    family on probation returns data again, else [].
+    """
+    if date_str >= (today or date.today()).isoformat(): return []  # today's numbers are still coming in
+    entry = state.setdefault(family, _new_entry())
+    if entry['last_seen'] and date_str <= entry['last_seen']: return []  # retries of older days
+    entry['last_seen'] = date_str
+    entry['fetches'] += 1
+
+    if had_data:
+        refill = []
+        if entry['skipped_from']:
+            first = max(date.fromisoformat(entry['skipped_from']),
+                        date.fromisoformat(date_str) - timedelta(days=MAX_REFILL_DAYS))
+            day = first
+            while day.isoformat() < date_str:
+                refill.append(day.isoformat())
+                day += timedelta(days=1)
+            print(f"   📈 {family} returned data again on {date_str}. Re-queuing {len(refill)} skipped days.")
+        entry.update({'last_hit': date_str, 'empty_streak': 0, 'hits': entry['hits'] + 1,
+                      'interval': 0, 'next_probe': None, 'skipped_from': None})
+        return refill
+
+    entry['empty_streak'] += 1
+    if entry['interval']:
+        entry['interval'] = min(entry['interval'] * 2, MAX_PROBE_INTERVAL_DAYS)
+    elif entry['empty_streak'] >= EMPTY_DAYS_BEFORE_BACKOFF:
+        entry['interval'] = 2
+        entry['skipped_from'] = (date.fromisoformat(date_str) + timedelta(days=1)).isoformat()
+        print(f"   📉 {family} empty for {entry['empty_streak']} days. Probing it less often.")
+    else:
+        return []
+    entry['next_probe'] = (date.fromisoformat(date_str) + timedelta(days=entry['interval'])).isoformat()
+    return []
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+# --- GARMIN REQUEST THROTTLE ---
+# Garmin Connect publishes no limits but locks out clients that hammer it, so every
+# health call goes through one process-wide token bucket: REQUESTS_PER_SECOND on
+# average, bursts of up to BURST. The worker threads share it, which means adding
+# workers hides request latency without raising the request rate.
+
+REQUESTS_PER_SECOND = float(os.getenv('GARMIN_HEALTH_RATE', 5))
+BURST = int(os.getenv('GARMIN_HEALTH_BURST', 5))
+MAX_WORKERS = int(os.getenv('GARMIN_HEALTH_WORKERS', 8))
+
+class RateLimiter:
+    def __init__(self, rate=REQUESTS_PER_SECOND, burst=BURST, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.clock, self.sleep = clock, sleep
+        self.stamp = clock()
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one request from the bucket, sleeping until one is available."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.calls += 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+
+class ThrottledClient:
+    """
+    Wraps a garminconnect.Garmin so every API call (get_*, connectapi) first takes a
+    token. Calls that raise are counted per thread, because the metric fetchers
+    swallow their errors: run() reports whether a fetch hit any.
+    """
+    def __init__(self, client, limiter):
+        self._client = client
+        self._limiter = limiter
+        self._local = threading.local()
+
+    def run(self, fetcher, *args):
+        """fetcher(self, *args) on this thread, as (result, number of API calls that raised)."""
+        self._local.failures = 0
+        result = fetcher(self, *args)
+        return result, self._local.failures
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if not (name.startswith('get_') or name == 'connectapi') or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            self._limiter.acquire()
+            try:
+                return attr(*args, **kwargs)
+            except Exception:
+                self._local.failures = getattr(self._local, 'failures', 0) + 1
+                raise
+        return call
@@ -0,0 +1,235 @@
+import os
+import json
+import hashlib
+import sqlite3
+import zlib
+from . import config
+
+# --- GARMIN ACTIVITY STORE ---
+# Keyed SQLite store replacing my_garmin_data_ALL.json as the source of truth.
+# Garmin sends ~100 keys per activity but the pipeline reads ~30, so it is split:
+#   activities: typed projection of the fields sync_database / analyze_trends use
+#               (the hot path, load_all()).
+#   raw:        the full Garmin dict, zlib-compressed JSON (get_many(), export_json()).
+# Upserts only rewrite activities whose content changed, so a sync writes the
+# activities it touched. my_garmin_data_ALL.json stays the committed backup: the
+# database is not checked in (config.GARMIN_DB lives outside the checkout), every
+# sync that changes the store re-exports the file (config.GARMIN_JSON_EXPORT), and
+# connect() folds the file back in whenever its hash differs from the one the store
+# last read or wrote (a fresh machine, or a newer backup pulled from another one).
+
+SCHEMA_VERSION = 1
+
+# (field, SQLite type). When a consumer starts reading another field, add it here
+# and bump SCHEMA_VERSION: the projection is rebuilt from the raw archive.
+PROJECTED_FIELDS = [
+    ('activityId', 'INTEGER PRIMARY KEY'),
+    ('startTimeLocal', 'TEXT'),
+    ('sportTypeId', 'INTEGER'),
+    ('activityType', 'TEXT'),  # dict, stored as JSON
+    ('activityName', 'TEXT'),
+    ('duration', 'REAL'),
+    ('elapsedDuration', 'REAL'),
+    ('distance', 'REAL'),
+    ('calories', 'REAL'),
+    ('elevationGain', 'REAL'),
+    ('averageHR', 'REAL'),
+    ('maxHR', 'REAL'),
+    ('aerobicTrainingEffect', 'REAL'),
+    ('anaerobicTrainingEffect', 'REAL'),
+    ('trainingEffectLabel', 'TEXT'),
+    ('avgPower', 'REAL'),
+    ('maxPower', 'REAL'),
+    ('normPower', 'REAL'),
+    ('trainingStressScore', 'REAL'),
+    ('intensityFactor', 'REAL'),
+    ('averageSpeed', 'REAL'),
+    ('maxSpeed', 'REAL'),
+    ('averageBikingCadenceInRevPerMinute', 'REAL'),
+    ('averageRunningCadenceInStepsPerMinute', 'REAL'),
+    ('avgStrideLength', 'REAL'),
+    ('avgVerticalOscillation', 'REAL'),
+    ('avgVerticalRatio', 'REAL'),
+    ('avgGroundContactTime', 'REAL'),
+    ('vO2MaxValue', 'REAL'),
+    ('RPE', ''),  # no affinity: normalize_rpe returns int or float, keep as sent
+    ('Feeling', 'INTEGER'),
+]
+JSON_FIELDS = {'activityType'}
+FIELD_NAMES = [name for name, _ in PROJECTED_FIELDS]
+
+_COLUMNS = ",\n    ".join(f"{name} {kind}".rstrip() for name, kind in PROJECTED_FIELDS)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS activities (
+    {_COLUMNS}
+);
+CREATE INDEX IF NOT EXISTS idx_activities_start ON activities(startTimeLocal);
+CREATE INDEX IF NOT EXISTS idx_activities_sport ON activities(sportTypeId);
+CREATE TABLE IF NOT EXISTS raw (
+    activityId INTEGER PRIMARY KEY,
+    payload BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+def _compress(activity):
+    # Garmin's key order is kept, so export_json() reproduces the committed file byte for byte
+    return zlib.compress(json.dumps(activity, separators=(',', ':')).encode('utf-8'), 9)
+
+def _decompress(payload):
+    return json.loads(zlib.decompress(payload))
+
+def _project(activity):
+    row = []
+    for name in FIELD_NAMES:
+        val = activity.get(name)
+        if name in JSON_FIELDS and val is not None:
+            val = json.dumps(val, sort_keys=True, separators=(',', ':'))
+        row.append(val)
+    return row
+
+def _unproject(row):
+    activity = dict(zip(FIELD_NAMES, row))
+    for name in JSON_FIELDS:
+        if activity[name] is not None:
+            activity[name] = json.loads(activity[name])
+    return activity
+
+def _migrate(conn):
+    """Brings an older store up to SCHEMA_VERSION, keeping every activity."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version == SCHEMA_VERSION: return
+
+    tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    columns = [c[1] for c in conn.execute("PRAGMA table_info(activities)")] if 'activities' in tables else []
+    if 'data' in columns:
+        # v0: one table holding the full activity JSON
+        legacy = [json.loads(data) for (data,) in conn.execute("SELECT data FROM activities")]
+    elif 'raw' in tables:
+        # projected fields changed: rebuild the projection from the archive
+        legacy = [_decompress(p) for (p,) in conn.execute("SELECT payload FROM raw")]
+    else:
+        legacy = []
+
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS activities")
+        conn.execute("DROP TABLE IF EXISTS raw")
+    conn.executescript(SCHEMA)
+    if legacy:
+        upsert(conn, legacy)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.execute("VACUUM")
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _get_meta(conn, key):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+def _set_meta(conn, key, value):
+    with conn:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+def _sync_from_json(conn):
+    """Upserts the backup JSON when it is not the version this store last read or wrote."""
+    if not os.path.exists(config.GARMIN_JSON): return
+    digest = _file_digest(config.GARMIN_JSON)
+    if digest == _get_meta(conn, 'json_digest'): return
+
+    with open(config.GARMIN_JSON, 'r', encoding='utf-8') as f:
+        try:
+            legacy = json.load(f)
+        except json.JSONDecodeError:
+            legacy = []
+    if legacy:
+        changed = upsert(conn, legacy)
+        print(f"   -> {os.path.basename(config.GARMIN_JSON)} changed: {changed} of {len(legacy)} activities refreshed.")
+    _set_meta(conn, 'json_digest', digest)
+
+def connect(path=None):
+    """
+    Opens (creating or migrating if needed) the store, then folds in the backup JSON
+    if it changed since the store last saw it. Activities only in the store are kept.
+    """
+    path = path or config.GARMIN_DB
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path)
+    _migrate(conn)
+    conn.executescript(SCHEMA)  # tables added since the store was created
+    _sync_from_json(conn)
+    return conn
+
+def _stored_payloads(conn, activity_ids):
+    found = {}
+    ids = list(activity_ids)
+    for i in range(0, len(ids), 500):  # stay under SQLite's bound-parameter limit
+        chunk = ids[i:i + 500]
+        marks = ",".join("?" * len(chunk))
+        found.update(conn.execute(f"SELECT activityId, payload FROM raw WHERE activityId IN ({marks})", chunk))
+    return found
+
+def upsert(conn, activities):
+    """Inserts or replaces activities by activityId. Returns how many actually changed."""
+    payloads = {a['activityId']: (a, _compress(a)) for a in activities}
+    stored = _stored_payloads(conn, payloads)
+    # Same bytes, or the same fields in another order, is unchanged
+    changed = [(a, blob) for aid, (a, blob) in payloads.items()
+               if stored.get(aid) != blob and (aid not in stored or _decompress(stored[aid]) != a)]
+    if not changed: return 0
+
+    marks = ",".join("?" * len(FIELD_NAMES))
+    with conn:
+        conn.executemany(f"INSERT OR REPLACE INTO activities ({','.join(FIELD_NAMES)}) VALUES ({marks})",
+                         [_project(a) for a, _ in changed])
+        conn.executemany("INSERT OR REPLACE INTO raw (activityId, payload) VALUES (?, ?)",
+                         [(a['activityId'], blob) for a, blob in changed])
+    return len(changed)
+
+def newest_start(conn):
+    """startTimeLocal of the newest stored activity (None for an empty store)."""
+    return conn.execute("SELECT MAX(startTimeLocal) FROM activities").fetchone()[0]
+
+def get_many(conn, activity_ids):
+    """{activityId: full activity} for the ids that are stored."""
+    return {aid: _decompress(p) for aid, p in _stored_payloads(conn, activity_ids).items()}
+
+def load_all(conn=None, sport_types=None, since=None, raw=False):
+    """
+    Activities newest first (the legacy JSON order), optionally by sport / startTimeLocal >= since.
+    Returns the projected fields only; raw=True returns the full Garmin dicts.
+    """
+    own = conn is None
+    conn = conn or connect()
+    select = "r.payload FROM activities a JOIN raw r USING (activityId)" if raw else f"{','.join(FIELD_NAMES)} FROM activities a"
+    query, args = f"SELECT {select} WHERE 1=1", []
+    if sport_types is not None:
+        query += f" AND a.sportTypeId IN ({','.join('?' * len(sport_types))})"
+        args += list(sport_types)
+    if since is not None:
+        query += " AND a.startTimeLocal >= ?"
+        args.append(since)
+    query += " ORDER BY a.startTimeLocal DESC, a.activityId DESC"
+    try:
+        if raw:
+            return [_decompress(p) for (p,) in conn.execute(query, args)]
+        return [_unproject(row) for row in conn.execute(query, args)]
+    finally:
+        if own: conn.close()
+
+def export_json(conn, path=None):
+    """Writes the legacy my_garmin_data_ALL.json (full dicts) from the store."""
+    path = path or config.GARMIN_JSON
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(load_all(conn, raw=True), f, indent=4)
+    if os.path.abspath(path) == os.path.abspath(config.GARMIN_JSON):
+        _set_meta(conn, 'json_digest', _file_digest(path))  # our own export is not news
@@ -1,14 +1,9 @@
-import json
 import pandas as pd
 import numpy as np
-import os
-from . import config
+from . import config, activity_store
 
 def load_data():
-    if not os.path.exists(config.GARMIN_JSON): return pd.DataFrame()
-    with open(config.GARMIN_JSON, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return pd.DataFrame(data)
+    return pd.DataFrame(activity_store.load_all())
 
 def calculate_slope(series):
     """Calculates linear regression slope for a series."""
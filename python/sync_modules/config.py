@@ -10,16 +10,33 @@ DASHBOARD_DIR = os.path.join(DATA_DIR, 'dashboard')
 if not os.path.exists(DASHBOARD_DIR):
     os.makedirs(DASHBOARD_DIR)
 
+# Local stores that must outlive a run live outside the checkout: the CI checkout
+# cleans the workspace (git clean -ffdx) before every run.
+LOCAL_CACHE_DIR = os.getenv('TRAINING_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'training'))
+
 # --- FILE PATHS ---
-GARMIN_JSON = os.path.join(DATA_DIR, 'my_garmin_data_ALL.json')
+GARMIN_DB = os.getenv('GARMIN_DB', os.path.join(LOCAL_CACHE_DIR, 'garmin_activities.db'))
+GARMIN_JSON = os.path.join(DATA_DIR, 'my_garmin_data_ALL.json')  # committed backup; re-seeds the store when it changes
+GARMIN_JSON_EXPORT = os.getenv('GARMIN_JSON_EXPORT', 'true').lower() == 'true'  # 'false' skips it on local runs
+GARMIN_PROBE_LEDGER = os.path.join(DATA_DIR, 'garmin_probe_ledger.json')
 PLANNED_JSON = os.path.join(DASHBOARD_DIR, 'planned.json') 
 MASTER_DB_JSON = os.path.join(DATA_DIR, 'training_log.json')
 COACH_BRIEFING_MD = os.path.join(DATA_DIR, 'COACH_BRIEFING.md')
 PLAN_MARKDOWN = os.path.join(DATA_DIR, 'current_week.md')
 
 # --- SETTINGS ---
-GARMIN_FETCH_LIMIT = 40
+GARMIN_FETCH_LIMIT = 40         # First sync into an empty store (history comes from --backfill)
+GARMIN_PAGE_SIZE = 20           # Incremental sync pages until it reaches the newest stored activity
+GARMIN_MAX_PAGES = 50           # ...but never more than this many pages per run
+GARMIN_BACKFILL_PAGE_SIZE = 100
+GARMIN_BACKFILL_WORKERS = 4     # Activity-list pages fetched in parallel during --backfill
 ALLOWED_SPORT_TYPES = [1, 2, 5, 255]  # Run, Bike, Swim, Other (Garmin IDs)
+GARMIN_DEEP_FETCH_WORKERS = 8   # Parallel get_activity calls (RPE/Feeling lookups), throttled to GARMIN_HEALTH_RATE req/s
+GARMIN_REQUEST_TIMEOUT = 20     # Seconds per Garmin Connect request
+# Activities still missing RPE are re-probed at most once per TTL, and only while young
+# (athletes log RPE right after the session, rarely days later).
+GARMIN_RPE_REPROBE_HOURS = 24
+GARMIN_RPE_MAX_AGE_DAYS = 7
 
 # Set your timezone here. 
 # This handles DST automatically (e.g., -6 in Summer, -7 in Winter for Mountain Time).
@@ -1,8 +1,13 @@
 import os
+import sys
 import json
+import argparse
 import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 from garminconnect import Garmin
-from . import config
+from health_modules import throttle
+from . import activity_store, config
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO)
@@ -15,19 +20,38 @@ def get_credentials():
         raise ValueError("Missing GARMIN_EMAIL or GARMIN_PASSWORD environment variables.")
     return email, password
 
-def load_cache():
-    if not os.path.exists(config.GARMIN_JSON):
-        return []
-    with open(config.GARMIN_JSON, 'r', encoding='utf-8') as f:
+# --- PROBE LEDGER ---
+# When each activity was last deep-fetched for RPE/Feeling and whether it had any,
+# so activities the athlete never rated aren't re-fetched on every sync.
+def load_probe_ledger():
+    if not os.path.exists(config.GARMIN_PROBE_LEDGER):
+        return {}
+    with open(config.GARMIN_PROBE_LEDGER, 'r', encoding='utf-8') as f:
         try:
             return json.load(f)
         except json.JSONDecodeError:
-            return []
+            return {}
 
-def save_cache(data):
-    os.makedirs(os.path.dirname(config.GARMIN_JSON), exist_ok=True)
-    with open(config.GARMIN_JSON, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=4)
+def save_probe_ledger(ledger):
+    os.makedirs(os.path.dirname(config.GARMIN_PROBE_LEDGER), exist_ok=True)
+    with open(config.GARMIN_PROBE_LEDGER, 'w', encoding='utf-8') as f:
+        json.dump(ledger, f, indent=1, sort_keys=True)
+
+def should_probe(activity, cached, ledger, now):
+    """New activities always; cached ones missing RPE only while young and once per TTL."""
+    if cached is None: return True
+    if cached.get('RPE') is not None: return False
+
+    try:
+        started = datetime.strptime(activity['startTimeLocal'], "%Y-%m-%d %H:%M:%S")
+    except Exception:
+        return False
+    if now - started > timedelta(days=config.GARMIN_RPE_MAX_AGE_DAYS): return False
+
+    entry = ledger.get(str(activity['activityId']))
+    if not entry: return True
+    last = datetime.strptime(entry['checked_at'], "%Y-%m-%d %H:%M:%S")
+    return now - last >= timedelta(hours=config.GARMIN_RPE_REPROBE_HOURS)
 
 def normalize_rpe(val):
     # Garmin RPE is often 1-100 or 10-100. Normalize to 1-10.
@@ -43,7 +67,7 @@ def normalize_feeling(val):
     return max(1, min(5, round((val / 25) + 1)))
 
 def deep_fetch_activity(client, activity_id):
-    """Fetches full activity details to find RPE/Feeling."""
+    """Fetches full activity details to find RPE/Feeling. Returns (rpe, feeling), or None if the fetch failed."""
     try:
         act = client.get_activity(activity_id)
         
@@ -68,9 +92,80 @@ def deep_fetch_activity(client, activity_id):
         return normalize_rpe(rpe), normalize_feeling(feeling)
     except Exception as e:
         logger.warning(f"Failed to deep fetch activity {activity_id}: {e}")
-        return None, None
+        return None
+
+def deep_fetch_all(client, activity_ids):
+    """
+    Runs deep_fetch_activity for many activities on a bounded thread pool.
+    Returns {activity_id: (rpe, feeling)} for the fetches that succeeded; failed ones
+    are left out so they are not mistaken for activities without a rating.
+    """
+    if not activity_ids: return {}
+    workers = max(1, min(config.GARMIN_DEEP_FETCH_WORKERS, len(activity_ids)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {act_id: pool.submit(deep_fetch_activity, client, act_id) for act_id in activity_ids}
+        results = {act_id: future.result() for act_id, future in futures.items()}
+
+    failed = [act_id for act_id, result in results.items() if result is None]
+    if failed:
+        print(f"   ⚠️ {len(failed)} deep fetch(es) failed; they will be retried next sync.")
+    return {act_id: result for act_id, result in results.items() if result is not None}
+
+# --- ACTIVITY LISTING ---
+def list_new_activities(client, store, now):
+    """
+    Pages the activity list newest first until it reaches the newest stored activity
+    (and the start of the RPE re-probe window), so quiet days cost one small page
+    and a long gap is still covered. An empty store gets the last GARMIN_FETCH_LIMIT.
+    """
+    newest = activity_store.newest_start(store)
+    if newest is None:
+        print(f"   -> Empty store. Fetching last {config.GARMIN_FETCH_LIMIT} activities (use --backfill for history)...")
+        return client.get_activities(0, config.GARMIN_FETCH_LIMIT)
 
-def main():
+    reprobe_from = (now - timedelta(days=config.GARMIN_RPE_MAX_AGE_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    stop_at = min(newest, reprobe_from)
+    size = config.GARMIN_PAGE_SIZE
+
+    activities = []
+    for page in range(config.GARMIN_MAX_PAGES):
+        batch = client.get_activities(page * size, size)
+        activities.extend(batch)
+        if len(batch) < size or any(a.get('startTimeLocal', '') <= stop_at for a in batch):
+            break
+    print(f"   -> Listed {len(activities)} activities in {page + 1} page(s) (back to {stop_at}).")
+    return activities
+
+def list_backfill(client, since=None, max_pages=None):
+    """
+    Lists history in parallel waves of GARMIN_BACKFILL_WORKERS offset pages until
+    Garmin runs out, the listing passes since (YYYY-MM-DD) or max_pages is reached.
+    """
+    size = config.GARMIN_BACKFILL_PAGE_SIZE
+    workers = config.GARMIN_BACKFILL_WORKERS
+    activities = []
+    page = 0
+    done = False
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while not done:
+            wave = range(page, page + workers if max_pages is None else min(page + workers, max_pages))
+            if not wave: break
+            batches = pool.map(lambda p: client.get_activities(p * size, size), wave)
+            for batch in batches:
+                activities.extend(batch)
+                if len(batch) < size or (since and batch[-1].get('startTimeLocal', '') < since):
+                    done = True
+                    break
+            page = wave.stop
+            print(f"   -> Listed {page} page(s), {len(activities)} activities...")
+
+    if since:
+        activities = [a for a in activities if a.get('startTimeLocal', '') >= since]
+    return activities
+
+# --- SYNC ---
+def login():
     email, password = get_credentials()
     
     print("   -> Authenticating with Garmin Connect...")
@@ -86,28 +181,52 @@ def main():
         client.login()
         os.makedirs(TOKEN_DIR, exist_ok=True)
         client.garth.dump(TOKEN_DIR)
-    
-    print(f"   -> Fetching last {config.GARMIN_FETCH_LIMIT} activities...")
-    activities = client.get_activities(0, config.GARMIN_FETCH_LIMIT)
-    
-    current_cache = load_cache()
-    cache_map = {a['activityId']: a for a in current_cache}
+
+    # Per-request timeout for every Garmin Connect call
+    if hasattr(client, 'garth'):
+        client.garth.timeout = config.GARMIN_REQUEST_TIMEOUT
+    return client
+
+def sync_activities(client, store, activities, now):
+    """Deep fetches what needs it, merges RPE/Feeling and upserts. Returns (new, updated, rows written)."""
+    # Pages can overlap when an activity is uploaded mid-listing
+    activities = list({a['activityId']: a for a in activities}.values())
+
+    cache_map = activity_store.get_many(store, [a['activityId'] for a in activities])
     
     new_count = 0
     updated_count = 0
-    
-    for activity in activities:
-        act_id = activity['activityId']
-        sport_type_id = activity.get('sportTypeId')
-        
-        if sport_type_id not in config.ALLOWED_SPORT_TYPES:
-            continue
 
+    # 1. Decide which activities need a deep fetch (new, or RPE missing and due a re-probe)
+    ledger = load_probe_ledger()
+    allowed = [a for a in activities if a.get('sportTypeId') in config.ALLOWED_SPORT_TYPES]
+    to_probe = [a['activityId'] for a in allowed
+                if should_probe(a, cache_map.get(a['activityId']), ledger, now)]
+
+    # 2. Fetch them in parallel
+    if to_probe:
+        print(f"   -> Deep fetching {len(to_probe)} activities ({config.GARMIN_DEEP_FETCH_WORKERS} workers, "
+              f"{throttle.REQUESTS_PER_SECOND:g} req/s)...")
+    probed = deep_fetch_all(client, to_probe)
+
+    # Only successful probes go in the ledger; failed ones stay due
+    checked_at = now.strftime("%Y-%m-%d %H:%M:%S")
+    for act_id, (rpe, feeling) in probed.items():
+        ledger[str(act_id)] = {'checked_at': checked_at, 'rpe': rpe, 'feeling': feeling}
+
+    # Forget activities past the max age, they are never probed again
+    cutoff = (now - timedelta(days=config.GARMIN_RPE_MAX_AGE_DAYS)).strftime("%Y-%m-%d %H:%M:%S")
+    started = {str(a['activityId']): a.get('startTimeLocal', '') for a in allowed}
+    ledger = {k: v for k, v in ledger.items() if started.get(k, v['checked_at']) >= cutoff}
+    save_probe_ledger(ledger)
+
+    # 3. Merge back in the order Garmin listed them
+    for activity in allowed:
+        act_id = activity['activityId']
         is_new = act_id not in cache_map
-        existing_rpe = cache_map[act_id].get('RPE') if not is_new else None
         
-        if is_new or existing_rpe is None:
-            rpe, feeling = deep_fetch_activity(client, act_id)
+        if act_id in probed:
+            rpe, feeling = probed[act_id]
             activity['RPE'] = rpe
             activity['Feeling'] = feeling
             
@@ -116,6 +235,12 @@ def main():
                 new_count += 1
             else:
                 updated_count += 1
+        elif is_new:
+            # Probe failed: store it unrated; with no ledger entry the next sync retries it
+            activity['RPE'] = None
+            activity['Feeling'] = None
+            cache_map[act_id] = activity
+            new_count += 1
         else:
             cached_rpe = cache_map[act_id].get('RPE')
             cached_feeling = cache_map[act_id].get('Feeling')
@@ -123,9 +248,38 @@ def main():
             activity['Feeling'] = cached_feeling
             cache_map[act_id] = activity
 
-    final_list = sorted(list(cache_map.values()), key=lambda x: x['startTimeLocal'], reverse=True)
-    save_cache(final_list)
-    print(f"   -> Saved {len(final_list)} activities (New: {new_count}, Updated: {updated_count}).")
+    changed = activity_store.upsert(store, [cache_map[a['activityId']] for a in allowed])
+    return new_count, updated_count, changed
+
+def main(argv=()):
+    """
+    Default: incremental sync back to the newest stored activity.
+    --backfill [--since YYYY-MM-DD] [--pages N]: (re)load history in parallel pages.
+    """
+    parser = argparse.ArgumentParser(description="Sync Garmin activities into the activity store.")
+    parser.add_argument('--backfill', action='store_true', help="list history in parallel pages instead of stopping at the newest stored activity")
+    parser.add_argument('--since', help="backfill: oldest start date to keep (YYYY-MM-DD)")
+    parser.add_argument('--pages', type=int, help=f"backfill: at most this many pages of {config.GARMIN_BACKFILL_PAGE_SIZE}")
+    args = parser.parse_args(list(argv))
+
+    # Listing pages and deep fetches share the health fetch's per-second budget
+    client = throttle.ThrottledClient(login(), throttle.RateLimiter())
+    store = activity_store.connect()
+    now = datetime.now()
+
+    if args.backfill:
+        print(f"   -> Backfilling activities ({config.GARMIN_BACKFILL_WORKERS} pages at a time)...")
+        activities = list_backfill(client, since=args.since, max_pages=args.pages)
+    else:
+        activities = list_new_activities(client, store, now)
+
+    new_count, updated_count, changed = sync_activities(client, store, activities, now)
+    total = store.execute("SELECT COUNT(*) FROM activities").fetchone()[0]
+    # The JSON is the committed copy of the store; rewrite it whenever the store changed
+    if config.GARMIN_JSON_EXPORT and (changed or not os.path.exists(config.GARMIN_JSON)):
+        activity_store.export_json(store)
+    store.close()
+    print(f"   -> Stored {total} activities (New: {new_count}, Updated: {updated_count}, Rows written: {changed}).")
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
@@ -5,7 +5,7 @@ import subprocess
 import pandas as pd
 from datetime import datetime
 from zoneinfo import ZoneInfo # Standard in Python 3.9+
-from . import config, build_plan
+from . import config, build_plan, activity_store
 
 def load_json(path):
     if not os.path.exists(path): return []
@@ -201,7 +201,7 @@ def main():
     build_plan.main()
     
     planned_data = load_json(config.PLANNED_JSON)
-    garmin_data = load_json(config.GARMIN_JSON)
+    garmin_data = activity_store.load_all()
     master_log = load_json(config.MASTER_DB_JSON)
     
     # FIX: Use configured timezone name to automatically calculate local date
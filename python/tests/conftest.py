@@ -0,0 +1,12 @@
+import os
+import sys
+
+# --- TEST SETUP ---
+# The scripts run from python/ and import their modules as top-level packages.
+# garminconnect is only needed to talk to the live service: the placeholder from
+# garmin_replay lets the fetchers import without it.
+PYTHON_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PYTHON_DIR not in sys.path: sys.path.insert(0, PYTHON_DIR)
+
+from bench_modules import garmin_replay
+garmin_replay.stub_client_import()
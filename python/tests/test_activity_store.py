@@ -0,0 +1,67 @@
+import json
+import pytest
+from sync_modules import activity_store, config
+
+def _activity(aid, start, sport, **extra):
+    return dict({'activityId': aid, 'startTimeLocal': start, 'sportTypeId': sport,
+                 'activityType': {'typeKey': 'running', 'typeId': 1}, 'activityName': f'Act {aid}',
+                 'duration': 1800.5, 'averageHR': 140.0, 'RPE': 6, 'Feeling': 3,
+                 'summaryPolyline': 'not projected', 'splitSummaries': [{'noOfSplits': 2}]}, **extra)
+
+ACTIVITIES = [  # newest first, like the committed JSON
+    _activity(3, '2025-03-03 07:00:00', 1, RPE=6.5),
+    _activity(2, '2025-03-02 07:00:00', 5, averageHR=None),
+    _activity(1, '2025-03-01 07:00:00', 2),
+]
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'GARMIN_DB', str(tmp_path / 'garmin_activities.db'))
+    monkeypatch.setattr(config, 'GARMIN_JSON', str(tmp_path / 'my_garmin_data_ALL.json'))
+    with open(config.GARMIN_JSON, 'w', encoding='utf-8') as f:
+        json.dump(ACTIVITIES, f, indent=4)
+    conn = activity_store.connect()
+    yield conn
+    conn.close()
+
+def test_projection_matches_the_raw_activities(store):
+    raw = activity_store.load_all(store, raw=True)
+    projected = activity_store.load_all(store)
+    assert raw == ACTIVITIES
+    for full, row in zip(raw, projected):
+        assert row == {name: full.get(name) for name in activity_store.FIELD_NAMES}
+    assert type(projected[0]['RPE']) is float and type(projected[1]['RPE']) is int
+
+def test_filters(store):
+    assert [a['activityId'] for a in activity_store.load_all(store, sport_types=[1, 2])] == [3, 1]
+    assert [a['activityId'] for a in activity_store.load_all(store, since='2025-03-02')] == [3, 2]
+
+def test_upsert_only_writes_changes(store):
+    reordered = [dict(reversed(list(a.items()))) for a in ACTIVITIES]
+    assert activity_store.upsert(store, reordered) == 0
+    assert activity_store.upsert(store, [dict(ACTIVITIES[2], RPE=8)]) == 1
+    assert activity_store.load_all(store, since='2025-03-01')[-1]['RPE'] == 8
+
+def test_export_reproduces_the_seed_file(store, tmp_path):
+    out = tmp_path / 'export.json'
+    activity_store.export_json(store, str(out))
+    with open(config.GARMIN_JSON, 'rb') as f:
+        assert out.read_bytes() == f.read()
+
+def test_changed_backup_refreshes_an_existing_store(store):
+    store.close()
+    newer = [dict(ACTIVITIES[0], RPE=9)] + ACTIVITIES[1:] + [_activity(0, '2025-02-28 07:00:00', 1)]
+    with open(config.GARMIN_JSON, 'w', encoding='utf-8') as f:
+        json.dump(newer, f, indent=4)
+    conn = activity_store.connect()
+    try:
+        assert activity_store.load_all(conn, raw=True) == newer
+    finally:
+        conn.close()
+
+def test_own_export_is_not_read_back(store, monkeypatch):
+    activity_store.upsert(store, [dict(ACTIVITIES[1], RPE=2)])
+    activity_store.export_json(store)
+    store.close()
+    monkeypatch.setattr(activity_store, 'upsert', lambda conn, activities: pytest.fail("re-seeded from its own export"))
+    activity_store.connect().close()
@@ -0,0 +1,77 @@
+import functools
+from datetime import date, timedelta
+import pytest
+import _02_fetch_health as health
+from bench_modules import garmin_replay
+from health_modules import checkpoint, health_store, throttle
+
+START, END = date(2025, 3, 1), date(2025, 3, 30)
+
+class Crash(Exception):
+    pass
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    """Replay client, no throttle, 7-day batches and every file under tmp_path."""
+    monkeypatch.setattr(throttle, 'RateLimiter', functools.partial(throttle.RateLimiter, rate=1e6, burst=10 ** 6))
+    monkeypatch.setattr(checkpoint, 'BATCH_DAYS', 7)
+    monkeypatch.setattr(health_store, 'save', functools.partial(health_store.save, path=str(tmp_path / 'health.npz')))
+    monkeypatch.setattr(checkpoint, 'save', functools.partial(checkpoint.save, path=str(tmp_path / 'progress.json')))
+    monkeypatch.setattr(health.planner, 'save', lambda state: None)
+    return garmin_replay.ReplayGarmin(source=garmin_replay.SyntheticAccount(seed=3))
+
+def _run(client, progress, start, store=None):
+    store = store if store is not None else health_store.empty()
+    plan = checkpoint.plan(progress, health.FAMILY_NAMES, start, END)
+    health.fetch_with_checkpoints(client, store, progress, plan, {}, bulk=True)
+    return store
+
+def test_resume_after_crash_matches_an_uninterrupted_run(offline, tmp_path, monkeypatch):
+    expected = health_store.to_rows(_run(offline, checkpoint.load(str(tmp_path / 'none.json')), START))
+    for saved in ('progress.json', 'health.npz'):
+        (tmp_path / saved).unlink()
+    offline.reset()
+
+    # Crash while merging the third batch: the first two are saved with their progress
+    merge = health_store.merge_rows
+    merges = []
+    def crashing(store, rows):
+        merges.append(rows)
+        if len(merges) == 3: raise Crash()
+        return merge(store, rows)
+    monkeypatch.setattr(health_store, 'merge_rows', crashing)
+    with pytest.raises(Crash):
+        _run(offline, checkpoint.load(str(tmp_path / 'progress.json')), START)
+    monkeypatch.setattr(health_store, 'merge_rows', merge)
+
+    progress = checkpoint.load(str(tmp_path / 'progress.json'))
+    assert progress['completed_through'] == '2025-03-14'
+    store = health_store.load(str(tmp_path / 'health.npz'))
+    assert health_store.last_date(store) == '2025-03-14'
+
+    offline.reset()
+    resumed = _run(offline, progress, date.fromisoformat(progress['completed_through']) + timedelta(days=1), store)
+    assert health_store.to_rows(resumed) == expected
+    # Only the missing days were fetched again
+    assert offline.stats()['by_method']['get_user_summary'] == (END - date(2025, 3, 15)).days + 1
+
+def test_failed_families_stay_pending_until_max_attempts():
+    progress = {'completed_through': None, 'pending': {}}
+    today = date(2030, 1, 1)
+    for attempt in range(1, checkpoint.MAX_ATTEMPTS):
+        checkpoint.record(progress, '2025-03-01', ['hrv'], today=today)
+        assert progress['pending'] == {'2025-03-01': {'hrv': attempt}}
+    checkpoint.record(progress, '2025-03-01', ['hrv'], today=today)
+    assert progress['pending'] == {}
+    assert progress['completed_through'] == '2025-03-01'
+
+    # Pending pairs of earlier days are planned after the new days
+    progress['pending'] = {'2025-02-20': {'hrv': 1}}
+    plan = checkpoint.plan(progress, ['summary', 'hrv'], date(2025, 3, 2), date(2025, 3, 3))
+    assert list(plan) == ['2025-03-02', '2025-03-03', '2025-02-20']
+    assert plan['2025-02-20'] == ['hrv']
+
+def test_today_is_never_completed():
+    progress = {'completed_through': '2025-03-01', 'pending': {}}
+    checkpoint.record(progress, '2025-03-02', [], today=date(2025, 3, 2))
+    assert progress['completed_through'] == '2025-03-01'
@@ -0,0 +1,47 @@
+import pytest
+from datetime import datetime
+from sync_modules import activity_store, config, fetch_garmin
+
+NOW = datetime(2025, 3, 4, 12, 0, 0)
+
+class FlakyClient:
+    """get_activity rates every activity RPE 60, except the ids in failing, which raise."""
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+
+    def get_activity(self, activity_id):
+        if activity_id in self.failing:
+            raise ConnectionError("timed out")
+        return {'summaryDTO': {'directWorkoutRpe': 60, 'directWorkoutFeel': 50}}
+
+def _listed(aid, day):
+    return {'activityId': aid, 'startTimeLocal': f'2025-03-0{day} 07:00:00', 'sportTypeId': 1}
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, 'GARMIN_JSON', str(tmp_path / 'missing.json'))
+    monkeypatch.setattr(config, 'GARMIN_PROBE_LEDGER', str(tmp_path / 'ledger.json'))
+    conn = activity_store.connect(str(tmp_path / 'garmin_activities.db'))
+    yield conn
+    conn.close()
+
+def test_failed_probe_keeps_a_new_activity_and_retries_it(store):
+    activities = [_listed(2, 3), _listed(1, 2)]
+    assert fetch_garmin.sync_activities(FlakyClient(failing={2}), store, activities, NOW)[:2] == (2, 0)
+
+    ledger = fetch_garmin.load_probe_ledger()
+    assert set(ledger) == {'1'} and ledger['1']['rpe'] == 6.0
+    stored = activity_store.get_many(store, [1, 2])
+    assert stored[2]['RPE'] is None and stored[1]['RPE'] == 6.0
+
+    fetch_garmin.sync_activities(FlakyClient(), store, [_listed(2, 3), _listed(1, 2)], NOW)
+    assert activity_store.get_many(store, [2])[2]['RPE'] == 6.0
+
+def test_failed_reprobe_keeps_the_stored_rating(store):
+    fetch_garmin.sync_activities(FlakyClient(), store, [_listed(1, 2)], NOW)
+    activity_store.upsert(store, [dict(activity_store.get_many(store, [1])[1], RPE=None, Feeling=4)])
+    fetch_garmin.save_probe_ledger({})
+
+    fetch_garmin.sync_activities(FlakyClient(failing={1}), store, [_listed(1, 2)], NOW)
+    assert activity_store.get_many(store, [1])[1]['Feeling'] == 4
+    assert fetch_garmin.load_probe_ledger() == {}
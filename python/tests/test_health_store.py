@@ -0,0 +1,45 @@
+import json
+import numpy as np
+from health_modules import health_store
+
+ROWS = [
+    {'Date': '2025-01-01', 'Resting HR': 52, 'Weight (lbs)': 170.4, 'Sleep Score': None, 'Note': 'ok'},
+    {'Date': '2025-01-02', 'Resting HR': 51.5, 'Weight (lbs)': 171, 'Sleep Score': 80},
+    {'Date': '2025-01-04', 'Resting HR': 53, 'Note': {'tags': ['travel']}},
+]
+
+def _newest_first(rows):
+    return sorted(rows, key=lambda r: r['Date'], reverse=True)
+
+def test_rows_round_trip_through_npz(tmp_path):
+    store = health_store.merge_rows(health_store.empty(), ROWS)
+    path = str(tmp_path / 'health.npz')
+    health_store.save(store, path)
+    rows = health_store.to_rows(health_store.load(path))
+    assert json.dumps(rows, sort_keys=True) == json.dumps(_newest_first(ROWS), sort_keys=True)
+
+def test_mixed_int_float_column_keeps_ints(tmp_path):
+    store = health_store.merge_rows(health_store.empty(), ROWS)
+    path = str(tmp_path / 'health.npz')
+    health_store.save(store, path)
+    by_day = {r['Date']: r for r in health_store.to_rows(health_store.load(path))}
+    assert type(by_day['2025-01-01']['Resting HR']) is int
+    assert type(by_day['2025-01-02']['Resting HR']) is float
+    assert type(by_day['2025-01-02']['Weight (lbs)']) is int
+    assert type(by_day['2025-01-01']['Weight (lbs)']) is float
+
+def test_merge_overwrites_like_the_json():
+    store = health_store.merge_rows(health_store.empty(), ROWS)
+    health_store.merge_rows(store, [{'Date': '2025-01-02', 'Resting HR': 49}, {'Date': '2024-12-31', 'Steps': 100}])
+    by_day = {r['Date']: r for r in health_store.to_rows(store)}
+    assert by_day['2025-01-02'] == {'Date': '2025-01-02', 'Resting HR': 49, 'Weight (lbs)': 171, 'Sleep Score': 80}
+    assert type(by_day['2025-01-02']['Resting HR']) is int
+    assert by_day['2024-12-31'] == {'Date': '2024-12-31', 'Steps': 100}
+    assert '2025-01-03' not in by_day
+    assert health_store.last_date(store) == '2025-01-04'
+
+def test_numeric_column_is_float_with_gaps():
+    store = health_store.merge_rows(health_store.empty(), ROWS)
+    hr = health_store.numeric(store, 'Resting HR')
+    assert hr.dtype == np.float64
+    assert np.allclose(hr, [52, 51.5, np.nan, 53], equal_nan=True)
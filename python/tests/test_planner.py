@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+from health_modules import planner
+
+TODAY = date(2030, 1, 1)
+
+def _day(n):
+    return (date(2025, 1, 1) + timedelta(days=n)).isoformat()
+
+def _run(state, family, days, has_data):
+    """Fetches family on the days the planner wants. Returns {day: refill} for the days fetched."""
+    fetched = {}
+    for n in days:
+        if planner.wanted(state, family, _day(n)):
+            fetched[_day(n)] = planner.observe(state, family, _day(n), has_data(n), today=TODAY)
+    return fetched
+
+def test_empty_family_backs_off_and_caps_off_a_weekly_interval():
+    state = {}
+    fetched = _run(state, 'spo2', range(365), lambda n: False)
+    assert all(_day(n) in fetched for n in range(planner.EMPTY_DAYS_BEFORE_BACKOFF))
+    gaps = [(date.fromisoformat(b) - date.fromisoformat(a)).days for a, b in zip(fetched, list(fetched)[1:])]
+    probes = gaps[planner.EMPTY_DAYS_BEFORE_BACKOFF - 1:]
+    assert probes[:4] == [2, 4, 8, 16]
+    assert max(probes) == planner.MAX_PROBE_INTERVAL_DAYS
+    assert planner.MAX_PROBE_INTERVAL_DAYS % 7
+    # Capped probes walk through every weekday
+    capped = [date.fromisoformat(d).weekday() for d in list(fetched)[-8:]]
+    assert len(set(capped)) == 7
+
+def test_family_coming_back_refills_skipped_days():
+    state = {}
+    back = 40
+    fetched = _run(state, 'blood_pressure', range(back + 30), lambda n: n >= back)
+    probe = min(d for d in fetched if d >= _day(back))
+    refill = fetched[probe]
+    skipped = [_day(n) for n in range(back + 30) if _day(n) not in fetched and _day(n) < probe]
+    # The whole span since probation began is re-queued (probe days included), in order
+    assert set(skipped) <= set(refill)
+    assert refill == [d for d in (_day(n) for n in range(back + 30)) if refill[0] <= d < probe]
+    assert state['blood_pressure']['interval'] == 0
+    assert all(_day(n) in fetched for n in range(back + 30) if _day(n) > probe)
+
+def test_filter_plan_skips_quiet_families_but_not_exempt_or_retries():
+    state = {}
+    _run(state, 'hrv', range(20), lambda n: False)
+    _run(state, 'spo2', range(20), lambda n: False)
+    plan = {_day(n): ['summary', 'hrv', 'spo2'] for n in range(20, 24)}
+    plan[_day(3)] = ['hrv']  # a retry of an older day
+    skipped = planner.filter_plan(state, plan, date.fromisoformat(_day(20)), exempt={'hrv'})
+    assert plan[_day(3)] == ['hrv']
+    assert all('summary' in plan[_day(n)] and 'hrv' in plan[_day(n)] for n in range(20, 24))
+    assert skipped == sum(1 for n in range(20, 24) if 'spo2' not in plan[_day(n)]) > 0
+
+def test_today_does_not_count():
+    state = {}
+    for _ in range(planner.EMPTY_DAYS_BEFORE_BACKOFF + 1):
+        planner.observe(state, 'spo2', TODAY.isoformat(), False, today=TODAY)
+    assert state == {}
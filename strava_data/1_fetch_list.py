@@ -1,34 +1,26 @@
-import requests
 import os
 from dotenv import load_dotenv
+from strava_modules import activity_index, strava_api
 
 load_dotenv()
 
-AUTH_URL = "https://www.strava.com/oauth/token"
-ACTIVITIES_URL = "https://www.strava.com/api/v3/athlete/activities"
 OUTPUT_FILE = "activity_ids.txt"
 
-def get_access_token():
-    payload = {
-        'client_id': os.getenv('STRAVA_CLIENT_ID'),
-        'client_secret': os.getenv('STRAVA_CLIENT_SECRET'),
-        'refresh_token': os.getenv('STRAVA_REFRESH_TOKEN'),
-        'grant_type': 'refresh_token',
-        'f': 'json'
-    }
+def get_client():
+    client = strava_api.StravaClient()
     try:
-        res = requests.post(AUTH_URL, data=payload, verify=True)
-        res.raise_for_status()
-        return res.json()['access_token']
-    except Exception as e:
+        client.access_token()
+        return client
+    except strava_api.AuthError as e:
         print(f"❌ Auth Error: {e}")
         # Print response if available to help debug
-        if 'res' in locals():
-            print(f"Response: {res.text}")
+        response = getattr(e.args[0], 'response', None) if e.args else None
+        if response is not None:
+            print(f"Response: {response.text}")
         exit(1)
 
 def fetch_new_ids():
-    # 1. Load existing IDs to create a "Stop List"
+    # 1. Load IDs already exported
     existing_activities = []
     existing_ids = set()
     
@@ -41,53 +33,20 @@ def fetch_new_ids():
     
     print(f"📂 Baseline contains {len(existing_ids)} known activities.")
 
-    token = get_access_token()
-    headers = {'Authorization': f"Bearer {token}"}
-    
-    new_activities = []
-    page = 1
-    keep_fetching = True
+    client = get_client()
     
     print("🚀 Checking for NEW activities since baseline...")
-    
-    while keep_fetching:
-        # Fetch 50 at a time
-        response = requests.get(ACTIVITIES_URL, headers=headers, params={'per_page': 10, 'page': page})
-        
-        # 🛡️ SAFETY CHECK: Handle API Errors
-        if response.status_code != 200:
-            print(f"\n❌ API Error {response.status_code} on Page {page}")
-            print(f"Message: {response.text}")
-            break
-            
-        data = response.json()
-        
-        # 🛡️ SAFETY CHECK: Ensure we got a list
-        if not isinstance(data, list):
-            print(f"\n❌ Unexpected response format (Expected List, got {type(data)}): {data}")
-            break
-        
-        if not data:
-            print(f"   - Page {page}: No more activities found.")
-            break
-            
-        print(f"   - Page {page}: Scanning {len(data)} activities...")
-            
-        for activity in data:
-            act_id = str(activity['id'])
-            
-            # STOP FETCHING if we hit a known ID
-            if act_id in existing_ids:
-                keep_fetching = False
-                continue
-                
-            # If it's new, add to our list
-            # We treat 'Ride' and 'VirtualRide' both as 'Ride' for your downstream logic if you want,
-            # but keeping raw type is safer. Downstream scripts filter by 'Ride' anyway.
-            summary = f"{act_id},{activity['type']},{activity['start_date_local'][:10]}"
-            new_activities.append(summary)
-            
-        page += 1
+
+    # The shared activity index does the (incremental) listing
+    index = activity_index.sync(client)
+
+    new_activities = []
+    for activity in activity_index.activities(index):
+        act_id = str(activity['id'])
+        if act_id in existing_ids:
+            continue
+        # Keeping raw type is safer. Downstream scripts filter by 'Ride' anyway.
+        new_activities.append(f"{act_id},{activity['type']},{activity['date']}")
         
     if new_activities:
         print(f"✨ Found {len(new_activities)} new activities!")
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# --- PATH CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(BASE_DIR)
+sys.path.append(PARENT_DIR)
+from strava_modules import curves
+
+MAX_DURATION_SECONDS = 21600
+RIDE_HOURS = [1, 3, 6]
+
+def synthetic_ride(seconds, seed=42):
+    """Steady endurance power with surges, coasting and sensor noise (integer watts)."""
+    rng = np.random.default_rng(seed)
+    base = 180 + 25 * np.sin(np.arange(seconds) / 900)
+    surges = np.where(rng.random(seconds) < 0.02, rng.integers(150, 600, seconds), 0)
+    coasting = rng.random(seconds) < 0.05
+    watts = np.clip(base + surges + rng.normal(0, 15, seconds), 0, None)
+    watts[coasting] = 0
+    return watts.astype(int).tolist()
+
+def legacy_curve(watts):
+    """The original per-duration pandas loop from process_cycling.update_cache."""
+    power_series = pd.Series(watts)
+    limit = min(len(power_series), MAX_DURATION_SECONDS)
+    curve = []
+    for seconds in range(1, limit + 1):
+        curve.append(int(power_series.rolling(window=seconds).mean().max()))
+    return curve
+
+def main():
+    print("⏱️ Power Curve Benchmark (legacy pandas loop vs prefix-sum engine)\n")
+    print("| Ride | Legacy | Engine | Speed-up | Identical |")
+    print("|---|---|---|---|---|")
+
+    for hours in RIDE_HOURS:
+        watts = synthetic_ride(hours * 3600)
+
+        t0 = time.perf_counter()
+        new = curves.mean_max_power(watts, MAX_DURATION_SECONDS)
+        engine_time = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        old = legacy_curve(watts)
+        legacy_time = time.perf_counter() - t0
+
+        print(f"| {hours}h | {legacy_time:.2f}s | {engine_time:.3f}s | {legacy_time / engine_time:.0f}x | {'✅' if new == old else '❌'} |")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+# --- PATH CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.dirname(BASE_DIR)
+sys.path.append(PARENT_DIR)
+from strava_modules import curve_store
+from strava_simulator import Athlete, Limits, StravaSimulator
+
+# --- STRAVA SYNC BENCHMARK ---
+# Runs the real Strava scripts end to end against the local simulator and reports
+# how many activities each fetch path gets through per rate-limit window. Every
+# path runs in a fresh sandbox (a copy of the scripts, no caches), is rerun until
+# the simulator's 15-minute window is spent or the path runs out of work, and is
+# scored on the activities it wrote to its outputs. The simulator's clock is frozen, so
+# a path always gets exactly one window however long the runs take.
+#
+# To benchmark a new fetch strategy, add it to STRATEGIES: the script to run and,
+# for paths that work through an existing cache, a seed of that cache.
+
+SHORT_LIMIT, DAILY_LIMIT = 100, 1000  # Strava's default read limits
+MAX_RUNS = 25
+
+def _seed_cache(cache_dir, types, athlete, count):
+    """Cache entries without aerobic_decoupling, for the drift backfills to work through."""
+    acts = [a for a in athlete.activities if a['type'] in types and not a['manual']][:count]
+    for act in acts:
+        curve_store.write_activity(cache_dir, {'id': act['id'], 'name': act['name'], 'date': act['start_date_local'][:10]})
+    return len(acts)
+
+# Activities a path has finished, read from what it wrote
+def _listed(sandbox):
+    path = os.path.join(sandbox, 'activity_ids.txt')
+    if not os.path.exists(path): return 0
+    with open(path) as f:
+        return sum(1 for line in f if line.strip())
+
+def _fresh(cache_dir):
+    # The scripts write from their own processes; drop this process's view of the pack
+    curve_store._packs.pop(os.path.abspath(cache_dir), None)
+    return cache_dir
+
+def _cached(cache):
+    return lambda sandbox: len(curve_store.activity_ids(_fresh(os.path.join(sandbox, cache))))
+
+def _scored(cache):
+    def count(sandbox):
+        cache_dir = _fresh(os.path.join(sandbox, cache))
+        return sum('aerobic_decoupling' in curve_store.read_meta(cache_dir, key) for key in curve_store.activity_ids(cache_dir))
+    return count
+
+# name -> (script, (cache dir, activity types) to seed or None, activities processed)
+STRATEGIES = {
+    '1_fetch_list': ('1_fetch_list.py', None, _listed),
+    'cycling update_cache': ('cycling/process_cycling.py', None, _cached('power_cache')),
+    'running update_cache': ('running/process_running.py', None, _cached('running_cache')),
+    'cycling drift backfill': ('cycling/backfill_drift.py', ('power_cache', ('Ride', 'VirtualRide')), _scored('power_cache')),
+    'running drift backfill': ('running/backfill_running_drift.py', ('running_cache', ('Run',)), _scored('running_cache')),
+}
+
+def window_spent(sim):
+    return sim.stats()['throttled'] > 0 or sim.limits.spent()
+
+def make_sandbox(root):
+    """Copy of the Strava scripts and modules only (no caches, archives or outputs)."""
+    def ignore(directory, names):
+        return [n for n in names if n in ('__pycache__', 'benchmarks') or
+                (os.path.isfile(os.path.join(directory, n)) and not n.endswith('.py'))]
+    sandbox = os.path.join(root, 'strava_data')
+    shutil.copytree(PARENT_DIR, sandbox, ignore=ignore)
+    return sandbox
+
+def run_strategy(name, sim, verbose=False):
+    script, seed, processed = STRATEGIES[name]
+    with tempfile.TemporaryDirectory() as root:
+        sandbox = make_sandbox(root)
+        if seed:
+            _seed_cache(os.path.join(sandbox, seed[0]), seed[1], sim.athlete, count=2 * sim.limits.read[0])
+
+        env = dict(os.environ,
+                   STRAVA_API_BASE=sim.url,
+                   STRAVA_CLIENT_ID='bench', STRAVA_CLIENT_SECRET='bench', STRAVA_REFRESH_TOKEN='bench',
+                   STRAVA_TOKEN_CACHE=os.path.join(sandbox, '.strava_token.json'),
+                   STRAVA_STREAM_ARCHIVE=os.path.join(sandbox, 'stream_archive'),
+                   STRAVA_RATE_LIMIT_15MIN=str(sim.limits.read[0]),
+                   STRAVA_RATE_LIMIT_DAILY=str(sim.limits.read[1]),
+                   STRAVA_MAX_RATE_WAIT='0',  # stop at the end of the window instead of sleeping through it
+                   PYTHONIOENCODING='utf-8')
+
+        sim.limits.reset()
+        sim.reset_stats()
+        started = time.perf_counter()
+        runs = 0
+        while runs < MAX_RUNS:
+            done = processed(sandbox)
+            runs += 1
+            out = subprocess.run([sys.executable, script], cwd=sandbox, env=env, capture_output=True, text=True)
+            if verbose or out.returncode:
+                print(out.stdout[-3000:], out.stderr[-3000:])
+            if window_spent(sim):
+                break
+            if processed(sandbox) == done:
+                break  # out of work
+        wall = time.perf_counter() - started
+
+        stats = sim.stats()
+        return {
+            'runs': runs,
+            'requests': stats['api_requests'],
+            'by_endpoint': stats['requests'],
+            'throttled': stats['throttled'],
+            'activities': processed(sandbox),
+            'window_spent': window_spent(sim),
+            'mb': stats['bytes'] / 1e6,
+            'wall': wall,
+        }
+
+def main(argv=()):
+    parser = argparse.ArgumentParser(description="Activities processed per Strava rate window, per fetch path.")
+    parser.add_argument('strategies', nargs='*', metavar='strategy', help=f"default: all of {', '.join(STRATEGIES)}")
+    parser.add_argument('--activities', type=int, default=300, help="activities on the synthetic account")
+    parser.add_argument('--limit-15min', type=int, default=SHORT_LIMIT)
+    parser.add_argument('--limit-daily', type=int, default=DAILY_LIMIT)
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds per request")
+    parser.add_argument('--verbose', action='store_true', help="print each run's output")
+    args = parser.parse_args(list(argv))
+    unknown = set(args.strategies) - set(STRATEGIES)
+    if unknown: parser.error(f"unknown strategy: {', '.join(sorted(unknown))}")
+
+    frozen = time.time()
+    sim = StravaSimulator(Athlete(args.activities),
+                          Limits(read=(args.limit_15min, args.limit_daily),
+                                 overall=(2 * args.limit_15min, 2 * args.limit_daily), clock=lambda: frozen),
+                          latency=args.latency).start()
+
+    print(f"⏱️ Strava Sync Benchmark ({args.activities} synthetic activities, {args.limit_15min} requests "
+          f"per 15 minutes, {args.latency}s per request)\n")
+    print("| Path | Runs | Requests | 429s | Activities | Requests/activity | Per 15-min window | MB | Wall |")
+    print("|---|---|---|---|---|---|---|---|---|")
+    try:
+        for name in args.strategies or STRATEGIES:
+            r = run_strategy(name, sim, args.verbose)
+            per = r['requests'] / r['activities'] if r['activities'] else float('nan')
+            # A path that ran out of work first is projected onto a full window
+            window = r['activities'] if r['window_spent'] else (f"~{int(args.limit_15min / per)}" if r['activities'] else '--')
+            print(f"| {name} | {r['runs']} | {r['requests']} | {r['throttled']} | {r['activities']} | {per:.2f} | "
+                  f"{window} | {r['mb']:.1f} | {r['wall']:.1f}s |")
+    finally:
+        sim.stop()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,334 @@
+import sys
+import json
+import time
+import threading
+import argparse
+import numpy as np
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# --- LOCAL STRAVA API SIMULATOR ---
+# A stand-in for www.strava.com serving a synthetic athlete, so the sync scripts can
+# be run, tested and tuned offline (point them at it with STRAVA_API_BASE):
+#   POST /oauth/token                      refresh-token grant
+#   GET  /api/v3/athlete/activities        after / before / page / per_page
+#   GET  /api/v3/activities/{id}           detailed activity (runs carry best_efforts)
+#   GET  /api/v3/activities/{id}/streams   keys, key_by_type
+# Requests are counted like Strava counts them: a 15-minute window resetting at
+# :00/:15/:30/:45 UTC and a UTC day, with a read limit and an overall limit. Every
+# API response carries X-RateLimit-* / X-ReadRateLimit-* headers, and requests over
+# a limit get 429 without being served. clock can be frozen so a benchmark stays
+# inside one window however long it takes.
+
+SHORT_WINDOW_SECONDS = 15 * 60
+DAILY_WINDOW_SECONDS = 24 * 60 * 60
+
+SPORTS = ['Ride', 'Run', 'VirtualRide', 'Ride', 'Run', 'Swim', 'Walk']
+BEST_EFFORTS = [('400m', 400), ('1/2 mile', 805), ('1K', 1000), ('1 mile', 1609), ('2 mile', 3219),
+                ('5K', 5000), ('10K', 10000), ('15K', 15000), ('Half-Marathon', 21097)]
+NO_POWER_SHARE = 0.15   # rides without a power meter
+NO_STREAMS_SHARE = 0.03  # manual entries: streams 404
+
+def _iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class Athlete:
+    """Synthetic activities (newest first, one every ~18 hours back from now) and their streams."""
+    def __init__(self, activities=300, now=None, seed=0):
+        self.seed = seed
+        now = int(now or time.time())
+        rng = np.random.default_rng(seed)
+        self.activities = []
+        for i in range(activities):
+            sport = SPORTS[i % len(SPORTS)]
+            start = now - 3600 - i * 18 * 3600 - int(rng.integers(0, 3600))
+            moving = int(rng.integers(1800, 7200 if sport in ('Run', 'Swim', 'Walk') else 10800))
+            speed = {'Ride': 8.0, 'VirtualRide': 9.0, 'Run': 3.2, 'Swim': 1.0, 'Walk': 1.4}[sport] * rng.uniform(0.85, 1.15)
+            self.activities.append({
+                'id': 9000000000 - i * 7919,
+                'name': f"Synthetic {sport} {i}",
+                'type': sport,
+                'sport_type': sport,
+                'start_date': _iso(start),
+                'start_date_local': _iso(start - 6 * 3600),
+                'timezone': '(GMT-07:00) America/Denver',
+                'distance': round(moving * speed, 1),
+                'moving_time': moving,
+                'elapsed_time': moving + int(rng.integers(0, 600)),
+                'total_elevation_gain': round(float(rng.uniform(0, 800)), 1),
+                'average_speed': round(speed, 3),
+                'has_heartrate': True,
+                'device_watts': sport in ('Ride', 'VirtualRide') and rng.random() >= NO_POWER_SHARE,
+                'manual': bool(rng.random() < NO_STREAMS_SHARE),
+                '_start': start,
+            })
+        self.by_id = {a['id']: a for a in self.activities}
+
+    def summary(self, act):
+        return {k: v for k, v in act.items() if not k.startswith('_')}
+
+    def detail(self, act):
+        detail = dict(self.summary(act), description=None, calories=round(act['moving_time'] / 4.5, 1))
+        if act['type'] == 'Run':
+            pace = act['moving_time'] / act['distance']
+            detail['best_efforts'] = [{'name': name, 'distance': meters, 'elapsed_time': int(meters * pace * 0.97),
+                                       'moving_time': int(meters * pace * 0.97)}
+                                      for name, meters in BEST_EFFORTS if meters <= act['distance']]
+        return detail
+
+    def streams(self, act):
+        """Every stream of act as plain lists (None for a manual entry)."""
+        if act['manual']: return None
+        rng = np.random.default_rng([self.seed, act['id'] % 2 ** 32])
+        n = act['moving_time']
+        t = np.arange(n)
+        hr = np.clip(120 + 25 * (1 - np.exp(-t / 600)) + t / 400 + rng.normal(0, 3, n), 60, 200).round().astype(int)
+        speed = np.clip(act['average_speed'] * (1 + 0.08 * np.sin(t / 300)) + rng.normal(0, 0.2, n), 0, None)
+        out = {'time': t.tolist(), 'heartrate': hr.tolist(), 'distance': np.cumsum(speed).round(1).tolist(),
+               'velocity_smooth': speed.round(2).tolist()}
+        if act['type'] in ('Ride', 'VirtualRide'):
+            out['cadence'] = np.clip(88 + rng.normal(0, 6, n), 0, None).round().astype(int).tolist()
+            if act['device_watts']:
+                watts = 190 + 30 * np.sin(t / 900) + np.where(rng.random(n) < 0.02, rng.integers(100, 500, n), 0)
+                watts = np.clip(watts + rng.normal(0, 15, n), 0, None).round().astype(int)
+                watts[rng.random(n) < 0.05] = 0
+                out['watts'] = watts.tolist()
+        else:
+            out['cadence'] = np.clip(85 + rng.normal(0, 3, n), 0, None).round().astype(int).tolist()
+        return out
+
+class Limits:
+    """Strava's fixed windows: counts per 15 minutes and per UTC day, read and overall."""
+    def __init__(self, read=(100, 1000), overall=(200, 2000), clock=time.time):
+        self.read, self.overall = tuple(read), tuple(overall)
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.windows = None
+            self.read_used = [0, 0]
+            self.overall_used = [0, 0]
+
+    def _roll(self):
+        now = self.clock()
+        windows = (int(now) // SHORT_WINDOW_SECONDS, int(now) // DAILY_WINDOW_SECONDS)
+        if self.windows is None:
+            self.windows = windows
+        for i in range(2):
+            if windows[i] != self.windows[i]:
+                self.read_used[i] = self.overall_used[i] = 0
+        self.windows = windows
+
+    def take(self, read=True):
+        """Counts one request; False (not counted) when it is over a limit."""
+        with self.lock:
+            self._roll()
+            over = any(u >= l for u, l in zip(self.overall_used, self.overall))
+            if read: over = over or any(u >= l for u, l in zip(self.read_used, self.read))
+            if over: return False
+            for i in range(2):
+                self.overall_used[i] += 1
+                if read: self.read_used[i] += 1
+            return True
+
+    def spent(self):
+        """Whether the current 15-minute window is used up."""
+        with self.lock:
+            self._roll()
+            return self.read_used[0] >= self.read[0] or self.overall_used[0] >= self.overall[0]
+
+    def headers(self):
+        with self.lock:
+            self._roll()
+            return {
+                'X-RateLimit-Limit': '%d,%d' % self.overall,
+                'X-RateLimit-Usage': '%d,%d' % tuple(self.overall_used),
+                'X-ReadRateLimit-Limit': '%d,%d' % self.read,
+                'X-ReadRateLimit-Usage': '%d,%d' % tuple(self.read_used),
+            }
+
+class StravaSimulator:
+    """
+    The server: StravaSimulator(...).start() serves on 127.0.0.1 (port 0 = any free
+    one; see .url) from a background thread. stats() reports requests per endpoint,
+    429s, bytes sent and the activities whose details or streams were served.
+    """
+    def __init__(self, athlete=None, limits=None, port=0, latency=0.0, token_ttl=21600):
+        self.athlete = athlete or Athlete()
+        self.limits = limits or Limits()
+        self.latency, self.token_ttl = latency, token_ttl
+        self.tokens = {}
+        self.lock = threading.Lock()
+        self.reset_stats()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_stats(self):
+        with self.lock:
+            self.requests = Counter()
+            self.throttled = 0
+            self.bytes_sent = 0
+            self.served = {'detail': set(), 'streams': set()}
+
+    def stats(self):
+        with self.lock:
+            return {'requests': dict(self.requests), 'api_requests': sum(n for k, n in self.requests.items() if k != 'token'),
+                    'throttled': self.throttled, 'bytes': self.bytes_sent,
+                    'detail_ids': set(self.served['detail']), 'stream_ids': set(self.served['streams'])}
+
+    # --- ENDPOINTS ---
+    def _token(self, form):
+        if not form.get('refresh_token') or not form.get('client_id'):
+            return 400, {'message': 'Bad Request', 'errors': [{'resource': 'RefreshToken', 'code': 'invalid'}]}
+        token = f"sim-{len(self.tokens) + 1}-{int(time.time())}"
+        expires_at = int(time.time()) + self.token_ttl
+        with self.lock:
+            self.tokens[token] = expires_at
+        return 200, {'token_type': 'Bearer', 'access_token': token, 'expires_at': expires_at,
+                     'expires_in': self.token_ttl, 'refresh_token': form['refresh_token']}
+
+    def _list(self, query):
+        after = int(query.get('after', 0) or 0)
+        before = int(query.get('before', 0) or 0) or None
+        page = max(1, int(query.get('page', 1)))
+        per_page = min(200, max(1, int(query.get('per_page', 30))))
+        acts = [a for a in self.athlete.activities if a['_start'] > after and (before is None or a['_start'] < before)]
+        if 'after' in query: acts = acts[::-1]  # Strava lists oldest first when paging forward from 'after'
+        chunk = acts[(page - 1) * per_page:page * per_page]
+        return 200, [self.athlete.summary(a) for a in chunk]
+
+    def _activity(self, aid):
+        act = self.athlete.by_id.get(aid)
+        if not act: return 404, {'message': 'Record Not Found', 'errors': [{'resource': 'Activity', 'code': 'not found'}]}
+        with self.lock:
+            self.served['detail'].add(aid)
+        return 200, self.athlete.detail(act)
+
+    def _streams(self, aid, query):
+        act = self.athlete.by_id.get(aid)
+        streams = self.athlete.streams(act) if act else None
+        if streams is None:
+            return 404, {'message': 'Record Not Found', 'errors': [{'resource': 'Activity', 'code': 'not found'}]}
+        keys = [k for k in query.get('keys', 'time').split(',') if k]
+        if 'time' in streams and 'time' not in keys: keys.append('time')  # Strava always adds the series stream
+        body = {k: {'data': streams[k], 'series_type': 'time', 'original_size': len(streams[k]), 'resolution': 'high'}
+                for k in keys if k in streams}
+        with self.lock:
+            self.served['streams'].add(aid)
+        if query.get('key_by_type', 'false') == 'true': return 200, body
+        return 200, [dict(v, type=k) for k, v in body.items()]
+
+    def route(self, method, path, query, form, auth):
+        """(status, body, headers) for one request."""
+        if self.latency: time.sleep(self.latency)
+        if method == 'POST' and path == '/oauth/token':
+            self._count('token')
+            status, body = self._token(form)
+            return status, body, {}
+        if method != 'GET' or not path.startswith('/api/v3/'):
+            return 404, {'message': 'Not Found'}, {}
+
+        token = auth[len('Bearer '):] if auth.startswith('Bearer ') else None
+        if token is None or self.tokens.get(token, 0) < time.time():
+            return 401, {'message': 'Authorization Error', 'errors': [{'resource': 'Athlete', 'field': 'access_token', 'code': 'invalid'}]}, {}
+
+        parts = path[len('/api/v3/'):].strip('/').split('/')
+        if parts == ['athlete', 'activities']: endpoint = 'list'
+        elif len(parts) == 2 and parts[0] == 'activities': endpoint = 'detail'
+        elif len(parts) == 3 and parts[0] == 'activities' and parts[2] == 'streams': endpoint = 'streams'
+        else: return 404, {'message': 'Not Found'}, self.limits.headers()
+
+        self._count(endpoint)
+        if not self.limits.take(read=True):
+            with self.lock:
+                self.throttled += 1
+            return 429, {'message': 'Rate Limit Exceeded',
+                         'errors': [{'resource': 'Application', 'field': 'rate limit', 'code': 'exceeded'}]}, self.limits.headers()
+        try:
+            if endpoint == 'list': status, body = self._list(query)
+            else:
+                aid = int(parts[1])
+                status, body = self._activity(aid) if endpoint == 'detail' else self._streams(aid, query)
+        except ValueError:
+            status, body = 400, {'message': 'Bad Request'}
+        return status, body, self.limits.headers()
+
+    def _count(self, endpoint):
+        with self.lock:
+            self.requests[endpoint] += 1
+
+    def _handler(self):
+        sim = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real API behind the pooled session
+
+            def _respond(self, status, body, headers):
+                payload = json.dumps(body, separators=(',', ':')).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+                with sim.lock:
+                    sim.bytes_sent += len(payload)
+
+            def _handle(self, method):
+                url = urlparse(self.path)
+                query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                form = {}
+                if method == 'POST':
+                    length = int(self.headers.get('Content-Length') or 0)
+                    form = {k: v[-1] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                    form.update(query)
+                self._respond(*sim.route(method, url.path, query, form, self.headers.get('Authorization', '')))
+
+            def do_GET(self): self._handle('GET')
+            def do_POST(self): self._handle('POST')
+            def log_message(self, *args): pass
+
+        return Handler
+
+def main(argv=()):
+    parser = argparse.ArgumentParser(description="Serve a synthetic Strava API locally (set STRAVA_API_BASE to its URL).")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--activities', type=int, default=300)
+    parser.add_argument('--limit-15min', type=int, default=100, help="read requests per 15 minutes")
+    parser.add_argument('--limit-daily', type=int, default=1000, help="read requests per day")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(list(argv))
+
+    sim = StravaSimulator(Athlete(args.activities, seed=args.seed),
+                          Limits(read=(args.limit_15min, args.limit_daily),
+                                 overall=(2 * args.limit_15min, 2 * args.limit_daily)),
+                          port=args.port, latency=args.latency)
+    print(f"🛰️ Strava simulator on {sim.url} ({args.activities} activities, "
+          f"{args.limit_15min}/15min and {args.limit_daily}/day read limits). Ctrl+C to stop.")
+    try:
+        sim.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sim.server.server_close()
+        print(f"📊 {sim.stats()['requests']}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
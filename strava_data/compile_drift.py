@@ -1,5 +1,6 @@
 import os
 import json
+from strava_modules import curve_store
 
 # --- CONFIGURATION ---
 BASE_DIR = os.path.dirname(os.path.abspath(__file__)) 
@@ -24,21 +25,19 @@ def main():
             continue
 
         print(f"📂 Scanning {sport_type} folder...")
-        files = [f for f in os.listdir(path) if f.endswith('.json')]
-        
-        for fname in files:
+        # Header-only reads: the curves themselves are never loaded
+        for aid in curve_store.activity_ids(path):
             try:
-                with open(os.path.join(path, fname), 'r') as f:
-                    data = json.load(f)
-                    
-                    if data.get('aerobic_decoupling') is not None:
-                        drift_entries.append({
-                            "date": data.get('date'),
-                            "val": data.get('aerobic_decoupling'),
-                            "id": data.get('id'),
-                            "sport": sport_type,  # <--- CRITICAL NEW FIELD
-                            "name": data.get('name', 'Workout')
-                        })
+                data = curve_store.read_meta(path, aid)
+                
+                if data.get('aerobic_decoupling') is not None:
+                    drift_entries.append({
+                        "date": data.get('date'),
+                        "val": data.get('aerobic_decoupling'),
+                        "id": data.get('id'),
+                        "sport": sport_type,  # <--- CRITICAL NEW FIELD
+                        "name": data.get('name', 'Workout')
+                    })
             except:
                 continue
 
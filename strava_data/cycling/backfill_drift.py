@@ -1,8 +1,5 @@
 import os
-import json
-import requests
-import pandas as pd
-import time
+import sys
 from dotenv import load_dotenv
 
 # --- CONFIGURATION ---
@@ -10,82 +7,32 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PARENT_DIR = os.path.dirname(BASE_DIR)
 load_dotenv(os.path.join(PARENT_DIR, '.env'))
 
+sys.path.append(PARENT_DIR)
+from strava_modules import analytics, curve_store, rate_limit, stream_archive, strava_api
+
 CACHE_DIR = os.path.join(PARENT_DIR, "power_cache")
+STREAM_ARCHIVE_DIR = os.path.join(stream_archive.ROOT, "cycling")
 BATCH_SIZE = 50 
 
-def get_access_token():
-    payload = {
-        'client_id': os.getenv('STRAVA_CLIENT_ID'),
-        'client_secret': os.getenv('STRAVA_CLIENT_SECRET'),
-        'refresh_token': os.getenv('STRAVA_REFRESH_TOKEN'),
-        'grant_type': 'refresh_token',
-        'f': 'json'
-    }
-    try:
-        res = requests.post("https://www.strava.com/oauth/token", data=payload, verify=True)
-        res.raise_for_status()
-        return res.json()['access_token']
-    except Exception as e:
-        print(f"⚠️ Auth Failed: {e}")
-        return None
-
-def calculate_decoupling_trimmed(streams):
-    # 1. Validation
-    if 'watts' not in streams or 'heartrate' not in streams:
-        return None
-    
-    watts_data = streams['watts']['data']
-    hr_data = streams['heartrate']['data']
-    
-    length = min(len(watts_data), len(hr_data))
-    df = pd.DataFrame({'watts': watts_data[:length], 'hr': hr_data[:length]})
-    
-    # 2. Filter Bad Data (Keep coasting/0 watts, but remove bad HR)
-    df_clean = df[df['hr'] > 40]
-    
-    # 3. Trim Logic (Remove 10m from Start and End)
-    trim_seconds = 600 
-    
-    if len(df_clean) > (trim_seconds * 2 + 600):
-        df_steady = df_clean.iloc[trim_seconds : -trim_seconds]
-    else:
-        return None # Too short to trim
-
-    # 4. Split & Calc
-    mid = len(df_steady) // 2
-    first_half = df_steady.iloc[:mid]
-    second_half = df_steady.iloc[mid:]
-
-    ef1 = first_half['watts'].mean() / first_half['hr'].mean()
-    ef2 = second_half['watts'].mean() / second_half['hr'].mean()
-    
-    if ef1 == 0: return None
-    
-    drift = (1 - (ef2 / ef1)) * 100
-    return round(drift, 2)
-
 def backfill():
-    token = get_access_token()
-    if not token: return
-
-    headers = {'Authorization': f"Bearer {token}"}
-    files = [f for f in os.listdir(CACHE_DIR) if f.endswith('.json')]
-    print(f"🔍 Scanning {len(files)} files...")
+    client = strava_api.connect()
+    if not client: return
+    activity_ids = sorted(curve_store.activity_ids(CACHE_DIR))
+    print(f"🔍 Scanning {len(activity_ids)} files...")
     
     processed = 0
     updated = 0
     skipped = 0
+    fetched = {}  # cache id -> (data, streams), scored together after downloading
+    to_download = []  # (cache id, data) still needing streams from Strava
     
-    for fname in files:
+    for key in activity_ids:
         if processed >= BATCH_SIZE:
             print(f"🛑 Batch limit of {BATCH_SIZE} reached. Run again to continue.")
             break
 
-        fpath = os.path.join(CACHE_DIR, fname)
-        
         try:
-            with open(fpath, 'r') as f:
-                data = json.load(f)
+            data = curve_store.read_meta(CACHE_DIR, key)
         except:
             continue
 
@@ -97,44 +44,49 @@ def backfill():
         aid = data.get('id')
         print(f"🔄 Processing {aid}...")
         
-        try:
-            url = f"https://www.strava.com/api/v3/activities/{aid}/streams"
-            r = requests.get(url, headers=headers, params={'keys': 'watts,heartrate', 'key_by_type': 'true'})
-            
-            # --- HANDLE 404 (No Streams / Empty Data) ---
-            if r.status_code == 404:
-                print(f"   ⚠️ No streams found (404). Marking as null.")
-                data['aerobic_decoupling'] = None
-                with open(fpath, 'w') as f: json.dump(data, f)
-                processed += 1
-                continue
-            # ---------------------------------------------
-            
-            if r.status_code == 429:
-                print("⚠️ Rate Limit Hit. Stopping.")
-                return
-                
-            if r.status_code != 200:
-                print(f"   ⚠️ API Error {r.status_code}. Skipping.")
-                continue
-                
-            streams = r.json()
-            drift = calculate_decoupling_trimmed(streams)
-            
-            data['aerobic_decoupling'] = drift
-            with open(fpath, 'w') as f: json.dump(data, f)
-            
-            if drift is None:
-                print(f"   ⚠️ Data insufficient (Saved as null).")
-            else:
-                print(f"   ✅ Updated: {drift}%")
-            
-            updated += 1
-            processed += 1
-            time.sleep(1) 
-            
-        except Exception as e:
-            print(f"   ❌ Error: {e}")
+        # Archived streams need no download (and don't count toward the batch)
+        archived = stream_archive.load_streams(STREAM_ARCHIVE_DIR, key)
+        if archived is not None:
+            fetched[key] = (data, archived)
+            continue
+
+        to_download.append((key, data))
+        processed += 1
+
+    # Download the batch concurrently within the rate-limit budget
+    def download(item):
+        return client.get(f"/activities/{item[1].get('id')}/streams", params={'keys': 'watts,heartrate', 'key_by_type': 'true'})
+
+    for (key, data), r, error in rate_limit.fetch_all(to_download, download):
+        if error:
+            print(f"   ❌ {data.get('id')}: Error: {error}")
+            continue
+
+        if r.status_code == 404:
+            print(f"   ⚠️ {data.get('id')}: No streams found (404). Marking as null.")
+            curve_store.update_meta(CACHE_DIR, key, aerobic_decoupling=None)
+            continue
+
+        if r.status_code != 200:
+            print(f"   ⚠️ {data.get('id')}: API Error {r.status_code}. Skipping.")
+            continue
+
+        streams = r.json()
+        stream_archive.save_streams(STREAM_ARCHIVE_DIR, key, streams)
+        fetched[key] = (data, streams)
+
+    # Score the whole batch in one call, then write results back
+    scores = analytics.batch_decoupling({key: item[1] for key, item in fetched.items()}, analytics.CYCLING)
+
+    for key, (data, _) in fetched.items():
+        drift = scores[key]
+        curve_store.update_meta(CACHE_DIR, key, aerobic_decoupling=drift)
+
+        if drift is None:
+            print(f"   ⚠️ {data.get('id')}: Data insufficient (Saved as null).")
+        else:
+            print(f"   ✅ {data.get('id')}: Updated: {drift}%")
+        updated += 1
 
     print(f"\n🏁 Run Complete. Updated: {updated}. Skipped: {skipped}.")
 
@@ -0,0 +1,28 @@
+import os
+from strava_modules import curve_store
+
+# --- CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CACHE_DIRS = [
+    os.path.join(BASE_DIR, 'power_cache'),
+    os.path.join(BASE_DIR, 'running_cache')
+]
+
+def main():
+    """One-shot move of loose <id>.json / <id>.crv cache files into each cache's curve pack."""
+    print("📦 Migrating curve caches to packed binary storage...")
+    for path in CACHE_DIRS:
+        if not os.path.exists(path):
+            print(f"⚠️ Directory not found: {path}")
+            continue
+
+        before = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        converted, failed = curve_store.migrate(path)
+        curve_store.compact(path)
+        after = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+        print(f"   ✅ {os.path.basename(path)}: {converted} converted, {failed} failed "
+              f"({before / 1024:.0f} KB -> {after / 1024:.0f} KB)")
+
+if __name__ == "__main__":
+    main()
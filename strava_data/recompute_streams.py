@@ -0,0 +1,101 @@
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from strava_modules import analytics, curve_store, curves, stream_archive
+
+# --- CONFIGURATION ---
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_ROOT = stream_archive.ROOT
+
+# --- METRIC REGISTRY ---
+# sport -> metric name -> function(streams) returning {cache field: value}, or None
+# when the streams it needs are missing. A new stream metric only needs an entry here
+# to be backfilled across the whole archive, offline.
+def _power_curve(streams):
+    if 'watts' not in streams: return None
+    return {'power_curve': curves.mean_max_power(streams['watts']['data'], curves.MAX_POWER_SECONDS)}
+
+def _velocity_curve(streams):
+    if 'velocity_smooth' not in streams: return None
+    return {'velocity_curve': curves.mean_max_velocity(streams['velocity_smooth']['data'], curves.MAX_VELOCITY_SECONDS)}
+
+def _drift(profile):
+    def metric(streams):
+        return {'aerobic_decoupling': analytics.stream_decoupling(streams, profile)}
+    return metric
+
+# 'indexes' are the incremental indexes built from each cache. They only fold
+# activities they have not seen, so a recompute drops them and the next
+# process_cycling / process_running run rebuilds them from the new records.
+SPORTS = {
+    'cycling': {
+        'cache_dir': os.path.join(BASE_DIR, "power_cache"),
+        'indexes': [os.path.join(BASE_DIR, "cycling", "power_envelope.json"),
+                    os.path.join(BASE_DIR, "cycling", "power_profile_index.npz")],
+        'metrics': {'power_curve': _power_curve, 'drift': _drift(analytics.CYCLING)}
+    },
+    'running': {
+        'cache_dir': os.path.join(BASE_DIR, "running_cache"),
+        'indexes': [os.path.join(BASE_DIR, "running", "best_efforts_index.json")],
+        'metrics': {'velocity_curve': _velocity_curve, 'drift': _drift(analytics.RUNNING)}
+    }
+}
+
+def compute_fields(sport, aid, metric_names):
+    """Worker: loads one archived activity and runs the selected metrics on it."""
+    streams = stream_archive.load_streams(os.path.join(ARCHIVE_ROOT, sport), aid)
+    fields = {}
+    for name in metric_names:
+        result = SPORTS[sport]['metrics'][name](streams)
+        if result is not None: fields.update(result)
+    return fields
+
+def recompute(sport, metric_names):
+    cache_dir = SPORTS[sport]['cache_dir']
+    ids = sorted(stream_archive.archived_ids(os.path.join(ARCHIVE_ROOT, sport)) & curve_store.activity_ids(cache_dir))
+    if not ids:
+        print(f"⚠️ {sport}: no archived streams for cached activities.")
+        return
+
+    workers = os.cpu_count() or 1
+    print(f"🔁 {sport}: {', '.join(metric_names)} for {len(ids)} activities on {workers} cores...")
+
+    updates, failed = [], 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {aid: pool.submit(compute_fields, sport, aid, metric_names) for aid in ids}
+        for aid, future in futures.items():
+            try:
+                fields = future.result()
+                if not fields: continue
+                activity = curve_store.read_activity(cache_dir, aid)
+                for key in curve_store.CURVE_TYPES:
+                    if key in activity:
+                        activity[key] = activity[key].tolist()  # copy off the memory map
+                activity.update(fields)
+                updates.append(activity)
+            except Exception as e:
+                print(f"   ❌ {aid}: {e}")
+                failed += 1
+
+    curve_store.write_activities(cache_dir, updates)
+    curve_store.compact(cache_dir)
+    if updates:
+        for path in SPORTS[sport]['indexes']:
+            if os.path.exists(path): os.remove(path)
+    print(f"   ✅ {sport}: {len(updates)} updated, {failed} failed.")
+
+def main():
+    """
+    Usage: python recompute_streams.py [sport] [metric ...]
+    Recomputes metrics from the local stream archive; no Strava calls are made.
+    Defaults to every sport and every metric.
+    """
+    args = sys.argv[1:]
+    sports = [args.pop(0)] if args and args[0] in SPORTS else list(SPORTS)
+    for sport in sports:
+        available = SPORTS[sport]['metrics']
+        names = [a for a in args if a in available] or list(available)
+        recompute(sport, names)
+
+if __name__ == "__main__":
+    main()
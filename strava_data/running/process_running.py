@@ -1,8 +1,8 @@
-import requests
 import os
-import pandas as pd
 import json
-import time
+import sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
@@ -11,13 +11,30 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 PARENT_DIR = os.path.dirname(BASE_DIR)
 load_dotenv(os.path.join(PARENT_DIR, '.env'))
 
+sys.path.append(PARENT_DIR)
+from strava_modules import activity_index, analytics, best_efforts, curve_store, curves, graph_export, rate_limit, stream_archive, strava_api
+
 CACHE_DIR = os.path.join(PARENT_DIR, "running_cache")
+STREAM_ARCHIVE_DIR = os.path.join(stream_archive.ROOT, "running")
 OUTPUT_GRAPH = os.path.join(BASE_DIR, "running_pace_curve.json")
 OUTPUT_MD = os.path.join(BASE_DIR, "my_running_prs.md")
+EFFORTS_INDEX = os.path.join(BASE_DIR, "best_efforts_index.json")
 
-MAX_DURATION_SECONDS = 14400 # 4 Hours
+MAX_DURATION_SECONDS = curves.MAX_VELOCITY_SECONDS
 MAX_NEW_TO_PROCESS = 5
-CONSECUTIVE_EXISTING_LIMIT = 50
+ACTIVITY_TYPES = ['Run']
+
+# Pace curve file: 'columnar' (parallel arrays) or 'rows' (one dict per second), m/s rounded
+# to GRAPH_PRECISION decimals. Log sampling keeps GRAPH_POINTS_PER_DECADE durations per
+# decade plus every point needed to redraw both curves within GRAPH_TOLERANCE_MPS.
+GRAPH_FORMAT = os.getenv('PACE_GRAPH_FORMAT', 'columnar')
+GRAPH_SAMPLING = os.getenv('PACE_GRAPH_SAMPLING', 'log')
+GRAPH_PRECISION = int(os.getenv('PACE_GRAPH_PRECISION', 3))
+GRAPH_POINTS_PER_DECADE = 60
+GRAPH_TOLERANCE_MPS = 0.005  # < 1 s/mile at easy and race paces
+
+# Raw streams kept in the local archive (extra keys cost no extra requests)
+STREAM_KEYS = 'velocity_smooth,heartrate,cadence,distance,time'
 
 # 1. TABLE CONFIGURATION (Distance Based - From Strava)
 DISTANCES = [
@@ -44,23 +61,6 @@ STRAVA_NAMES = {
     "50k": "50k", "50K": "50k"
 }
 
-def get_access_token():
-    payload = {
-        'client_id': os.getenv('STRAVA_CLIENT_ID'),
-        'client_secret': os.getenv('STRAVA_CLIENT_SECRET'),
-        'refresh_token': os.getenv('STRAVA_REFRESH_TOKEN'),
-        'grant_type': 'refresh_token',
-        'f': 'json'
-    }
-    try:
-        res = requests.post("https://www.strava.com/oauth/token", data=payload, verify=True)
-        res.raise_for_status()
-        return res.json()['access_token']
-    except Exception as e:
-        print(f"⚠️ Auth Failed: {e}")
-        return None
-
-# Helper: Meters/Sec -> MM:SS/mi
 def mps_to_pace(mps):
     if not mps or mps <= 0: return "--"
     mins_per_mile = 26.8224 / mps
@@ -75,180 +75,182 @@ def format_time(seconds):
     if h > 0: return f"{h}:{m:02d}:{s:02d}"
     return f"{m}:{s:02d}"
 
-# --- NEW: Calculate Running Drift (Pa:Hr) ---
-def calculate_decoupling(streams):
-    """
-    Calculates Aerobic Decoupling for Running (Pace vs Heart Rate).
-    Trims first/last 3 minutes (180s) to exclude warmup/cooldown.
-    """
-    # 1. Validation
-    if 'velocity_smooth' not in streams or 'heartrate' not in streams:
-        return None
-    
-    velocity_data = streams['velocity_smooth']['data']
-    hr_data = streams['heartrate']['data']
-    
-    length = min(len(velocity_data), len(hr_data))
-    
-    # Create DataFrame
-    df = pd.DataFrame({
-        'speed': velocity_data[:length],
-        'hr': hr_data[:length]
-    })
-    
-    # 2. Clean Data
-    # Remove stops (speed < 1 m/s ~ 26 min/mile) and bad HR
-    df_active = df[(df['speed'] > 1.0) & (df['hr'] > 50)]
-    
-    # 3. Trim Logic (3 minutes from start AND end)
-    trim_seconds = 180 
-    
-    # Require enough data to trim (at least 20 mins total duration recommended)
-    # 3m + 3m + 10m (core) = 16 mins absolute minimum
-    if len(df_active) > (trim_seconds * 2 + 600):
-        df_steady = df_active.iloc[trim_seconds : -trim_seconds]
-    else:
-        # Fallback for short runs: skip calc
-        return None
-
-    # 4. Split into First and Second Half
-    mid = len(df_steady) // 2
-    first_half = df_steady.iloc[:mid]
-    second_half = df_steady.iloc[mid:]
-
-    # 5. Calculate Efficiency Factors (Avg Speed / Avg HR)
-    # EF = Speed (m/s) / Heart Rate
-    ef1 = first_half['speed'].mean() / first_half['hr'].mean()
-    ef2 = second_half['speed'].mean() / second_half['hr'].mean()
-    
-    if ef1 == 0: return None
+def fetch_run(client, aid):
+    """Worker: streams and details (for Table Best Efforts) of one new run."""
+    r_stream = client.get(f"/activities/{aid}/streams", params={'keys': STREAM_KEYS, 'key_by_type': 'true'})
+    if r_stream.status_code == 429:
+        raise rate_limit.RateLimitExhausted("streams still throttled after retrying")
 
-    # 6. Calculate Drift %
-    # Positive = Fatigue (HR rose for same speed, or Speed dropped for same HR)
-    drift = (1 - (ef2 / ef1)) * 100
-    
-    return round(drift, 2)
+    streams = r_stream.json() if r_stream.status_code == 200 else {}
+    details = client.get(f"/activities/{aid}").json()
+    return streams, details
 
-def update_cache(token):
+def update_cache(client):
     if not os.path.exists(CACHE_DIR): os.makedirs(CACHE_DIR)
     
     # 1. Check local cache
-    cached_ids = set([int(f.split('.')[0]) for f in os.listdir(CACHE_DIR) if f.endswith('.json')])
+    cached_ids = set([int(aid) for aid in curve_store.activity_ids(CACHE_DIR)])
     print(f"📂 Local Cache: Found {len(cached_ids)} existing runs.")
 
-    if not token:
+    if not client:
         print("⚠️ No Token. Skipping Cache Update.")
         return
-
-    headers = {'Authorization': f"Bearer {token}"}
     
-    page = 1
+    print("🏃 Syncing recent runs...")
+
+    # 1. Work queue: indexed runs not cached yet, newest first
+    index = activity_index.sync(client)
+    new_runs = [a for a in activity_index.activities(index, ACTIVITY_TYPES) if a['id'] not in cached_ids]
+    if not new_runs:
+        print("✅ No new runs in the activity index. Sync complete.")
+    elif len(new_runs) > MAX_NEW_TO_PROCESS:
+        print(f"🛑 {len(new_runs)} new runs; processing the newest {MAX_NEW_TO_PROCESS} this run.")
+        new_runs = new_runs[:MAX_NEW_TO_PROCESS]
+
+    # 2. Download concurrently; results come back in list order and are saved one by one
     processed_count = 0
-    consecutive_existing = 0
+    worker = lambda act: fetch_run(client, act['id'])
+    for act, result, error in rate_limit.fetch_all(new_runs, worker):
+        aid = act['id']
+        print(f"   🏃 Processing NEW run: {act['name']} ({act['date']})")
+        if error:
+            print(f"❌ Error processing {aid}: {error}")
+            continue
 
-    print("🏃 Syncing recent runs from Strava...")
-    
-    while processed_count < MAX_NEW_TO_PROCESS:
         try:
-            r = requests.get(
-                "https://www.strava.com/api/v3/athlete/activities", 
-                headers=headers, 
-                params={'page': page, 'per_page': 50}
-            )
-            r.raise_for_status()
-            activities = r.json()
-        except Exception as e:
-            print(f"❌ API Error on page {page}: {e}")
-            break
+            streams, details = result
+            if streams: stream_archive.save_streams(STREAM_ARCHIVE_DIR, aid, streams)
+
+            # Calculate Pace Curve (Duration Based)
+            curve = []
+            if 'velocity_smooth' in streams:
+                curve = curves.mean_max_velocity(streams['velocity_smooth']['data'], MAX_DURATION_SECONDS)
+
+            # Extract Best Efforts (Distance Based)
+            efforts = []
+            if 'best_efforts' in details:
+                for e in details['best_efforts']:
+                    efforts.append({
+                        'name': e['name'],
+                        'elapsed_time': e['elapsed_time']
+                    })
+
+            # Calculate Drift (Pa:Hr)
+            drift_score = analytics.stream_decoupling(streams, analytics.RUNNING)
+
+            # Save EVERYTHING
+            data = {
+                'id': aid,
+                'name': details['name'],
+                'date': details['start_date_local'][:10],
+                'velocity_curve': curve, # For JSON Graph (Time)
+                'best_efforts': efforts,  # For MD Table (Distance)
+                'aerobic_decoupling': drift_score # New Metric
+            }
+            
+            curve_store.write_activity(CACHE_DIR, data)
             
-        if not activities:
-            print("✅ No more activities found.")
-            break
+            drift_msg = f" (Drift: {drift_score}%)" if drift_score is not None else ""
+            print(f"      ✅ Saved{drift_msg}")
+            processed_count += 1
+
+        except Exception as e:
+            print(f"❌ Error processing {aid}: {e}")
+
+    print(f"💾 Sync finished. Processed {processed_count} new runs.")
+
+def compute_velocity_curve(velocity_data):
+    """Worker for recompute_curves (top-level so it can be pickled to a process pool)."""
+    return curves.mean_max_velocity(velocity_data, MAX_DURATION_SECONDS)
+
+def recompute_curves(client):
+    """
+    Rebuilds 'velocity_curve' for every run already in the cache.
+    Runs with archived streams are recomputed offline; the rest are downloaded
+    concurrently within the rate-limit budget and archived on the way. The curve
+    math is fanned out across all local cores as each stream becomes available.
+    """
+    if not os.path.exists(CACHE_DIR):
+        print(f"⚠️ No cache directory found at {CACHE_DIR}")
+        return
 
-        for act in activities:
-            # FILTER: Only Runs
-            if act['type'] != "Run":
+    run_ids = sorted(curve_store.activity_ids(CACHE_DIR))
+    archived = stream_archive.archived_ids(STREAM_ARCHIVE_DIR)
+    missing = [aid for aid in run_ids if aid not in archived] if client else []
+    workers = os.cpu_count() or 1
+    print(f"🔁 Recomputing pace curves for {len(run_ids)} runs on {workers} cores ({len(archived & set(run_ids))} archived)...")
+
+    def download(aid):
+        return client.get(f"/activities/{aid}/streams", params={'keys': STREAM_KEYS, 'key_by_type': 'true'})
+
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for aid in run_ids:
+            if aid not in archived: continue
+            streams = stream_archive.load_streams(STREAM_ARCHIVE_DIR, aid)
+            if 'velocity_smooth' in streams:
+                pending[aid] = pool.submit(compute_velocity_curve, streams['velocity_smooth']['data'])
+
+        for aid, r_stream, error in rate_limit.fetch_all(missing, download):
+            if error:
+                print(f"   ❌ Error fetching {aid}: {error}")
                 continue
-            
-            aid = act['id']
-
-            # CHECK: Do we have it?
-            if aid in cached_ids:
-                consecutive_existing += 1
-                if consecutive_existing >= CONSECUTIVE_EXISTING_LIMIT:
-                    print("✅ Found 50 existing runs in a row. Sync complete.")
-                    return
+            if r_stream.status_code != 200:
+                print(f"   ⚠️ API Error {r_stream.status_code} for {aid}. Skipping.")
                 continue
-            
-            # If we get here, it's a NEW run
-            consecutive_existing = 0
-            print(f"   🏃 Processing NEW run: {act['name']} ({act['start_date_local'][:10]})")
 
-            try:
-                # 1. Get Streams (Updated to fetch heartrate)
-                url = f"https://www.strava.com/api/v3/activities/{aid}/streams"
-                r_stream = requests.get(url, headers=headers, params={'keys': 'velocity_smooth,heartrate', 'key_by_type': 'true'})
-                
-                if r_stream.status_code == 429:
-                    print(f"⚠️ Rate Limit Exceeded. Stopping.")
-                    return
-
-                streams = r_stream.json() if r_stream.status_code == 200 else {}
-
-                # 2. Get Details (for Table Best Efforts)
-                r_det = requests.get(f"https://www.strava.com/api/v3/activities/{aid}", headers=headers)
-                details = r_det.json()
-
-                # 3. Calculate Pace Curve (Duration Based)
-                curve = []
-                if 'velocity_smooth' in streams:
-                    velocity_series = pd.Series(streams['velocity_smooth']['data'])
-                    limit = min(len(velocity_series), MAX_DURATION_SECONDS)
-                    # We only calculate every 1s
-                    for seconds in range(1, limit + 1):
-                        peak_mps = velocity_series.rolling(window=seconds).mean().max()
-                        curve.append(peak_mps)
-
-                # 4. Extract Best Efforts (Distance Based)
-                efforts = []
-                if 'best_efforts' in details:
-                    for e in details['best_efforts']:
-                        efforts.append({
-                            'name': e['name'],
-                            'elapsed_time': e['elapsed_time']
-                        })
-
-                # 5. Calculate Drift (Pa:Hr)
-                drift_score = calculate_decoupling(streams)
-
-                # 6. Save EVERYTHING
-                data = {
-                    'id': aid,
-                    'name': details['name'],
-                    'date': details['start_date_local'][:10],
-                    'velocity_curve': curve, # For JSON Graph (Time)
-                    'best_efforts': efforts,  # For MD Table (Distance)
-                    'aerobic_decoupling': drift_score # New Metric
-                }
-                
-                with open(os.path.join(CACHE_DIR, f"{aid}.json"), "w") as f:
-                    json.dump(data, f)
-                
-                drift_msg = f" (Drift: {drift_score}%)" if drift_score is not None else ""
-                print(f"      ✅ Saved{drift_msg}")
-                
-                processed_count += 1
-                if processed_count >= MAX_NEW_TO_PROCESS:
-                    print(f"🛑 Reached limit of {MAX_NEW_TO_PROCESS} new files. Stopping.")
-                    return
+            streams = r_stream.json()
+            stream_archive.save_streams(STREAM_ARCHIVE_DIR, aid, streams)
+            if 'velocity_smooth' in streams:
+                pending[aid] = pool.submit(compute_velocity_curve, streams['velocity_smooth']['data'])
 
+        updated = 0
+        for aid, future in sorted(pending.items()):
+            try:
+                run = curve_store.read_meta(CACHE_DIR, aid)
+                run['velocity_curve'] = future.result()
+                curve_store.write_activity(CACHE_DIR, run)
+                updated += 1
             except Exception as e:
-                print(f"❌ Error processing {aid}: {e}")
+                print(f"   ❌ Error updating {aid}: {e}")
 
-        page += 1
-        time.sleep(1)
+    print(f"💾 Recompute finished. Updated {updated} of {len(run_ids)} runs.")
 
-    print(f"💾 Sync finished. Processed {processed_count} new runs.")
+def write_graph(graph_all_time, graph_six_week):
+    """Writes OUTPUT_GRAPH in GRAPH_FORMAT (see above)."""
+    rows = [i for i in range(MAX_DURATION_SECONDS) if graph_all_time[i]]
+
+    if GRAPH_FORMAT == 'rows':
+        graph_data = []
+        for i in rows:
+            sw_mps = graph_six_week[i]
+            graph_data.append({
+                "seconds": i + 1,
+                "all_time_mps": graph_all_time[i],
+                "six_week_mps": sw_mps if sw_mps else 0
+            })
+        with open(OUTPUT_GRAPH, "w") as f:
+            json.dump(graph_data, f)
+        return
+
+    seconds = [i + 1 for i in rows]
+    at_mps = [round(graph_all_time[i], GRAPH_PRECISION) for i in rows]
+    sw_mps = [round(graph_six_week[i], GRAPH_PRECISION) if graph_six_week[i] else 0 for i in rows]
+
+    keep = range(len(rows))
+    if GRAPH_SAMPLING == 'log':
+        keep = graph_export.sample_indices(seconds, [at_mps, sw_mps], GRAPH_POINTS_PER_DECADE, GRAPH_TOLERANCE_MPS).tolist()
+
+    graph = {
+        "format": "columnar",
+        "sampling": GRAPH_SAMPLING,
+        "precision": GRAPH_PRECISION,
+        "seconds": [seconds[k] for k in keep],
+        "all_time_mps": [at_mps[k] for k in keep],
+        "six_week_mps": [sw_mps[k] for k in keep]
+    }
+    with open(OUTPUT_GRAPH, "w") as f:
+        json.dump(graph, f, separators=(',', ':'))
 
 def generate_stats():
     print("📊 Generating Running Profile...")
@@ -256,64 +258,41 @@ def generate_stats():
         print(f"⚠️ No cache directory found at {CACHE_DIR}")
         return
 
-    files = [f for f in os.listdir(CACHE_DIR) if f.endswith('.json')]
-    if len(files) == 0: print("⚠️ Warning: Cache is empty.")
+    run_ids = sorted(curve_store.activity_ids(CACHE_DIR))
+    if len(run_ids) == 0: print("⚠️ Warning: Cache is empty.")
     
-    # Storage for Graph (Time based)
-    graph_all_time = [None] * MAX_DURATION_SECONDS
-    graph_six_week = [None] * MAX_DURATION_SECONDS
-    
-    # Storage for Table (Distance based)
-    table_all_time = {}
-    table_six_week = {}
-
     today = datetime.now()
     six_weeks_ago = today - timedelta(weeks=6)
+
+    # Storage for Graph (Time based): best m/s per second, NaN = no run that long
+    graph_all_time = np.full(MAX_DURATION_SECONDS, np.nan)
+    graph_six_week = np.full(MAX_DURATION_SECONDS, np.nan)
     
-    for fname in files:
-        with open(os.path.join(CACHE_DIR, fname), "r") as f:
-            try: run = json.load(f)
-            except: continue
+    for aid in run_ids:
+        try: run = curve_store.read_activity(CACHE_DIR, aid)
+        except: continue
         
         try:
             run_date = datetime.strptime(run['date'], "%Y-%m-%d")
         except: continue
 
-        is_recent = run_date >= six_weeks_ago
-        
-        # A. Process Curve (Time based) for JSON
-        if 'velocity_curve' in run and run['velocity_curve']:
-            for i, mps in enumerate(run['velocity_curve']):
-                if i >= MAX_DURATION_SECONDS: break
-                if mps is None: continue
-                
-                # Higher mps is better
-                if graph_all_time[i] is None or mps > graph_all_time[i]:
-                    graph_all_time[i] = mps
-                if is_recent:
-                    if graph_six_week[i] is None or mps > graph_six_week[i]:
-                        graph_six_week[i] = mps
-
-        # B. Process Best Efforts (Distance based) for Table
-        if 'best_efforts' in run:
-            for effort in run['best_efforts']:
-                dist_key = STRAVA_NAMES.get(effort['name'])
-                if not dist_key: continue
-                
-                entry = {
-                    'time': effort['elapsed_time'], 
-                    'date': run['date'], 
-                    'name': run.get('name', 'Run'), 
-                    'id': run['id']
-                }
-
-                # Lower time is better
-                if dist_key not in table_all_time or entry['time'] < table_all_time[dist_key]['time']:
-                    table_all_time[dist_key] = entry
-                
-                if is_recent:
-                    if dist_key not in table_six_week or entry['time'] < table_six_week[dist_key]['time']:
-                        table_six_week[dist_key] = entry
+        # Process Curve (Time based) for JSON; higher mps is better, dropouts (NaN) ignored
+        curve = run.get('velocity_curve')
+        if curve is not None and len(curve):
+            curve = np.asarray(curve[:MAX_DURATION_SECONDS], dtype=np.float64)
+            n = len(curve)
+            np.fmax(graph_all_time[:n], curve, out=graph_all_time[:n])
+            if run_date >= six_weeks_ago:
+                np.fmax(graph_six_week[:n], curve, out=graph_six_week[:n])
+
+    # Table (Distance based): incremental, only runs added since the last call are read
+    if "--rebuild-efforts" in sys.argv:
+        efforts = best_efforts.new_index()
+    else:
+        efforts = best_efforts.load_index(EFFORTS_INDEX)
+    opened = best_efforts.update_index(efforts, CACHE_DIR, STRAVA_NAMES)
+    best_efforts.save_index(EFFORTS_INDEX, efforts)
+    print(f"   -> Best-efforts index updated ({opened} cache files read).")
 
     # 1. OUTPUT MARKDOWN (Distance Table)
     with open(OUTPUT_MD, "w", encoding="utf-8") as f:
@@ -322,8 +301,8 @@ def generate_stats():
         f.write("|---|---|---|---|---|\n")
         
         for dist in DISTANCES:
-            at = table_all_time.get(dist)
-            sw = table_six_week.get(dist)
+            at = best_efforts.best(efforts, dist)
+            sw = best_efforts.best(efforts, dist, since=six_weeks_ago)
             
             def fmt_link(record):
                 if not record: return "--"
@@ -335,24 +314,15 @@ def generate_stats():
             f.write(f"| {dist} | {at_str} | {fmt_link(at)} | {sw_str} | {fmt_link(sw)} |\n")
     
     # 2. OUTPUT JSON (Time Graph)
-    graph_data = []
-    for i in range(MAX_DURATION_SECONDS):
-        at_mps = graph_all_time[i]
-        sw_mps = graph_six_week[i]
-        
-        if at_mps:
-            graph_data.append({
-                "seconds": i + 1,
-                "all_time_mps": at_mps,
-                "six_week_mps": sw_mps if sw_mps else 0
-            })
-            
-    with open(OUTPUT_GRAPH, "w") as f:
-        json.dump(graph_data, f)
+    to_list = lambda a: [None if v != v else v for v in a.tolist()]
+    write_graph(to_list(graph_all_time), to_list(graph_six_week))
     
     print(f"✅ Updated {OUTPUT_MD} (Table) and {OUTPUT_GRAPH} (Curve)")
 
 if __name__ == "__main__":
-    token = get_access_token()
-    update_cache(token)
+    client = strava_api.connect()
+    if "--recompute-curves" in sys.argv:
+        recompute_curves(client)
+    else:
+        update_cache(client)
     generate_stats()
@@ -0,0 +1,101 @@
+import os
+import json
+import time
+from datetime import datetime, timezone
+
+# --- INCREMENTAL ACTIVITY INDEX ---
+# One local list of every Strava activity (id, type, dates, name), kept current by
+# paging /athlete/activities only past a persisted watermark. The cycling and
+# running processors take their work queues from it and activity_ids.txt is
+# exported from it, so a sync lists activities once instead of once per consumer.
+
+INDEX_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "activity_index.json")
+PER_PAGE = 200  # Strava's maximum
+LOOKBACK_SECONDS = 7 * 24 * 3600  # re-list the last week so late uploads of older activities are caught
+FRESH_SECONDS = 15 * 60  # a crawl this recent is reused (cycling then running in one pipeline run)
+
+def _epoch(iso):
+    return datetime.strptime(iso, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp()
+
+def load(path=INDEX_FILE):
+    """{'watermark', 'synced_at', 'activities': {str(id): entry}}; empty if missing or unreadable."""
+    index = {'watermark': 0, 'synced_at': 0, 'activities': {}}
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+            index['watermark'] = raw['watermark']
+            index['synced_at'] = raw['synced_at']
+            index['activities'] = {str(a['id']): a for a in raw['activities']}
+        except Exception as e:
+            print(f"⚠️ Activity index unreadable ({e}). Rebuilding.")
+    return index
+
+def save(index, path=INDEX_FILE):
+    raw = {
+        'watermark': index['watermark'],
+        'synced_at': index['synced_at'],
+        'activities': activities(index)
+    }
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(raw, f, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+def _entry(act):
+    return {
+        'id': act['id'],
+        'type': act['type'],
+        'date': act['start_date_local'][:10],
+        'start_date': act['start_date'],
+        'name': act['name']
+    }
+
+def sync(client, path=INDEX_FILE, max_age=FRESH_SECONDS):
+    """
+    Adds every activity started after the watermark (minus a short lookback) and
+    returns the index. The watermark only moves once a crawl completes, so an API
+    error just leaves the remainder for the next run.
+    """
+    index = load(path)
+    if time.time() - index['synced_at'] < max_age:
+        print(f"📇 Activity index is fresh ({len(index['activities'])} activities).")
+        return index
+
+    after = max(0, int(index['watermark']) - LOOKBACK_SECONDS)
+    watermark = index['watermark']
+    page, calls, added = 1, 0, 0
+    complete = False
+
+    print("📇 Updating activity index from Strava...")
+    while True:
+        try:
+            r = client.get("/athlete/activities", params={'after': after, 'page': page, 'per_page': PER_PAGE})
+            calls += 1
+            r.raise_for_status()
+            batch = r.json()
+        except Exception as e:
+            print(f"❌ API Error on page {page}: {e}")
+            break
+
+        for act in batch:
+            key = str(act['id'])
+            if key not in index['activities']: added += 1
+            index['activities'][key] = _entry(act)
+            watermark = max(watermark, _epoch(act['start_date']))
+
+        if len(batch) < PER_PAGE:
+            complete = True
+            break
+        page += 1
+
+    if complete:
+        index['watermark'] = watermark
+        index['synced_at'] = time.time()
+    save(index, path)
+    print(f"   -> {added} new activities ({calls} list calls). Index holds {len(index['activities'])}.")
+    return index
+
+def activities(index, types=None):
+    """Index entries, newest first, optionally limited to the given activity types."""
+    entries = [a for a in index['activities'].values() if types is None or a['type'] in types]
+    return sorted(entries, key=lambda a: (a['start_date'], a['id']), reverse=True)
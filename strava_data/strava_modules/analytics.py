@@ -0,0 +1,64 @@
+import numpy as np
+from .curves import to_array
+
+# --- AEROBIC DECOUPLING (Pw:Hr / Pa:Hr) ---
+# One implementation for both sports. Works on raw NumPy arrays; results match the
+# old pandas versions (same filters, trims, means and round(drift, 2)).
+
+MIN_CORE_SECONDS = 600  # Steady section left after trimming must exceed 10 mins
+
+# Cycling: trim 10 mins each end, keep coasting zeros, drop HR dropouts
+CYCLING = {'signal': 'watts', 'trim_seconds': 600, 'hr_floor': 40, 'speed_floor': None}
+
+# Running: trim 3 mins each end, drop stops (< 1 m/s ~ 26 min/mile) and bad HR
+RUNNING = {'signal': 'velocity_smooth', 'trim_seconds': 180, 'hr_floor': 50, 'speed_floor': 1.0}
+
+def decoupling(signal, hr, trim_seconds, hr_floor, speed_floor=None):
+    """
+    Calculates Aerobic Decoupling % from an output signal (watts or m/s) and heart rate.
+    Positive = Fatigue (HR rose for the same output, or output dropped for the same HR).
+    Returns None when the cleaned ride/run is too short to trim.
+    """
+    length = min(len(signal), len(hr))
+    signal = to_array(signal[:length])
+    hr = to_array(hr[:length])
+
+    # 1. Clean Data
+    active = hr > hr_floor
+    if speed_floor is not None:
+        active &= signal > speed_floor
+    signal, hr = signal[active], hr[active]
+
+    # 2. Trim Logic (same amount from start AND end)
+    if len(signal) <= trim_seconds * 2 + MIN_CORE_SECONDS:
+        return None
+    signal = signal[trim_seconds:-trim_seconds]
+    hr = hr[trim_seconds:-trim_seconds]
+
+    # 3. Efficiency Factor per half (Avg Output / Avg HR)
+    mid = len(signal) // 2
+    ef1 = np.nanmean(signal[:mid]) / np.nanmean(hr[:mid])
+    ef2 = np.nanmean(signal[mid:]) / np.nanmean(hr[mid:])
+
+    if ef1 == 0: return None
+
+    # 4. Drift %
+    drift = (1 - (ef2 / ef1)) * 100
+    return float(round(drift, 2))
+
+def stream_decoupling(streams, profile):
+    """Decoupling from a Strava key_by_type streams payload, using a sport profile (CYCLING / RUNNING)."""
+    signal_key = profile['signal']
+    if signal_key not in streams or 'heartrate' not in streams:
+        return None
+    return decoupling(
+        streams[signal_key]['data'],
+        streams['heartrate']['data'],
+        profile['trim_seconds'],
+        profile['hr_floor'],
+        profile['speed_floor']
+    )
+
+def batch_decoupling(streams_by_id, profile):
+    """Scores many activities in one call: {activity_id: streams} -> {activity_id: drift or None}."""
+    return {aid: stream_decoupling(streams, profile) for aid, streams in streams_by_id.items()}
@@ -0,0 +1,80 @@
+import os
+import json
+from datetime import datetime
+from . import curve_store
+
+# --- PERSISTED BEST-EFFORTS INDEX ---
+# Every Strava best effort seen so far, keyed by distance label and kept sorted
+# fastest first. Only runs added to the cache since the last run have their
+# metadata read; the 6-week column is a scan of the (short) per-distance list.
+
+def new_index():
+    return {
+        'folded': set(),  # every cache id already looked at
+        'efforts': {}     # label -> [[elapsed_time, date, id, name], ...] fastest first
+    }
+
+def load_index(path):
+    """Loads the persisted index, or starts a fresh one if missing / unreadable."""
+    if not os.path.exists(path): return new_index()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+    except Exception:
+        return new_index()
+    index = new_index()
+    index['folded'] = set(raw['folded'])
+    index['efforts'] = raw['efforts']
+    for efforts in index['efforts'].values():
+        efforts.sort(key=_sort_key)  # indexes saved under an older tie order
+    return index
+
+def save_index(path, index):
+    raw = {'folded': sorted(index['folded']), 'efforts': index['efforts']}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(raw, f, separators=(',', ':'))
+
+def _sort_key(effort):
+    # Ties go to the run that set the time first (earliest date, then lowest id)
+    return (effort[0], effort[1], str(effort[2]))
+
+def update_index(index, cache_dir, labels):
+    """
+    Folds best efforts of runs added to cache_dir since the last call.
+    labels: Strava effort name -> table label (names not in it are ignored).
+    Returns the number of cache records read.
+    """
+    on_disk = curve_store.activity_ids(cache_dir)
+
+    # A run vanished from the cache: drop everything and refold
+    if index['folded'] - on_disk:
+        index.update(new_index())
+
+    opened = 0
+    touched = set()
+    for key in sorted(on_disk - index['folded']):
+        opened += 1
+        try: run = curve_store.read_meta(cache_dir, key)
+        except Exception: continue  # unreadable, retry next run
+        index['folded'].add(key)
+
+        try: datetime.strptime(run['date'], "%Y-%m-%d")
+        except Exception: continue
+
+        for effort in run.get('best_efforts', []):
+            label = labels.get(effort['name'])
+            if not label: continue
+            index['efforts'].setdefault(label, []).append(
+                [effort['elapsed_time'], run['date'], run['id'], run.get('name', 'Run')])
+            touched.add(label)
+
+    for label in touched:
+        index['efforts'][label].sort(key=_sort_key)
+    return opened
+
+def best(index, label, since=None):
+    """Fastest effort for a label as {'time','date','name','id'} (optionally from runs dated on/after since, a datetime)."""
+    for time, date, aid, name in index['efforts'].get(label, []):
+        if since is None or datetime.strptime(date, "%Y-%m-%d") >= since:
+            return {'time': time, 'date': date, 'name': name, 'id': aid}
+    return None
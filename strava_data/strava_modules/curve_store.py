@@ -0,0 +1,309 @@
+import os
+import json
+import struct
+import numpy as np
+
+# --- COMPACT CURVE STORAGE ---
+# One binary record per activity, replacing the JSON text lists in power_cache/
+# and running_cache/. Layout (little-endian):
+#
+#   header  : magic 'SCRV' | version u8 | curve code u8 | reserved u16 | meta bytes u32 | count u32
+#   meta    : UTF-8 JSON of every non-curve field (id, name, date, aerobic_decoupling, ...)
+#   padding : to a 4-byte boundary
+#   curve   : count values (uint16 watts or float32 m/s)
+#
+# The curve is memory mapped, so readers only touch the durations they index.
+#
+# Records live in one append-only pack per cache dir (curves.pack) with an offset
+# index keyed by activity id (curves.idx). Replacing an activity appends a new
+# record and repoints the index; compact() drops the stale bytes, and runs on its
+# own once they pass COMPACT_RATIO of the pack. Compaction writes the next
+# generation (curves.1.pack, curves.2.pack, ...) and switches the index to it, so
+# curves still memory mapped from the old pack stay readable; the old file is
+# removed once nothing maps it (Windows refuses while a view is open).
+# Meta-only changes (update_meta) are kept as a field patch on the index entry, so
+# they never copy the curve. Per-activity <id>.crv records and legacy <id>.json
+# files are still served until migrated.
+
+MAGIC = b'SCRV'
+FORMAT_VERSION = 1
+EXTENSION = '.crv'
+LEGACY_EXTENSION = '.json'
+PACK_FILE = 'curves.pack'
+PACK_INDEX = 'curves.idx'
+COMPACT_RATIO = 0.25        # stale share of the pack that triggers a compaction
+COMPACT_MIN_BYTES = 1 << 20  # ...once the pack is at least this big
+
+_HEADER = struct.Struct('<4sBBHII')
+
+# curve key -> (code stored in the header, on-disk dtype)
+CURVE_TYPES = {
+    'power_curve': (1, np.dtype('<u2')),
+    'velocity_curve': (2, np.dtype('<f4'))
+}
+_CODES = {code: (key, dtype) for key, (code, dtype) in CURVE_TYPES.items()}
+
+def _pad(n):
+    return (-n) % 4
+
+def encode(activity):
+    """Serializes an activity dict (as previously saved to JSON) into one binary record."""
+    meta = {k: v for k, v in activity.items() if k not in CURVE_TYPES}
+    code, payload, count = 0, b'', 0
+    for key, (key_code, dtype) in CURVE_TYPES.items():
+        if key in activity:
+            values = np.asarray([np.nan if v is None else v for v in activity[key]], dtype=np.float64)
+            if dtype.kind == 'u':
+                values = np.clip(values, 0, np.iinfo(dtype).max)
+            payload = values.astype(dtype).tobytes()
+            code, count = key_code, len(values)
+            break
+
+    meta_bytes = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, code, 0, len(meta_bytes), count)
+    return header + meta_bytes + b'\0' * _pad(len(meta_bytes)) + payload
+
+def decode_header(buf, offset=0):
+    """Returns (meta, curve_key, dtype, data_offset, count) for the record starting at offset."""
+    magic, version, code, _, meta_len, count = _HEADER.unpack_from(buf, offset)
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError(f"Not a curve record (magic={magic!r}, version={version})")
+    start = offset + _HEADER.size
+    meta = json.loads(bytes(buf[start:start + meta_len]).decode('utf-8'))
+    key, dtype = _CODES.get(code, (None, None))
+    return meta, key, dtype, start + meta_len + _pad(meta_len), count
+
+# --- PACK (one data file + offset index) ---
+_packs = {}  # abs cache dir -> {'dir', 'file', 'index': {id: [offset, length(, meta patch)]}, 'view'}
+
+def _pack(cache_dir):
+    key = os.path.abspath(cache_dir)
+    if key not in _packs:
+        index, name = {}, PACK_FILE
+        index_path = os.path.join(cache_dir, PACK_INDEX)
+        if os.path.exists(index_path):
+            with open(index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            if 'records' in index:  # {"pack": file, "records": {...}}; older indexes are the records alone
+                index, name = index['records'], index['pack']
+        _packs[key] = {'dir': cache_dir, 'file': name, 'index': index, 'view': None}
+    return _packs[key]
+
+def pack_path(cache_dir):
+    """Path of the pack file currently holding cache_dir's records."""
+    return os.path.join(cache_dir, _pack(cache_dir)['file'])
+
+def _pack_view(pack):
+    """Read-only memory map over the whole pack, opened lazily once per process."""
+    if pack['view'] is None:
+        path = os.path.join(pack['dir'], pack['file'])
+        pack['view'] = np.memmap(path, dtype=np.uint8, mode='r')
+    return pack['view']
+
+def _save_pack_index(pack):
+    path = os.path.join(pack['dir'], PACK_INDEX)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'pack': pack['file'], 'records': pack['index']}, f, separators=(',', ':'), sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def _pack_append(cache_dir, records):
+    """Appends [(aid, record_bytes)] and commits the index once (data first, then index)."""
+    os.makedirs(cache_dir, exist_ok=True)
+    pack = _pack(cache_dir)
+    pack['view'] = None  # remap after the file grows
+    with open(os.path.join(cache_dir, pack['file']), 'ab') as f:
+        offset = f.seek(0, os.SEEK_END)
+        for aid, record in records:
+            record += b'\0' * _pad(len(record))  # keep every record 4-byte aligned
+            f.write(record)
+            pack['index'][str(aid)] = [offset, len(record)]
+            offset += len(record)
+    _save_pack_index(pack)
+    if offset >= COMPACT_MIN_BYTES and dead_bytes(cache_dir) > COMPACT_RATIO * offset:
+        compact(cache_dir)
+
+def _decode_packed(pack, aid, with_curve):
+    view = _pack_view(pack)
+    entry = pack['index'][aid]
+    meta, key, dtype, data_offset, count = decode_header(view, entry[0])
+    if len(entry) > 2:
+        meta.update(entry[2])
+    if with_curve and key:
+        meta[key] = view[data_offset:data_offset + count * dtype.itemsize].view(dtype)
+    return meta
+
+def dead_bytes(cache_dir):
+    """Bytes of the pack no index entry points at (replaced records)."""
+    path = pack_path(cache_dir)
+    if not os.path.exists(path): return 0
+    return os.path.getsize(path) - sum(entry[1] for entry in _pack(cache_dir)['index'].values())
+
+def _next_pack_file(name):
+    """curves.pack -> curves.1.pack -> curves.2.pack ..."""
+    stem, generation = name[:-len('.pack')], 0
+    if '.' in stem:
+        stem, generation = stem.rsplit('.', 1)
+    return f"{stem}.{int(generation) + 1}.pack"
+
+def _remove_stale_packs(pack):
+    """Deletes earlier pack generations. One still mapped somewhere (Windows) is left for the next compaction."""
+    stem = PACK_FILE[:-len('.pack')]
+    for name in os.listdir(pack['dir']):
+        if name.startswith(stem) and name.endswith('.pack') and name != pack['file']:
+            try:
+                os.remove(os.path.join(pack['dir'], name))
+            except OSError:
+                pass
+
+def compact(cache_dir):
+    """
+    Writes the live record of each activity into the next pack generation, folding
+    any meta patches back into their records, and switches the index to it. The old
+    pack is never rewritten in place, so arrays read from it stay valid. Returns
+    bytes reclaimed.
+    """
+    pack = _pack(cache_dir)
+    path = pack_path(cache_dir)
+    if not os.path.exists(path): return 0
+
+    before = os.path.getsize(path)
+    view = _pack_view(pack)
+    new_file = _next_pack_file(pack['file'])
+    new_index = {}
+    with open(os.path.join(cache_dir, new_file), 'wb') as f:
+        for aid in sorted(pack['index']):
+            offset, length = pack['index'][aid][:2]
+            if len(pack['index'][aid]) > 2:
+                record = encode(_detached(_decode_packed(pack, aid, with_curve=True)))
+                record += b'\0' * _pad(len(record))
+            else:
+                record = view[offset:offset + length].tobytes()
+            new_index[aid] = [f.tell(), len(record)]
+            f.write(record)
+        after = f.tell()
+    pack['view'] = view = None
+    pack['file'], pack['index'] = new_file, new_index
+    _save_pack_index(pack)  # the switch: readers of the index now open the new pack
+    _remove_stale_packs(pack)
+    return before - after
+
+# --- PER-ACTIVITY ACCESS ---
+def record_path(cache_dir, aid):
+    return os.path.join(cache_dir, f"{aid}{EXTENSION}")
+
+def legacy_path(cache_dir, aid):
+    return os.path.join(cache_dir, f"{aid}{LEGACY_EXTENSION}")
+
+def activity_ids(cache_dir):
+    """All cached activity ids (as strings), whichever format they are stored in."""
+    if not os.path.exists(cache_dir): return set()
+    loose = {f.rsplit('.', 1)[0] for f in os.listdir(cache_dir) if f.endswith((EXTENSION, LEGACY_EXTENSION))}
+    return loose | set(_pack(cache_dir)['index'])
+
+def _read_record_header(path):
+    with open(path, 'rb') as f:
+        head = f.read(_HEADER.size)
+        meta_len = _HEADER.unpack(head)[4]
+        return decode_header(head + f.read(meta_len))
+
+def read_meta(cache_dir, aid):
+    """Activity fields without the curve. Binary records only read their header."""
+    aid = str(aid)
+    pack = _pack(cache_dir)
+    if aid in pack['index']:
+        return _decode_packed(pack, aid, with_curve=False)
+    path = record_path(cache_dir, aid)
+    if os.path.exists(path):
+        return _read_record_header(path)[0]
+    with open(legacy_path(cache_dir, aid), 'r') as f:
+        data = json.load(f)
+    for key in CURVE_TYPES: data.pop(key, None)
+    return data
+
+def read_activity(cache_dir, aid):
+    """
+    Full activity dict. The curve comes back as a read-only NumPy array (memory
+    mapped for binary records), so callers can slice just the durations they need.
+    """
+    aid = str(aid)
+    pack = _pack(cache_dir)
+    if aid in pack['index']:
+        return _decode_packed(pack, aid, with_curve=True)
+    path = record_path(cache_dir, aid)
+    if not os.path.exists(path):
+        with open(legacy_path(cache_dir, aid), 'r') as f:
+            data = json.load(f)
+        for key, (_, dtype) in CURVE_TYPES.items():
+            if key in data:
+                data[key] = np.asarray([np.nan if v is None else v for v in data[key]],
+                                       dtype=np.int64 if dtype.kind == 'u' else np.float64)
+        return data
+
+    meta, key, dtype, data_offset, count = _read_record_header(path)
+    if key:
+        if count:
+            meta[key] = np.memmap(path, dtype=dtype, mode='r', offset=data_offset, shape=(count,))
+        else:
+            meta[key] = np.empty(0, dtype=dtype)
+    return meta
+
+def _drop_loose_files(cache_dir, aid):
+    for path in (record_path(cache_dir, aid), legacy_path(cache_dir, aid)):
+        if os.path.exists(path): os.remove(path)
+
+def write_activity(cache_dir, activity):
+    """Appends (or replaces) an activity in the pack and drops any loose per-file copy."""
+    _pack_append(cache_dir, [(activity['id'], encode(activity))])
+    _drop_loose_files(cache_dir, activity['id'])
+
+def write_activities(cache_dir, activities):
+    """Batch write_activity: one append and one index commit for the whole list."""
+    if not activities: return
+    _pack_append(cache_dir, [(a['id'], encode(a)) for a in activities])
+    for a in activities:
+        _drop_loose_files(cache_dir, a['id'])
+
+def _detached(activity):
+    for key in CURVE_TYPES:
+        if key in activity:
+            activity[key] = np.array(activity[key]).tolist()  # copy off the memory map
+    return activity
+
+def update_meta(cache_dir, aid, **fields):
+    """
+    Changes non-curve fields (e.g. aerobic_decoupling) while keeping the stored curve.
+    Packed activities only rewrite the index; loose files move into the pack.
+    """
+    aid = str(aid)
+    pack = _pack(cache_dir)
+    if aid in pack['index']:
+        entry = pack['index'][aid]
+        if len(entry) < 3: entry.append({})
+        entry[2].update(fields)
+        _save_pack_index(pack)
+        return
+    activity = read_activity(cache_dir, aid)
+    activity.update(fields)
+    write_activity(cache_dir, _detached(activity))
+
+def migrate(cache_dir):
+    """
+    One-shot move of every loose <id>.json / <id>.crv file in cache_dir into the pack.
+    Returns (converted, failed).
+    """
+    records, failed = [], 0
+    loose = sorted(activity_ids(cache_dir) - set(_pack(cache_dir)['index']))
+    for aid in loose:
+        try:
+            data = read_activity(cache_dir, aid)
+            data.setdefault('id', aid)
+            records.append((aid, encode(_detached(data))))
+        except Exception as e:
+            print(f"   ❌ {aid}: {e}")
+            failed += 1
+
+    if records:
+        _pack_append(cache_dir, records)
+        for aid, _ in records:
+            _drop_loose_files(cache_dir, aid)
+    return len(records), failed
@@ -0,0 +1,201 @@
+import numpy as np
+
+# --- MEAN-MAXIMAL CURVE ENGINE ---
+# Replaces the old `series.rolling(window=seconds).mean().max()` loop, which
+# rebuilt a pandas rolling window for every single duration.
+
+# Longest duration each cached curve covers (the processors and recompute_streams share these)
+MAX_POWER_SECONDS = 21600     # 6 hours
+MAX_VELOCITY_SECONDS = 14400  # 4 hours
+
+def to_array(values):
+    """Converts a raw Strava stream (list, may contain None) to float64 (None -> NaN)."""
+    if isinstance(values, np.ndarray): return values.astype(np.float64)
+    return np.asarray([np.nan if v is None else v for v in values], dtype=np.float64)
+
+def mean_max_power(watts, max_seconds):
+    """
+    Returns the power curve (best average watts for 1s .. max_seconds) as a list of ints.
+
+    Window sums come from one cumulative sum of the stream, so each duration is a
+    single vectorized subtract + max instead of a full pandas rolling pass.
+    Output matches int(series.rolling(window=s).mean().max()) for every duration.
+    Windows containing a dropout (None) are ignored, like pandas does; the curve
+    stops at the first duration where no clean window exists.
+    """
+    values = to_array(watts)
+    limit = min(len(values), max_seconds)
+    if limit == 0: return []
+
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+
+    # Integer streams (the normal case) are summed exactly in int64
+    if np.array_equal(filled, np.floor(filled)):
+        sums = np.concatenate(([0], np.cumsum(filled.astype(np.int64))))
+    else:
+        sums = np.concatenate(([0.0], np.cumsum(filled)))
+
+    gaps = None
+    if not valid.all():
+        gaps = np.concatenate(([0], np.cumsum(~valid)))
+
+    curve = []
+    for seconds in range(1, limit + 1):
+        totals = sums[seconds:] - sums[:-seconds]
+        if gaps is not None:
+            clean = (gaps[seconds:] - gaps[:-seconds]) == 0
+            if not clean.any(): break
+            totals = totals[clean]
+        curve.append(int(totals.max() / seconds))
+
+    return curve
+
+def mean_max_velocity(velocity, max_seconds):
+    """
+    Returns the pace curve (best average m/s for 1s .. max_seconds) as a list of floats.
+
+    Output is bit-for-bit what series.rolling(window=s).mean().max() produced: pandas
+    keeps a Kahan-compensated running sum per window, so the same recurrence is run
+    here, vectorized across every window length at once (one pass over the stream).
+    """
+    values = to_array(velocity)
+    limit = min(len(values), max_seconds)
+    if limit == 0: return []
+
+    if np.isnan(values).any() or np.signbit(values).any():
+        best = _rolling_max_mean_general(values, limit)
+    else:
+        best = _rolling_max_mean_clean(values, limit)
+
+    return [float(v) for v in best]
+
+def _rolling_max_mean_clean(values, limit):
+    """Fast path for streams with no dropouts and no negative values."""
+    n = len(values)
+    best = np.full(limit, np.nan)
+    best[0] = values.max()
+
+    # Per-window state (index = window - 1). Window 1 is handled above.
+    sums = np.zeros(limit)
+    comp_add = np.zeros(limit)
+    comp_remove = np.zeros(limit)
+    windows = np.arange(1, limit + 1, dtype=np.float64)
+    y = np.empty(limit)
+    t = np.empty(limit)
+
+    # Every window adds the same values in the same order, so the "same value"
+    # streak and the prefix state (windows not yet full) are shared scalars.
+    prev_value = values[0]
+    same_count = 0
+    p_sum = p_comp = 0.0
+
+    for i in range(n):
+        val = values[i]
+        full = min(i, limit)  # windows 2..full already slide (remove + add)
+
+        if full > 1:
+            k = slice(1, full)
+            s, cr, ca, yk, tk = sums[k], comp_remove[k], comp_add[k], y[k], t[k]
+            # remove_mean: y = -old - c; t = sum + y; c = t - sum - y
+            np.negative(values[i - full:i - 1][::-1], out=yk)
+            np.subtract(yk, cr, out=yk)
+            np.add(s, yk, out=tk)
+            np.subtract(tk, s, out=cr)
+            np.subtract(cr, yk, out=cr)
+            s[:] = tk
+            # add_mean
+            np.subtract(val, ca, out=yk)
+            np.add(s, yk, out=tk)
+            np.subtract(tk, s, out=ca)
+            np.subtract(ca, yk, out=ca)
+            s[:] = tk
+
+        y_p = val - p_comp
+        t_p = p_sum + y_p
+        p_comp = t_p - p_sum - y_p
+        p_sum = t_p
+        same_count = same_count + 1 if val == prev_value else 1
+        prev_value = val
+
+        # The window of length i + 1 fills up now: hand it the shared prefix state
+        if 0 < i < limit:
+            sums[i], comp_add[i] = p_sum, p_comp
+            full = i + 1
+
+        if full > 1:
+            k = slice(1, full)
+            means = np.divide(sums[k], windows[k], out=t[k])
+            means[:same_count - 1] = prev_value
+            means[means < 0] = 0.0
+            np.fmax(best[k], means, out=best[k])
+
+    return best
+
+def _rolling_max_mean_general(values, limit):
+    """Same recurrence with dropout (NaN) counting and the negative-value clamps."""
+    n = len(values)
+    best = np.full(limit, np.nan)
+    best[0] = np.nanmax(values) if not np.isnan(values).all() else np.nan
+
+    sums = np.zeros(limit)
+    comp_add = np.zeros(limit)
+    comp_remove = np.zeros(limit)
+    nobs = np.zeros(limit, dtype=np.int64)
+    neg_ct = np.zeros(limit, dtype=np.int64)
+    windows = np.arange(1, limit + 1)
+
+    prev_value = values[0]
+    same_count = 0
+    p_sum = p_comp = 0.0
+    p_nobs = p_neg = 0
+
+    for i in range(n):
+        val = values[i]
+        full = min(i, limit)
+
+        if full > 1:
+            k = slice(1, full)
+            old = values[i - full:i - 1][::-1]
+            keep = ~np.isnan(old)
+            y = np.where(keep, -old - comp_remove[k], 0.0)
+            t = sums[k] + y
+            comp_remove[k] = np.where(keep, t - sums[k] - y, comp_remove[k])
+            sums[k] = np.where(keep, t, sums[k])
+            nobs[k] -= keep
+            neg_ct[k] -= keep & np.signbit(old)
+
+        if val == val:
+            y = val - p_comp
+            t = p_sum + y
+            p_comp = t - p_sum - y
+            p_sum = t
+            p_nobs += 1
+            p_neg += int(np.signbit(val))
+            same_count = same_count + 1 if val == prev_value else 1
+            prev_value = val
+
+            if full > 1:
+                y = val - comp_add[k]
+                t = sums[k] + y
+                comp_add[k] = t - sums[k] - y
+                sums[k] = t
+                nobs[k] += 1
+                neg_ct[k] += int(np.signbit(val))
+
+        if 0 < i < limit:
+            sums[i], comp_add[i] = p_sum, p_comp
+            nobs[i], neg_ct[i] = p_nobs, p_neg
+            full = i + 1
+
+        if full > 1:
+            k = slice(1, full)
+            count = nobs[k]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means = sums[k] / count
+            means = np.where(same_count >= count, prev_value, means)
+            means = np.where((neg_ct[k] == 0) & (means < 0), 0.0, means)
+            means = np.where((neg_ct[k] == count) & (means > 0), 0.0, means)
+            best[k] = np.fmax(best[k], np.where(count >= windows[k], means, np.nan))
+
+    return best
@@ -0,0 +1,159 @@
+import os
+import json
+import numpy as np
+from datetime import datetime
+from . import curve_store
+
+# --- PERSISTED POWER ENVELOPE ---
+# Best watts per duration (all time + rolling window) with the ride that set it.
+# Only rides added to the cache since the last run are opened and folded in; the
+# rolling envelope is rebuilt only when a ride that holds one of its bests ages out.
+
+def _new_envelope(max_seconds):
+    return {
+        'watts': np.full(max_seconds, -1, dtype=np.int64),
+        'source': np.full(max_seconds, -1, dtype=np.int64)  # index into index['rides']
+    }
+
+def new_index(max_seconds):
+    return {
+        'max_seconds': max_seconds,
+        'folded': set(),     # every cache id already looked at (incl. no_power rides)
+        'rides': [],         # {'id', 'date', 'name'} of rides referenced by an envelope
+        'ride_slots': {},    # str(id) -> position in 'rides'
+        'recent': {},        # str(id) -> date, rides currently inside the rolling window
+        'all_time': _new_envelope(max_seconds),
+        'recent_best': _new_envelope(max_seconds)
+    }
+
+def load_index(path, max_seconds):
+    """Loads the persisted index, or starts a fresh one if missing / built for another duration."""
+    if not os.path.exists(path): return new_index(max_seconds)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            raw = json.load(f)
+    except Exception:
+        return new_index(max_seconds)
+    if raw.get('max_seconds') != max_seconds: return new_index(max_seconds)
+
+    index = new_index(max_seconds)
+    index['folded'] = set(raw['folded'])
+    index['rides'] = raw['rides']
+    index['ride_slots'] = {str(r['id']): i for i, r in enumerate(raw['rides'])}
+    index['recent'] = raw['recent']
+    for key in ('all_time', 'recent_best'):
+        index[key]['watts'][:] = raw[key]['watts']
+        index[key]['source'][:] = raw[key]['source']
+    return index
+
+def save_index(path, index):
+    """Writes the index, dropping rides no envelope points at any more."""
+    used = np.unique(np.concatenate([index['all_time']['source'], index['recent_best']['source']]))
+    used = used[used >= 0]
+    remap = np.full(len(index['rides']) + 1, -1, dtype=np.int64)  # last slot maps -1 -> -1
+    remap[used] = np.arange(len(used))
+
+    raw = {
+        'max_seconds': index['max_seconds'],
+        'folded': sorted(index['folded']),
+        'rides': [index['rides'][i] for i in used],
+        'recent': index['recent']
+    }
+    for key in ('all_time', 'recent_best'):
+        raw[key] = {
+            'watts': index[key]['watts'].tolist(),
+            'source': remap[index[key]['source']].tolist()
+        }
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(raw, f, separators=(',', ':'))
+
+def _ride_slot(index, ride):
+    key = str(ride['id'])
+    if key not in index['ride_slots']:
+        index['ride_slots'][key] = len(index['rides'])
+        index['rides'].append({'id': ride['id'], 'date': ride['date'], 'name': ride.get('name', 'Ride')})
+    return index['ride_slots'][key]
+
+def _fold(envelope, curve, slot):
+    c = np.asarray(curve[:len(envelope['watts'])], dtype=np.int64)
+    n = len(c)
+    better = c > envelope['watts'][:n]
+    envelope['watts'][:n][better] = c[better]
+    envelope['source'][:n][better] = slot
+
+def _load_ride(cache_dir, key):
+    try:
+        return curve_store.read_activity(cache_dir, key)
+    except Exception:
+        return None
+
+def _ride_date(ride):
+    """Date of a ride with a usable power curve, else None (no_power / bad date)."""
+    if 'power_curve' not in ride: return None
+    try: return datetime.strptime(ride['date'], "%Y-%m-%d")
+    except Exception: return None
+
+def _rebuild_recent(index, cache_dir):
+    index['recent_best'] = _new_envelope(index['max_seconds'])
+    for key in sorted(index['recent']):
+        ride = _load_ride(cache_dir, key)
+        if ride and _ride_date(ride):
+            _fold(index['recent_best'], ride['power_curve'], _ride_slot(index, ride))
+
+def update_index(index, cache_dir, window_start):
+    """
+    Brings the index up to date with cache_dir.
+    window_start: rides dated on/after this datetime count toward the rolling envelope.
+    Returns the number of cache files that had to be opened.
+    """
+    on_disk = curve_store.activity_ids(cache_dir)
+
+    # A ride vanished from the cache: its bests can't be un-folded, start over
+    if index['folded'] - on_disk:
+        fresh = new_index(index['max_seconds'])
+        index.clear()
+        index.update(fresh)
+
+    opened = 0
+
+    # 1. Age out rides that fell behind the rolling window
+    expired = [k for k, d in index['recent'].items() if datetime.strptime(d, "%Y-%m-%d") < window_start]
+    if expired:
+        expired_slots = {index['ride_slots'][k] for k in expired if k in index['ride_slots']}
+        for k in expired: del index['recent'][k]
+        if expired_slots & set(index['recent_best']['source'].tolist()):
+            _rebuild_recent(index, cache_dir)
+            opened += len(index['recent'])
+
+    # 2. Fold in rides added since the last run
+    for key in sorted(on_disk - index['folded']):
+        opened += 1
+        ride = _load_ride(cache_dir, key)
+        if ride is None: continue  # unreadable, retry next run
+        index['folded'].add(key)
+
+        ride_date = _ride_date(ride)
+        if ride_date is None: continue
+
+        slot = _ride_slot(index, ride)
+        _fold(index['all_time'], ride['power_curve'], slot)
+        if ride_date >= window_start:
+            index['recent'][key] = ride['date']
+            _fold(index['recent_best'], ride['power_curve'], slot)
+
+    return opened
+
+def best_entries(index, key):
+    """Expands an envelope into the per-second [{'watts','date','name','id'} or None] list."""
+    envelope = index[key]
+    rides = index['rides']
+    entries = []
+    for watts, slot in zip(envelope['watts'].tolist(), envelope['source'].tolist()):
+        if slot < 0:
+            entries.append(None)
+        else:
+            ride = rides[slot]
+            entries.append({'watts': watts, 'date': ride['date'], 'name': ride['name'], 'id': ride['id']})
+    return entries
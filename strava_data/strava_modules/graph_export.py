@@ -0,0 +1,75 @@
+import numpy as np
+
+# --- COMPACT CURVE EXPORTS ---
+# Shared by the dashboard curve files (power_curve_graph.json, ...). Instead of one
+# dict per second, a columnar export stores parallel arrays plus a table of the
+# distinct source activities referenced by position. Optional log-spaced sampling
+# keeps a fixed density per decade (the chart's x axis is logarithmic) plus every
+# point needed to redraw the curve within a tolerance and every source change.
+
+def log_grid(limit, per_decade):
+    """Durations 1..limit spaced evenly in log space (always including 1 and limit), as 0-based indices."""
+    if limit <= 0: return np.empty(0, dtype=np.int64)
+    count = max(2, int(np.ceil(np.log10(max(limit, 2)) * per_decade)) + 1)
+    seconds = np.unique(np.rint(np.geomspace(1, limit, count)).astype(np.int64))
+    return seconds - 1
+
+def _inflections(log_x, series, tolerance):
+    """
+    Indices where straight lines (in log x) between kept points would miss any series
+    by more than tolerance (Douglas-Peucker on vertical distance).
+    """
+    n = len(log_x)
+    keep = {0, n - 1}
+    stack = [(0, n - 1)]
+    while stack:
+        lo, hi = stack.pop()
+        if hi - lo < 2: continue
+        span = log_x[hi] - log_x[lo]
+        t = (log_x[lo + 1:hi] - log_x[lo]) / span if span > 0 else np.zeros(hi - lo - 1)
+        error = np.zeros(hi - lo - 1)
+        for y in series:
+            line = y[lo] + t * (y[hi] - y[lo])
+            error = np.maximum(error, np.abs(y[lo + 1:hi] - line))
+        worst = int(np.argmax(error))
+        if error[worst] > tolerance:
+            mid = lo + 1 + worst
+            keep.add(mid)
+            stack.append((lo, mid))
+            stack.append((mid, hi))
+    return keep
+
+def sample_indices(seconds, series, per_decade, tolerance, breaks=()):
+    """
+    Row indices to keep for a log-sampled export.
+    seconds: x values (durations); series: y arrays; breaks: label arrays (e.g. source
+    ride slots) whose value changes must stay visible, so both sides are kept.
+    """
+    seconds = np.asarray(seconds, dtype=np.float64)
+    n = len(seconds)
+    if n == 0: return np.empty(0, dtype=np.int64)
+
+    # The grid is defined over durations, rows may not start at 1s or be contiguous
+    grid = np.searchsorted(seconds, log_grid(int(seconds[-1]), per_decade) + 1)
+    keep = set(grid[grid < n].tolist())
+    keep |= _inflections(np.log(seconds), [np.asarray(y, dtype=np.float64) for y in series], tolerance)
+    for labels in breaks:
+        labels = np.asarray(labels)
+        change = np.flatnonzero(labels[1:] != labels[:-1])
+        keep |= set(change.tolist()) | set((change + 1).tolist())
+    return np.array(sorted(keep), dtype=np.int64)
+
+class SourceTable:
+    """Distinct source activities, referenced from the columns by position (-1 = none)."""
+    def __init__(self, fields):
+        self.fields = fields
+        self.rows = []
+        self.slots = {}
+
+    def ref(self, entry):
+        if not entry: return -1
+        key = entry['id']
+        if key not in self.slots:
+            self.slots[key] = len(self.rows)
+            self.rows.append({f: entry[f] for f in self.fields})
+        return self.slots[key]
@@ -0,0 +1,136 @@
+import os
+import json
+import numpy as np
+from datetime import datetime
+from . import curve_store
+
+# --- DATE-INDEXED POWER PROFILES ---
+# All cached power curves stacked into one rides x seconds matrix, sorted by ride
+# date. "Best N-second power between date A and date B" is then two binary
+# searches plus one column-wise max over the rides in range: any number of
+# windows (rolling 90d, season, year vs year) from a single pass over the cache.
+#
+# The matrix is saved next to the envelope index (uint16, compressed) and, like
+# the envelope, only rides added to the cache since the last run are opened.
+
+MISSING = 0xFFFF  # on-disk marker for "ride too short" (-1 in memory)
+
+def new_index(max_seconds):
+    return {
+        'folded': set(),  # every cache id already looked at (incl. no_power rides)
+        'keys': [],       # cache id of each row
+        'dates': np.array([], dtype='datetime64[D]'),
+        'rides': [],      # {'id', 'date', 'name'} per row
+        'curves': np.full((0, max_seconds), -1, dtype=np.int32)
+    }
+
+def _read_rides(cache_dir, keys, max_seconds):
+    """Opens keys. Returns (keys looked at, [(key, ride entry, date, curve row)]); unreadable keys are retried."""
+    looked, found = set(), []
+    for aid in sorted(keys):
+        try: ride = curve_store.read_activity(cache_dir, aid)
+        except Exception: continue
+        looked.add(aid)
+        if 'power_curve' not in ride: continue
+        try: ride_date = datetime.strptime(ride['date'], "%Y-%m-%d")
+        except Exception: continue
+
+        row = np.full(max_seconds, -1, dtype=np.int32)  # -1 = ride too short
+        curve = np.asarray(ride['power_curve'][:max_seconds], dtype=np.int32)
+        row[:len(curve)] = curve
+        entry = {'id': ride['id'], 'date': ride['date'], 'name': ride.get('name', 'Ride')}
+        found.append((aid, entry, np.datetime64(ride_date.date()), row))
+    return looked, found
+
+def update_index(index, cache_dir):
+    """
+    Brings the index up to date with cache_dir: rows for rides added since the last
+    run are read and merged in date order. Returns the number of cache files opened.
+    """
+    max_seconds = index['curves'].shape[1]
+    on_disk = curve_store.activity_ids(cache_dir)
+
+    # A ride vanished from the cache: start over
+    if index['folded'] - on_disk:
+        index.clear()
+        index.update(new_index(max_seconds))
+
+    new_keys = on_disk - index['folded']
+    if not new_keys: return 0
+    looked, found = _read_rides(cache_dir, new_keys, max_seconds)
+    index['folded'] |= looked
+    if not found: return len(new_keys)
+
+    keys = index['keys'] + [f[0] for f in found]
+    dates = np.concatenate([index['dates'], np.array([f[2] for f in found], dtype='datetime64[D]')])
+    rides = index['rides'] + [f[1] for f in found]
+    curves = np.vstack([index['curves']] + [f[3][None, :] for f in found])
+
+    # Rows by date, then by cache id: the same order a full rebuild gives
+    order = np.lexsort((np.array(keys, dtype=str), dates))
+    index['keys'] = [keys[i] for i in order]
+    index['dates'] = dates[order]
+    index['rides'] = [rides[i] for i in order]
+    index['curves'] = curves[order]
+    return len(new_keys)
+
+def build_index(cache_dir, max_seconds):
+    """Loads every ride with a power curve. Returns {'dates', 'rides', 'curves', ...} sorted by date."""
+    index = new_index(max_seconds)
+    update_index(index, cache_dir)
+    return index
+
+def load_index(path, max_seconds):
+    """Loads the saved index, or starts a fresh one if missing / built for another duration."""
+    if not os.path.exists(path): return new_index(max_seconds)
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            curves = data['curves']
+            listing = json.loads(str(data['listing']))
+            dates = data['dates'].astype('datetime64[D]')
+    except Exception:
+        return new_index(max_seconds)
+    if curves.shape[1] != max_seconds: return new_index(max_seconds)
+
+    curves = curves.astype(np.int32)
+    curves[curves == MISSING] = -1
+    return {
+        'folded': set(listing['folded']),
+        'keys': listing['keys'],
+        'dates': dates,
+        'rides': listing['rides'],
+        'curves': curves
+    }
+
+def save_index(path, index):
+    curves = np.where(index['curves'] < 0, MISSING, np.minimum(index['curves'], MISSING - 1)).astype('<u2')
+    listing = {'folded': sorted(index['folded']), 'keys': index['keys'], 'rides': index['rides']}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        np.savez_compressed(f, curves=curves, dates=index['dates'].astype(str),
+                            listing=np.array(json.dumps(listing, separators=(',', ':'))))
+    os.replace(path + '.tmp', path)
+
+def best_between(index, start, end):
+    """
+    Best watts per duration from rides dated start..end (inclusive, date or datetime).
+    Returns (watts, ride_positions) arrays; watts is -1 / position -1 where no ride qualifies.
+    """
+    lo = np.searchsorted(index['dates'], np.datetime64(start, 'D'), side='left')
+    hi = np.searchsorted(index['dates'], np.datetime64(end, 'D'), side='right')
+    max_seconds = index['curves'].shape[1]
+    if lo >= hi:
+        return np.full(max_seconds, -1), np.full(max_seconds, -1)
+
+    block = index['curves'][lo:hi]
+    rows = block.argmax(axis=0)
+    watts = block[rows, np.arange(max_seconds)]
+    positions = np.where(watts >= 0, rows + lo, -1)
+    return watts, positions
+
+def profile_at(index, watts, positions, seconds):
+    """Entry for one duration of a best_between() result, or None."""
+    i = seconds - 1
+    if i >= len(watts) or watts[i] < 0: return None
+    ride = index['rides'][positions[i]]
+    return {'watts': int(watts[i]), 'date': ride['date'], 'name': ride['name'], 'id': ride['id']}
@@ -0,0 +1,127 @@
+import os
+import threading
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+# --- RATE-LIMITED CONCURRENT FETCHING ---
+# Strava counts requests in two fixed windows: 15 minutes (resetting at :00, :15,
+# :30, :45 UTC) and one UTC day. Each window is a token bucket that refills when the
+# window resets; every response's X-RateLimit-Usage header re-syncs the buckets, so
+# requests made elsewhere (the other sport's processor, a backfill) are accounted for.
+# A bounded thread pool then spends the budget as fast as it allows.
+
+SHORT_WINDOW_SECONDS = 15 * 60
+DAILY_WINDOW_SECONDS = 24 * 60 * 60
+
+# Read limits of a standard Strava app; responses overwrite these with the real ones
+SHORT_LIMIT = int(os.getenv('STRAVA_RATE_LIMIT_15MIN', 100))
+DAILY_LIMIT = int(os.getenv('STRAVA_RATE_LIMIT_DAILY', 1000))
+
+MAX_WORKERS = int(os.getenv('STRAVA_FETCH_WORKERS', 8))
+# Longest pause for a 15-minute reset before the run stops and leaves the rest for the
+# next one. Short by default so CI jobs don't idle; manual backfills can opt into
+# sleeping through whole windows with STRAVA_MAX_RATE_WAIT=900.
+MAX_WAIT_SECONDS = int(os.getenv('STRAVA_MAX_RATE_WAIT', 60))
+REQUEST_TIMEOUT = 30
+
+class RateLimitExhausted(Exception):
+    """The daily budget is spent, or the next 15-minute reset is further away than max_wait."""
+
+def _next_reset(now, window):
+    return (int(now) // window + 1) * window
+
+def _parse_pair(value):
+    try:
+        short, daily = (int(v) for v in value.split(','))
+        return short, daily
+    except Exception:
+        return None
+
+class RateLimiter:
+    def __init__(self, short_limit=SHORT_LIMIT, daily_limit=DAILY_LIMIT, max_wait=MAX_WAIT_SECONDS,
+                 clock=time.time, sleep=time.sleep):
+        self.windows = (SHORT_WINDOW_SECONDS, DAILY_WINDOW_SECONDS)
+        self.limits = [short_limit, daily_limit]
+        self.used = [0, 0]
+        self.max_wait = max_wait
+        self.clock, self.sleep = clock, sleep
+        now = clock()
+        self.resets = [_next_reset(now, w) for w in self.windows]
+        self.lock = threading.Lock()
+
+    def _roll(self, now):
+        for i, window in enumerate(self.windows):
+            if now >= self.resets[i]:
+                self.used[i] = 0
+                self.resets[i] = _next_reset(now, window)
+
+    def acquire(self):
+        """Takes one request from both buckets, sleeping until the 15-minute reset if needed."""
+        while True:
+            with self.lock:
+                now = self.clock()
+                self._roll(now)
+                if self.used[1] >= self.limits[1]:
+                    raise RateLimitExhausted(f"daily limit of {self.limits[1]} requests reached")
+                if self.used[0] < self.limits[0]:
+                    self.used[0] += 1
+                    self.used[1] += 1
+                    return
+                wait = self.resets[0] - now
+            if wait > self.max_wait:
+                raise RateLimitExhausted(f"15-minute limit reached, next reset in {wait:.0f}s")
+            print(f"   ⏳ 15-minute rate limit reached. Waiting {wait:.0f}s for the reset...")
+            self.sleep(wait)
+
+    def update(self, headers):
+        """Re-syncs the buckets from a response's limit/usage headers."""
+        # Read-only endpoints report the tighter read limits separately
+        limits = _parse_pair(headers.get('X-ReadRateLimit-Limit', '')) or _parse_pair(headers.get('X-RateLimit-Limit', ''))
+        usage = _parse_pair(headers.get('X-ReadRateLimit-Usage', '')) or _parse_pair(headers.get('X-RateLimit-Usage', ''))
+        with self.lock:
+            self._roll(self.clock())
+            if limits: self.limits = list(limits)
+            if usage: self.used = [max(u, server) for u, server in zip(self.used, usage)]
+
+    def throttled(self, headers):
+        """After a 429: the 15-minute bucket is empty (and the daily one too, if the headers say so)."""
+        self.update(headers)
+        with self.lock:
+            self.used[0] = max(self.used[0], self.limits[0])
+
+def get(limiter, url, retries=2, session=None, **kwargs):
+    """GET through the limiter (on a pooled session if given). A 429 waits for the next window and retries."""
+    kwargs.setdefault('timeout', REQUEST_TIMEOUT)
+    http = session or requests
+    for _ in range(retries + 1):
+        limiter.acquire()
+        r = http.get(url, **kwargs)
+        if r.status_code != 429:
+            limiter.update(r.headers)
+            return r
+        limiter.throttled(r.headers)
+    return r
+
+def fetch_all(items, worker, max_workers=MAX_WORKERS):
+    """
+    Runs worker(item) for every item on a bounded thread pool.
+    Yields (item, result, error) in input order, so callers can keep writing results
+    one by one exactly as a serial loop would. Once the budget is exhausted, queued
+    items are dropped; results already downloaded are still handed back.
+    """
+    if not items: return
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        futures = [(item, pool.submit(worker, item)) for item in items]
+        exhausted = False
+        for item, future in futures:
+            if future.cancelled(): continue
+            try:
+                yield item, future.result(), None
+            except RateLimitExhausted as e:
+                if not exhausted:
+                    print(f"⚠️ Rate Limit Hit ({e}). Stopping.")
+                    exhausted = True
+                    for _, rest in futures: rest.cancel()
+            except Exception as e:
+                yield item, None, e
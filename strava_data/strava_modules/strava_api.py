@@ -0,0 +1,109 @@
+import os
+import json
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from . import rate_limit
+
+# --- SHARED STRAVA CLIENT ---
+# One pooled HTTP session (keep-alive, sized for the fetch thread pool) and one
+# OAuth access token per machine. The token is cached on disk until shortly before
+# it expires, so the cycling and running processors, the backfills and
+# 1_fetch_list.py (separate processes) share a single refresh.
+#
+# STRAVA_API_BASE points every script at a local stand-in server for tests.
+
+API_BASE = 'https://www.strava.com'
+TOKEN_CACHE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.strava_token.json')
+EXPIRY_MARGIN_SECONDS = 300  # refresh a little early so no request goes out with a dying token
+
+class AuthError(Exception):
+    pass
+
+class StravaClient:
+    def __init__(self, base_url=None, token_cache=None, limiter=None):
+        # Read at construction so values loaded from .env after import still apply
+        self.base_url = (base_url or os.getenv('STRAVA_API_BASE', API_BASE)).rstrip('/')
+        self.token_cache = token_cache or os.getenv('STRAVA_TOKEN_CACHE', TOKEN_CACHE)
+        self.limiter = limiter or rate_limit.RateLimiter()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(rate_limit.MAX_WORKERS, 10))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._token = None
+        self._token_lock = threading.Lock()  # fetch threads share one refresh
+
+    # --- OAUTH ---
+    def _load_cached_token(self):
+        if not self.token_cache or not os.path.exists(self.token_cache): return None
+        try:
+            with open(self.token_cache, 'r') as f:
+                cached = json.load(f)
+        except Exception:
+            return None
+        if cached.get('base_url') != self.base_url or cached.get('client_id') != os.getenv('STRAVA_CLIENT_ID'):
+            return None
+        return cached
+
+    def _save_cached_token(self, token):
+        if not self.token_cache: return
+        try:
+            tmp = self.token_cache + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(token, f)
+            os.chmod(tmp, 0o600)
+            os.replace(tmp, self.token_cache)
+        except Exception as e:
+            print(f"⚠️ Could not cache Strava token: {e}")
+
+    def access_token(self):
+        """Current access token, refreshed (and re-cached) only when it is about to expire."""
+        with self._token_lock:
+            token = self._token or self._load_cached_token()
+            if token and token['expires_at'] - EXPIRY_MARGIN_SECONDS > time.time():
+                self._token = token
+                return token['access_token']
+            return self._refresh()
+
+    def _refresh(self):
+        payload = {
+            'client_id': os.getenv('STRAVA_CLIENT_ID'),
+            'client_secret': os.getenv('STRAVA_CLIENT_SECRET'),
+            'refresh_token': os.getenv('STRAVA_REFRESH_TOKEN'),
+            'grant_type': 'refresh_token',
+            'f': 'json'
+        }
+        try:
+            res = self.session.post(f"{self.base_url}/oauth/token", data=payload, timeout=rate_limit.REQUEST_TIMEOUT)
+            res.raise_for_status()
+            body = res.json()
+            if 'access_token' not in body: raise ValueError(f"no access_token in response: {body}")
+        except Exception as e:
+            raise AuthError(e)
+
+        self._token = {
+            'access_token': body['access_token'],
+            'expires_at': body.get('expires_at', time.time() + body.get('expires_in', 21600)),
+            'base_url': self.base_url,
+            'client_id': payload['client_id']
+        }
+        self._save_cached_token(self._token)
+        return self._token['access_token']
+
+    # --- API ---
+    def get(self, path, **kwargs):
+        """Rate-limited GET of an /api/v3 path (e.g. '/athlete/activities')."""
+        headers = dict(kwargs.pop('headers', {}))
+        headers['Authorization'] = f"Bearer {self.access_token()}"
+        return rate_limit.get(self.limiter, f"{self.base_url}/api/v3{path}", session=self.session, headers=headers, **kwargs)
+
+def connect():
+    """Client with a valid token, or None (with a warning) when authentication fails."""
+    client = StravaClient()
+    try:
+        client.access_token()
+        return client
+    except AuthError as e:
+        print(f"⚠️ Auth Failed: {e}")
+        return None
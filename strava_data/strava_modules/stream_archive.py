@@ -0,0 +1,48 @@
+import os
+import numpy as np
+
+# --- LOCAL RAW-STREAM ARCHIVE ---
+# update_cache keeps the raw Strava streams it downloads (one compressed .npz per
+# activity, one array per stream key), so curves, drift or any new stream metric
+# can be recomputed offline instead of re-downloading from Strava.
+# The archive is local only and lives outside the checkout (ROOT), so the git_ops
+# commit of strava_data/ never picks it up and the CI checkout's clean
+# (git clean -ffdx) never wipes it. STRAVA_STREAM_ARCHIVE moves it.
+#
+# Streams round-trip losslessly: integer streams are stored as int32, anything
+# with fractional values or dropouts (None -> NaN) as float64.
+
+ROOT = os.getenv('STRAVA_STREAM_ARCHIVE', os.path.join(os.path.expanduser('~'), '.cache', 'training', 'strava_stream_archive'))
+EXTENSION = '.npz'
+
+def _encode(values):
+    if any(v is None for v in values):
+        return np.asarray([np.nan if v is None else v for v in values], dtype=np.float64)
+    array = np.asarray(values)
+    if array.dtype.kind in 'iub':
+        return array.astype(np.int32)
+    return array.astype(np.float64)
+
+def archived_ids(archive_dir):
+    """Ids (as strings) of every activity with archived streams."""
+    if not os.path.exists(archive_dir): return set()
+    return {f[:-len(EXTENSION)] for f in os.listdir(archive_dir) if f.endswith(EXTENSION)}
+
+def save_streams(archive_dir, aid, streams):
+    """Archives a Strava key_by_type streams payload ({'watts': {'data': [...]}, ...})."""
+    arrays = {key: _encode(s['data']) for key, s in streams.items() if isinstance(s, dict) and 'data' in s}
+    if not arrays: return False
+
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{aid}{EXTENSION}")
+    with open(path + '.tmp', 'wb') as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(path + '.tmp', path)
+    return True
+
+def load_streams(archive_dir, aid):
+    """Archived streams in the same shape the Strava API returns, or None if not archived."""
+    path = os.path.join(archive_dir, f"{aid}{EXTENSION}")
+    if not os.path.exists(path): return None
+    with np.load(path) as archive:
+        return {key: {'data': archive[key]} for key in archive.files}
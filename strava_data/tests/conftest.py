@@ -0,0 +1,41 @@
+import os
+import sys
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+
+# --- TEST SETUP ---
+# The Strava scripts import strava_modules from strava_data/
+STRAVA_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if STRAVA_DIR not in sys.path: sys.path.insert(0, STRAVA_DIR)
+
+from strava_modules import curve_store
+
+@pytest.fixture(autouse=True)
+def fresh_packs():
+    """Each test starts without this process's cached view of any pack."""
+    curve_store._packs.clear()
+    yield
+    curve_store._packs.clear()
+
+def synthetic_rides(count, max_seconds, seed=0):
+    """count rides over Jan-Feb 2025 with random falling power curves; every 7th has no power."""
+    rng = np.random.default_rng(seed)
+    rides = []
+    for i in range(count):
+        day = (datetime(2025, 1, 1) + timedelta(days=int(rng.integers(0, 60)))).strftime("%Y-%m-%d")
+        ride = {'id': 1000 + i, 'name': f'Ride {i}', 'date': day}
+        if i % 7 == 3:
+            ride['no_power'] = True
+        else:
+            length = int(rng.integers(30, max_seconds + 40))
+            ride['power_curve'] = np.sort(rng.integers(100, 900, length))[::-1].tolist()
+        rides.append(ride)
+    return rides
+
+def write_in_batches(cache_dir, rides, batches, update):
+    """Writes rides into the cache in batches, calling update() after each. Returns the last result."""
+    for chunk in np.array_split(np.arange(len(rides)), batches):
+        curve_store.write_activities(cache_dir, [rides[i] for i in chunk])
+        result = update()
+    return result
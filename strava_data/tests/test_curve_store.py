@@ -0,0 +1,113 @@
+import os
+import json
+import numpy as np
+from strava_modules import curve_store
+
+def _ride(aid, seconds=600, **extra):
+    curve = np.maximum(400 - np.arange(seconds) // 3, 120).tolist()
+    return dict({'id': aid, 'name': f'Ride {aid}', 'date': '2025-03-01', 'power_curve': curve}, **extra)
+
+def _run(aid):
+    curve = [4.5, None, 4.2, 3.9]
+    return {'id': aid, 'name': f'Run {aid}', 'date': '2025-03-02', 'velocity_curve': curve, 'best_efforts': [{'name': '400m', 'elapsed_time': 104}]}
+
+def _reopen(cache_dir):
+    curve_store._packs.pop(os.path.abspath(cache_dir), None)
+
+def _pack_size(cache_dir):
+    return os.path.getsize(curve_store.pack_path(cache_dir))
+
+def test_pack_round_trip(tmp_path):
+    cache = str(tmp_path)
+    rides = [_ride(i) for i in range(5)]
+    curve_store.write_activities(cache, rides)
+    curve_store.write_activity(cache, _run(99))
+    _reopen(cache)
+
+    assert curve_store.activity_ids(cache) == {'0', '1', '2', '3', '4', '99'}
+    for ride in rides:
+        stored = curve_store.read_activity(cache, ride['id'])
+        assert stored['power_curve'].tolist() == ride['power_curve']
+        assert curve_store.read_meta(cache, ride['id']) == {k: v for k, v in ride.items() if k != 'power_curve'}
+    run = curve_store.read_activity(cache, 99)
+    assert run['velocity_curve'].dtype == np.float32
+    assert np.allclose(run['velocity_curve'], [4.5, np.nan, 4.2, 3.9], equal_nan=True)
+    assert run['best_efforts'] == [{'name': '400m', 'elapsed_time': 104}]
+
+def test_meta_update_does_not_copy_the_curve(tmp_path):
+    cache = str(tmp_path)
+    curve_store.write_activities(cache, [_ride(i) for i in range(3)])
+    size = _pack_size(cache)
+    curve_store.update_meta(cache, 1, aerobic_decoupling=4.2)
+    curve_store.update_meta(cache, 1, aerobic_decoupling=None)
+    assert _pack_size(cache) == size
+    _reopen(cache)
+    assert curve_store.read_meta(cache, 1)['aerobic_decoupling'] is None
+    assert curve_store.read_activity(cache, 1)['power_curve'].tolist() == _ride(1)['power_curve']
+
+def test_compact_drops_stale_records_and_folds_patches(tmp_path):
+    cache = str(tmp_path)
+    curve_store.write_activities(cache, [_ride(i) for i in range(4)])
+    curve_store.write_activity(cache, _ride(2, seconds=300))
+    curve_store.update_meta(cache, 3, aerobic_decoupling=2.5)
+    before = {aid: curve_store.read_activity(cache, aid) for aid in curve_store.activity_ids(cache)}
+    assert curve_store.dead_bytes(cache) > 0
+
+    reclaimed = curve_store.compact(cache)
+    assert reclaimed > 0 and curve_store.dead_bytes(cache) == 0
+    with open(os.path.join(cache, curve_store.PACK_INDEX)) as f:
+        assert all(len(entry) == 2 for entry in json.load(f)['records'].values())
+    _reopen(cache)
+    for aid, activity in before.items():
+        after = curve_store.read_activity(cache, aid)
+        assert after['power_curve'].tolist() == activity['power_curve'].tolist()
+        assert {k: v for k, v in after.items() if k != 'power_curve'} == \
+               {k: v for k, v in activity.items() if k != 'power_curve'}
+    assert len(curve_store.read_activity(cache, 2)['power_curve']) == 300
+
+def test_compact_leaves_arrays_from_the_old_pack_readable(tmp_path):
+    cache = str(tmp_path)
+    curve_store.write_activities(cache, [_ride(i) for i in range(3)])
+    curve_store.write_activity(cache, _ride(1, seconds=300))
+    held = curve_store.read_activity(cache, 0)['power_curve']  # still mapped during the compaction
+
+    curve_store.compact(cache)
+    assert held.tolist() == _ride(0)['power_curve']
+    assert os.path.basename(curve_store.pack_path(cache)) == 'curves.1.pack'
+    _reopen(cache)
+    assert curve_store.read_activity(cache, 1)['power_curve'].tolist() == _ride(1, seconds=300)['power_curve']
+    del held
+    curve_store.compact(cache)
+    assert sorted(os.listdir(cache)) == ['curves.2.pack', curve_store.PACK_INDEX]
+
+def test_reads_an_index_without_a_pack_name(tmp_path):
+    cache = str(tmp_path)
+    curve_store.write_activities(cache, [_ride(i) for i in range(2)])
+    with open(os.path.join(cache, curve_store.PACK_INDEX)) as f:
+        records = json.load(f)['records']
+    with open(os.path.join(cache, curve_store.PACK_INDEX), 'w') as f:
+        json.dump(records, f)  # the layout committed before pack generations
+    _reopen(cache)
+    assert curve_store.read_activity(cache, 1)['power_curve'].tolist() == _ride(1)['power_curve']
+
+def test_pack_compacts_itself_past_the_threshold(tmp_path, monkeypatch):
+    monkeypatch.setattr(curve_store, 'COMPACT_MIN_BYTES', 0)
+    cache = str(tmp_path)
+    curve_store.write_activities(cache, [_ride(i) for i in range(4)])
+    for i in range(4):
+        curve_store.write_activity(cache, _ride(i, name='renamed'))
+        assert curve_store.dead_bytes(cache) <= curve_store.COMPACT_RATIO * _pack_size(cache)
+    assert all(curve_store.read_meta(cache, i)['name'] == 'renamed' for i in range(4))
+
+def test_migrate_moves_loose_json_into_the_pack(tmp_path):
+    cache = str(tmp_path)
+    for ride in (_ride(7), _ride(8, no_power=True)):
+        with open(curve_store.legacy_path(cache, ride['id']), 'w') as f:
+            json.dump(ride, f)
+    assert curve_store.read_meta(cache, 7)['name'] == 'Ride 7'
+
+    assert curve_store.migrate(cache) == (2, 0)
+    assert sorted(os.listdir(cache)) == [curve_store.PACK_INDEX, curve_store.PACK_FILE]
+    _reopen(cache)
+    assert curve_store.read_activity(cache, 7)['power_curve'].tolist() == _ride(7)['power_curve']
+    assert curve_store.read_meta(cache, 8)['no_power'] is True
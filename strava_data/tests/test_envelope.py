@@ -0,0 +1,24 @@
+from datetime import datetime
+from conftest import synthetic_rides, write_in_batches
+from strava_modules import envelope
+
+MAX_SECONDS = 120
+WINDOW_START = datetime(2025, 2, 1)
+
+def test_incremental_matches_full_rebuild(tmp_path):
+    cache, path = str(tmp_path / 'cache'), str(tmp_path / 'power_envelope.json')
+
+    def update():
+        index = envelope.load_index(path, MAX_SECONDS)
+        envelope.update_index(index, cache, WINDOW_START)
+        envelope.save_index(path, index)
+        return index
+    incremental = write_in_batches(cache, synthetic_rides(40, MAX_SECONDS), 5, update)
+
+    full = envelope.new_index(MAX_SECONDS)
+    envelope.update_index(full, cache, WINDOW_START)
+    for key in ('all_time', 'recent_best'):
+        assert envelope.best_entries(incremental, key) == envelope.best_entries(full, key)
+
+    # A second pass with nothing new opens nothing
+    assert envelope.update_index(envelope.load_index(path, MAX_SECONDS), cache, WINDOW_START) == 0
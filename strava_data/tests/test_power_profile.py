@@ -0,0 +1,34 @@
+from datetime import datetime
+from conftest import synthetic_rides, write_in_batches
+from strava_modules import power_profile
+
+MAX_SECONDS = 120
+
+def test_incremental_matches_full_rebuild(tmp_path):
+    cache, path = str(tmp_path / 'cache'), str(tmp_path / 'power_profile_index.npz')
+
+    def update():
+        index = power_profile.load_index(path, MAX_SECONDS)
+        power_profile.update_index(index, cache)
+        power_profile.save_index(path, index)
+        return index
+    incremental = write_in_batches(cache, synthetic_rides(40, MAX_SECONDS, seed=1), 4, update)
+    full = power_profile.build_index(cache, MAX_SECONDS)
+
+    assert incremental['rides'] == full['rides']
+    assert (incremental['dates'] == full['dates']).all()
+    assert (incremental['curves'] == full['curves']).all()
+    assert power_profile.update_index(power_profile.load_index(path, MAX_SECONDS), cache) == 0
+
+def test_best_between_matches_a_direct_scan(tmp_path):
+    cache = str(tmp_path / 'cache')
+    rides = synthetic_rides(40, MAX_SECONDS, seed=1)
+    write_in_batches(cache, rides, 1, lambda: None)
+    full = power_profile.build_index(cache, MAX_SECONDS)
+
+    # Best 10s between two dates, against a direct scan of the rides
+    start, end = datetime(2025, 1, 10), datetime(2025, 2, 10)
+    watts, positions = power_profile.best_between(full, start, end)
+    in_range = [r for r in rides if 'power_curve' in r and start.strftime("%Y-%m-%d") <= r['date'] <= end.strftime("%Y-%m-%d")]
+    assert watts[9] == max(r['power_curve'][9] for r in in_range if len(r['power_curve']) >= 10)
+    assert power_profile.profile_at(full, watts, positions, 10)['watts'] == watts[9]